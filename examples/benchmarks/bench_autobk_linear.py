@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+benchmark autobk() with the background spline found by linear
+least-squares (linear=True, the default) and by a nonlinear fit
+(linear=False), for a few spectra.
+
+   python bench_autobk_linear.py
+"""
+import time
+from pathlib import Path
+import numpy as np
+
+from larch import Group
+from larch.io import read_ascii
+from larch.xafs import autobk
+
+DATADIR = Path(__file__).parent.parent / 'xafsdata'
+
+def run(energy, mu, nrepeat=10, **kws):
+    grp = Group()
+    t0 = time.time()
+    for i in range(nrepeat):
+        autobk(energy, mu, group=grp, **kws)
+    return grp, (time.time() - t0)/nrepeat
+
+for fname, label in (('cu_metal_rt.xdi', 'mutrans'),
+                     ('fe2o3_rt1.xmu', 'mu'),
+                     ('ni_metal_rt.xdi', 'mutrans')):
+    dat = read_ascii((DATADIR / fname).as_posix())
+    mu = getattr(dat, label)
+    for kws in (dict(rbkg=1.0, kweight=2), dict(rbkg=1.0, kweight=2, nclamp=0)):
+        nonlin, t1 = run(dat.energy, mu, linear=False, **kws)
+        lin, t2 = run(dat.energy, mu, linear=True, **kws)
+        print("%-16s nclamp=%d: nonlinear %6.1f ms, linear %6.1f ms (x%.1f)  max|dchi|=%.2g"
+              % (fname, kws.get('nclamp', 3), 1000*t1, 1000*t2, t1/t2,
+                 abs(lin.chi - nonlin.chi).max()))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+benchmark the Cauchy wavelet transform used for wavelet-space fits
+(fitspace='w'): a Python loop over R values, each with its own filter
+and inverse FFT, compared to the cached filter bank of a feffit transform
+with all R values in one inverse FFT, in double and single precision.
+
+   python bench_cauchy_wavelet.py
+"""
+import time
+import numpy as np
+
+from larch.xafs import feffit_transform
+
+def cwt_loop(trans, chi, kweight=2):
+    "the Cauchy wavelet transform, one R value at a time"
+    nkpts = len(chi)
+    nfft, kstep, rstep = trans.nfft, trans.kstep, trans.rstep
+    chi = chi * trans.kwin[:nkpts] * trans.k_[:nkpts]**kweight
+    omega = np.pi*np.arange(nfft)/(kstep*nfft)
+    chix = np.zeros(int(nfft/2))
+    chix[:nkpts] = chi
+    ffchi = np.fft.fft(chix, n=2*nfft)[:nfft]
+    nrpts = int(np.round(trans.rmax/rstep))
+    r = rstep * np.arange(nrpts)
+    r[0] = 1.e-19
+    alpha = nrpts/(2*r)
+    cauchy_sum = np.log(2*np.pi) - np.log(1.0+np.arange(nrpts)).sum()
+    out = np.zeros((nrpts, nkpts), dtype='complex128')
+    with np.errstate(divide='ignore'):
+        for i in range(nrpts):
+            aom = alpha[i]*omega
+            filt = cauchy_sum + nrpts*np.log(aom) - aom
+            out[i, :] = np.fft.ifft(np.exp(filt)*ffchi, 2*nfft)[:nkpts]
+    return (out*trans._cauchymask)[trans._cauchyslice]
+
+def timeit(func, *args, nrepeat=20):
+    t0 = time.time()
+    for i in range(nrepeat):
+        out = func(*args)
+    return out, (time.time()-t0)/nrepeat
+
+k = 0.05*np.arange(321)
+chi = np.sin(5*k)*np.exp(-0.01*k*k) + 0.3*np.sin(8*k)
+
+for rmax in (3.0, 6.0):
+    trans = feffit_transform(fitspace='w', kmin=3, kmax=14, kweight=2, dk=4,
+                             rmin=1.0, rmax=rmax)
+    trans32 = feffit_transform(fitspace='w', kmin=3, kmax=14, kweight=2, dk=4,
+                               rmin=1.0, rmax=rmax, wavelet_float32=True)
+    trans.cwt(chi)
+    trans32.cwt(chi)
+    out1, t1 = timeit(cwt_loop, trans, chi)
+    out2, t2 = timeit(trans.cwt, chi)
+    out3, t3 = timeit(trans32.cwt, chi)
+    nbytes = trans.cauchy_filters(int(np.round(rmax/trans.rstep))).nbytes
+    print("rmax=%.1f: loop %.2f ms, filter bank %.2f ms (x%.1f), float32 %.2f ms (x%.1f)"
+          % (rmax, 1000*t1, 1000*t2, t1/t2, 1000*t3, t1/t3))
+    print("   filter bank: %.1f MB (float32: %.1f MB), max difference %.3g, float32: %.3g"
+          % (nbytes/2**20, nbytes/2**21, abs(out1-out2).max(),
+             abs(out1-out3).max()/abs(out1).max()))
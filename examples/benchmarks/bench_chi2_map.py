@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+benchmark chi-square maps for two variables of a feffit: lmfit's
+conf_interval2d (sequential refits, each starting from the best fit),
+compared with feffit_chi2_map, with refits seeded from neighboring
+points, run serially and with a pool of processes, and with residual
+evaluation only (refit=False).
+
+   python bench_chi2_map.py [npts]
+"""
+import os
+import sys
+import time
+import numpy as np
+from lmfit import conf_interval2d
+
+from larch.xafs import feffit_chi2_map
+from bench_feffit_bootstrap import make_fit
+
+if __name__ == '__main__':
+    npts = int(sys.argv[1]) if len(sys.argv) > 1 else 11
+    print(f'{os.cpu_count()} CPUs, {npts}x{npts} map of del_e0, alpha')
+    result = make_fit()
+    c2_scale = result.chi_square / result.fit_details.chisqr
+
+    t0 = time.time()
+    xpts, ypts, cmap = feffit_chi2_map(result, 'del_e0', 'alpha', nx=npts, ny=npts)
+    tmap = time.time() - t0
+
+    limits = ((xpts[-1], xpts[0]), (ypts[-1], ypts[0]))
+    t0 = time.time()
+    xr, yr, ref = conf_interval2d(result.fitter, result.fit_details, 'del_e0',
+                                  'alpha', nx=npts, ny=npts, limits=limits,
+                                  prob_func=lambda best, new: new.chisqr*c2_scale)
+    tref = time.time() - t0
+    print(f'lmfit conf_interval2d:         {tref:7.2f} s '
+          f'(max rel diff {abs(ref-cmap).max()/cmap.max():.2g})')
+    print(f'feffit_chi2_map, serial:       {tmap:7.2f} s ({tref/tmap:.1f}x)')
+
+    for nworkers in (2, 4):
+        t0 = time.time()
+        out = feffit_chi2_map(result, 'del_e0', 'alpha', nx=npts, ny=npts,
+                              nworkers=nworkers)[2]
+        dt = time.time() - t0
+        assert np.allclose(out, cmap)
+        print(f'feffit_chi2_map, nworkers={nworkers}:  {dt:7.2f} s ({tref/dt:.1f}x)')
+
+    t0 = time.time()
+    scan = feffit_chi2_map(result, 'del_e0', 'alpha', nx=npts, ny=npts,
+                           refit=False)[2]
+    dt = time.time() - t0
+    print(f'feffit_chi2_map, refit=False:  {dt:7.2f} s ({tref/dt:.1f}x)')
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+benchmark energy-dependent broadening with conv(): building the sparse
+convolution matrix, applying it to one spectrum, and to a stack.
+
+   python bench_convolution.py
+"""
+import time
+import numpy as np
+
+from larch.math.convolution1D import conv, atan_gamma, _conv_matrices
+
+rng = np.random.RandomState(1)
+for npts in (500, 2000, 8000):
+    energy = np.linspace(-30, 120, npts)
+    fwhm = atan_gamma(energy, 1.5, 10, 20, 5)
+    stack = np.tanh(energy/3) + 0.01*rng.normal(size=(500, npts))
+    for kernel in ('gaussian', 'lorentzian'):
+        _conv_matrices.clear()
+        t0 = time.time()
+        conv(energy, stack[0], kernel, fwhm)
+        t1 = time.time()
+        for mu in stack[:50]:
+            conv(energy, mu, kernel, fwhm)
+        t2 = time.time()
+        conv(energy, stack, kernel, fwhm)
+        t3 = time.time()
+        print("%5d points %-10s: first call %7.1f ms, cached %6.3f ms/spectrum, stack %6.3f ms/spectrum"
+              % (npts, kernel, 1000*(t1-t0), 1000*(t2-t1)/50, 1000*(t3-t2)/len(stack)))
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+benchmark the Kramers-Kronig transforms used by diffkk (f'' -> f')
+for the vectorized MacLaurin series (kkmclr) and the FFT form
+(kkmclr_fft), across array sizes.
+
+   python bench_diffkk.py
+"""
+import time
+import numpy as np
+
+from larch.xafs.diffkk import kkmclr, kkmclr_fft
+
+def timeit(func, e, f, nrepeat):
+    t0 = time.time()
+    for i in range(nrepeat):
+        out = func(e, f)
+    return out, (time.time() - t0)/nrepeat
+
+rng = np.random.RandomState(3)
+print(" npts     kkmclr (ms)  kkmclr_fft (ms)  speedup   max rel diff")
+for npts in (500, 1000, 2000, 4000, 8000, 16000):
+    e = np.linspace(8000, 8000 + npts/2.0, npts)
+    f = np.exp(-((e - e.mean())/30)**2) + 0.05*rng.normal(size=npts)
+    nrep = max(1, 4000//npts)
+    ref, tvec = timeit(kkmclr, e, f, nrep)
+    out, tfft = timeit(kkmclr_fft, e, f, 5*nrep)
+    print("%6d  %11.2f  %15.3f  %8.1f  %12.2g" % (npts, 1000*tvec, 1000*tfft,
+                                              tvec/tfft, abs(out-ref).max()/abs(ref).max()))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+benchmark creating Feff Paths from feffNNNN.dat files with and without
+the on-disk cache of parsed files, using a temporary cache folder.
+
+   python bench_feffdat_cache.py
+"""
+import time
+import shutil
+import tempfile
+from glob import glob
+from pathlib import Path
+
+from larch.xafs import feffpath, FeffDatCache, set_feffdat_cache
+
+FEFFDIR = Path(__file__).parent.parent / 'feffit' / 'Feff_Cu'
+files = sorted(glob((FEFFDIR / 'feff*.dat').as_posix()))
+
+def run(nrepeat=10):
+    t0 = time.time()
+    for i in range(nrepeat):
+        for fname in files:
+            feffpath(fname)
+    return (time.time() - t0)/(nrepeat*len(files))
+
+folder = tempfile.mkdtemp()
+try:
+    set_feffdat_cache(None)
+    tplain = run()
+    cache = set_feffdat_cache(FeffDatCache(folder=folder))
+    t0 = time.time()
+    cache.prewarm(FEFFDIR.as_posix())
+    tprewarm = time.time() - t0
+    tcached = run()
+    print("%d files, prewarm %.1f ms" % (len(files), 1000*tprewarm))
+    print("feffpath: parsed %.2f ms, cached %.2f ms per path (x%.1f)"
+          % (1000*tplain, 1000*tcached, tplain/tcached))
+    print(cache.stats())
+finally:
+    shutil.rmtree(folder, ignore_errors=True)
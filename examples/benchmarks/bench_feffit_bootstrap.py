@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+benchmark feffit_bootstrap(): refitting many synthetic data sets made from
+the best-fit model of a feffit, serially and with a pool of processes, and
+comparing the spread of the bootstrap samples with the uncertainties from
+the covariance matrix.
+
+   python bench_feffit_bootstrap.py [nsamples]
+"""
+import os
+import sys
+import time
+from glob import glob
+from pathlib import Path
+import numpy as np
+
+from larch.io import read_ascii
+from larch.fitting import param_group, guess
+from larch.xafs import (autobk, feffpath, feffit_transform, feffit_dataset,
+                        feffit, feffit_bootstrap)
+
+EXAMPLES = Path(__file__).parent.parent
+FEFFDIR = EXAMPLES / 'feffit' / 'Feff_Cu'
+
+def make_fit():
+    data = read_ascii((EXAMPLES / 'xafsdata' / 'cu_metal_rt.xdi').as_posix())
+    autobk(data.energy, data.mutrans, group=data, rbkg=1.0, kw=2)
+    pars = param_group(amp=guess(0.9), del_e0=guess(2.0), alpha=guess(0.0),
+                       sig2=guess(0.005))
+    paths = [feffpath(f, s02='amp', e0='del_e0', deltar='alpha*reff',
+                      sigma2='sig2*(1+reff/10)')
+             for f in sorted(glob((FEFFDIR / 'feff00*.dat').as_posix()))]
+    trans = feffit_transform(kmin=3, kmax=16, kw=(1, 2, 3), dk=4,
+                             rmin=1.4, rmax=5.0)
+    dset = feffit_dataset(data=data, paths=paths, transform=trans)
+    return feffit(pars, dset, path_outputs=False)
+
+if __name__ == '__main__':
+    nsamples = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    print(f'{os.cpu_count()} CPUs')
+    result = make_fit()
+    print('covariance:  ' + ', '.join(f'{name}={result.params[name].value:.5f}'
+                                      f'+/-{result.params[name].stderr:.5f}'
+                                      for name in result.var_names))
+    for method in ('bootstrap', 'noise'):
+        serial = None
+        for nworkers in (1, 2, 4):
+            t0 = time.time()
+            boot = feffit_bootstrap(result, nsamples=nsamples, method=method,
+                                    seed=0, nworkers=nworkers)
+            dt = time.time() - t0
+            if serial is None:
+                serial = boot
+                print(f'{method:11s}  ' + ', '.join(f'{name}={boot.mean[i]:.5f}'
+                                                   f'+/-{boot.std[i]:.5f}'
+                                                   for i, name in enumerate(boot.var_names)))
+            assert np.allclose(boot.samples, serial.samples)
+            print(f'   {nsamples} samples, nworkers={nworkers}: {dt:.2f} s '
+                  f'({1000*dt/nsamples:.1f} ms/sample, mean nfev={boot.nfev.mean():.1f})')
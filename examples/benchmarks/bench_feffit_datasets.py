@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+benchmark evaluation of feffit residuals for many datasets, such
+as for a temperature series, comparing serial evaluation with
+evaluation by a FeffitResidualPool of threads or processes.
+
+   python bench_feffit_datasets.py
+"""
+import os
+import time
+from glob import glob
+from pathlib import Path
+import numpy as np
+
+from larch.io import read_ascii
+from larch.fitting import param_group, guess
+from larch.xafs import (autobk, feffpath, feffit_transform, feffit_dataset,
+                        feffit)
+from larch.xafs.feffit import FeffitResidualPool
+
+EXAMPLES = Path(__file__).parent.parent
+FEFFDIR = EXAMPLES / 'feffit' / 'Feff_Cu'
+
+def make_datasets(ndata):
+    data = read_ascii((EXAMPLES / 'xafsdata' / 'cu_metal_rt.xdi').as_posix())
+    autobk(data.energy, data.mutrans, group=data, rbkg=1.0, kw=2)
+    pars = {'amp': guess(0.9), 'del_e0': guess(2.0), 'alpha': guess(0.0)}
+    for i in range(ndata):
+        pars['sig2_%d' % i] = guess(0.005 + 0.0001*i)
+    pars = param_group(**pars)
+    files = sorted(glob((FEFFDIR / 'feff00*.dat').as_posix()))
+    datasets = []
+    for i in range(ndata):
+        paths = [feffpath(f, s02='amp', e0='del_e0', deltar='alpha*reff',
+                          sigma2='sig2_%d*(1+reff/10)' % i) for f in files]
+        trans = feffit_transform(kmin=3, kmax=16, kw=(1, 2, 3), dk=4,
+                                 rmin=1.4, rmax=5.0)
+        datasets.append(feffit_dataset(data=data, paths=paths, transform=trans))
+    return pars, datasets
+
+def bench_residual(pars, datasets, nworkers, executor, nrepeat=20):
+    params = pars.__params__
+    for ds in datasets:
+        ds.prepare_fit(params)
+    varnames = [name for name in params if name.startswith('sig2')]
+    for name in varnames:
+        params[name].value = 0.005
+    def change():
+        # like a finite-difference step: change all sigma2 values
+        for name in varnames:
+            params[name].value = params[name].value*1.0001
+    if nworkers == 1:
+        func = lambda: np.concatenate([d._residual(pars) for d in datasets])
+    else:
+        pool = FeffitResidualPool(datasets, nworkers=nworkers, executor=executor)
+        func = lambda: pool.residual(pars)
+    out = func()
+    t0 = time.time()
+    for i in range(nrepeat):
+        change()
+        out = func()
+    dt = (time.time() - t0)/nrepeat
+    if nworkers > 1:
+        pool.close()
+    return dt, out
+
+if __name__ == '__main__':
+    print(f'{os.cpu_count()} CPUs')
+    for ndata in (4, 10, 20, 30):
+        pars, datasets = make_datasets(ndata)
+        t1, res1 = bench_residual(pars, datasets, 1, 'thread')
+        msg = [f'{ndata:3d} datasets: serial {1000*t1:7.1f} ms']
+        for executor in ('thread', 'process'):
+            for nworkers in (2, 4, 8):
+                tn, resn = bench_residual(pars, datasets, nworkers, executor)
+                assert np.allclose(res1, resn)
+                msg.append(f'{executor} x{nworkers} {t1/tn:4.1f}x')
+        print(', '.join(msg))
+
+    pars, datasets = make_datasets(10)
+    for nworkers in (1, 4):
+        pars, datasets = make_datasets(10)
+        t0 = time.time()
+        out = feffit(pars, datasets, nworkers=nworkers, path_outputs=False)
+        print(f'feffit, 10 datasets, nworkers={nworkers}: {time.time()-t0:.2f} s, '
+              f'nfev={out.nfev}, chi_square={out.chi_square:.4f}')
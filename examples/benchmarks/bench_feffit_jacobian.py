@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+benchmark feffit() with finite-difference and analytic Jacobians,
+for a fit of 13 Cu paths with 8 to 16 variables.
+
+   python bench_feffit_jacobian.py
+"""
+import time
+from glob import glob
+from pathlib import Path
+
+from larch.io import read_ascii
+from larch.fitting import param_group, param, guess
+from larch.xafs import (autobk, feffpath, feffit_transform, feffit_dataset,
+                        feffit)
+
+EXAMPLES = Path(__file__).parent.parent
+FEFFDIR = EXAMPLES / 'feffit' / 'Feff_Cu'
+
+def make_fit(nsig2, fitspace='r'):
+    """fit Cu metal with 13 paths, and nsig2 sigma2 variables"""
+    data = read_ascii((EXAMPLES / 'xafsdata' / 'cu_metal_rt.xdi').as_posix())
+    autobk(data.energy, data.mutrans, group=data, rbkg=1.0, kw=2)
+
+    pars = dict(amp=guess(0.9), del_e0=guess(2.0), alpha=guess(0.0),
+                c3_1=guess(0.0), e0_ms=guess(0.0))
+    for i in range(nsig2):
+        pars['sig2_%d' % (i+1)] = guess(0.005)
+    pars = param_group(**pars)
+
+    paths = []
+    files = sorted(glob((FEFFDIR / 'feff00*.dat').as_posix()))
+    for i, fname in enumerate(files):
+        e0 = 'del_e0' if i < 6 else 'del_e0 + e0_ms'
+        third = 'c3_1' if i == 0 else '0'
+        paths.append(feffpath(fname, s02='amp', e0=e0, third=third,
+                              sigma2='sig2_%d' % (1 + min(i, nsig2-1)),
+                              deltar='alpha*reff'))
+
+    trans = feffit_transform(kmin=3, kmax=16, kw=2, dk=4, window='kaiser',
+                             rmin=1.4, rmax=5.0, fitspace=fitspace)
+    dset = feffit_dataset(data=data, paths=paths, transform=trans)
+    return pars, dset
+
+def run(nsig2):
+    results = {}
+    for analytic in (False, True):
+        pars, dset = make_fit(nsig2)
+        t0 = time.time()
+        out = feffit(pars, dset, path_outputs=False, analytic_jacobian=analytic)
+        results[analytic] = (time.time()-t0, out)
+
+    (t_num, out_num), (t_ana, out_ana) = results[False], results[True]
+    print(f'{out_num.nvarys:3d} variables: finite-difference {t_num:6.2f} s '
+          f'(nfev={out_num.nfev:4d}), analytic {t_ana:6.2f} s '
+          f'(nfev={out_ana.nfev:4d}), speedup {t_num/t_ana:5.1f}x, '
+          f'chi_square {out_num.chi_square:.4f} / {out_ana.chi_square:.4f}')
+
+if __name__ == '__main__':
+    for nsig2 in (5, 9, 13):
+        run(nsig2)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+benchmark summing chi(k) for many Feff paths with ff2chi(),
+comparing the per-path loop with the vectorized FeffPathStack.
+
+   python bench_ff2chi_pathstack.py [npaths]
+"""
+import sys
+import time
+from glob import glob
+from pathlib import Path
+import numpy as np
+
+from larch.fitting import param_group, guess
+from larch.xafs import feffpath, ff2chi
+from larch.xafs.feffdat import FeffPathStack
+
+FEFFDIR = Path(__file__).parent.parent / 'feffit' / 'Feff_Cu'
+
+def make_paths(npaths):
+    files = sorted(glob((FEFFDIR / 'feff00*.dat').as_posix()))
+    paths = []
+    for i in range(npaths):
+        paths.append(feffpath(files[i % len(files)], label='p%3.3d' % i,
+                              s02='amp', e0='del_e0',
+                              sigma2='sig2*(1+reff/10)',
+                              deltar='alpha*reff'))
+    return paths
+
+def timeit(func, nrepeat):
+    t0 = time.time()
+    for i in range(nrepeat):
+        out = func()
+    return (time.time() - t0)/nrepeat, out
+
+def run(npaths, nrepeat=20):
+    pars = param_group(amp=guess(0.9), del_e0=guess(2.0),
+                       sig2=guess(0.004), alpha=guess(0.002))
+    paths = make_paths(npaths)
+    k = 0.05*np.arange(401)
+
+    t_loop, out_loop = timeit(lambda: ff2chi(paths, paramgroup=pars, k=k),
+                              nrepeat)
+    t_stack, out_stack = timeit(lambda: ff2chi(paths, paramgroup=pars, k=k,
+                                               pathstack=True), nrepeat)
+    # as used in feffit: stack built once, evaluated many times
+    stack = FeffPathStack(paths, k)
+    params = pars.__params__
+    t_eval, chi_eval = timeit(lambda: stack.calc_chi(params), nrepeat)
+
+    diff = abs(out_loop.chi - chi_eval).max()
+    print(f'{npaths:5d} paths: loop {1000*t_loop:8.2f} ms, '
+          f'stack (built per call) {1000*t_stack:8.2f} ms, '
+          f'stack (prebuilt) {1000*t_eval:8.2f} ms, '
+          f'speedup {t_loop/t_eval:6.1f}x, max|diff| {diff:.2e}')
+
+if __name__ == '__main__':
+    sizes = [10, 40, 80, 120]
+    if len(sys.argv) > 1:
+        sizes = [int(a) for a in sys.argv[1:]]
+    for npaths in sizes:
+        run(npaths)
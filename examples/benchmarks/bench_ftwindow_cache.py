@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+benchmark the process-wide cache of FT windows and k-weighted windows:
+transforms of chi(k) with new copies of a feffit transform group (as
+made for each dataset and each fit) and with xftf(), with the cache and
+with the cache cleared before each transform.
+
+   python bench_ftwindow_cache.py
+"""
+import time
+from copy import copy
+import numpy as np
+
+from larch import Group
+from larch.xafs import feffit_transform, xftf, ftwindow_cache_stats
+from larch.xafs.xafsft import clear_ftwindow_cache
+
+def bench(func, nrepeat, clear):
+    t0 = time.time()
+    for i in range(nrepeat):
+        if clear:
+            clear_ftwindow_cache()
+        func()
+    return (time.time() - t0)/nrepeat
+
+if __name__ == '__main__':
+    k = 0.05*np.arange(321)
+    chi = np.sin(4.4*k)*np.exp(-0.01*k*k)
+    trans = feffit_transform(kmin=3, kmax=15, dk=4, kweight=(1, 2, 3),
+                             rmin=1, rmax=3)
+    grp = Group()
+    tests = {'copied transform, 3 k-weights':
+                 lambda: copy(trans).fftf(chi, kweight=trans.kweight),
+             'xftf, kweight=2':
+                 lambda: xftf(k, chi, group=grp, kmin=3, kmax=15, dk=4,
+                              kweight=2)}
+    for label, func in tests.items():
+        tclear = bench(func, 500, True)
+        tcache = bench(func, 500, False)
+        print(f'{label:32s}: no cache {1.e6*tclear:7.1f} us, '
+              f'cached {1.e6*tcache:7.1f} us ({tclear/tcache:.1f}x)')
+    print(ftwindow_cache_stats())
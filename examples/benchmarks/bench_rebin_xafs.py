@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+benchmark rebin_xafs() for continuous-scan sized data, for one
+spectrum and for a stack of spectra sharing one energy array.
+
+   python bench_rebin_xafs.py
+"""
+import time
+from pathlib import Path
+import numpy as np
+
+from larch import Group
+from larch.io import read_ascii
+from larch.xafs import rebin_xafs
+
+DATADIR = Path(__file__).parent.parent / 'xafsdata'
+dat = read_ascii((DATADIR / 'cu_metal_rt.xdi').as_posix())
+rng = np.random.RandomState(1)
+
+for npts in (50000, 200000, 500000):
+    energy = np.sort(rng.uniform(8850, 9800, npts))
+    mu = np.interp(energy, dat.energy, dat.mutrans)
+    stack = mu + rng.normal(scale=1.e-3, size=(20, npts))
+
+    grp = Group(energy=energy, mu=stack[0], e0=8979.0)
+    t0 = time.time()
+    rebin_xafs(grp)
+    t1 = time.time()
+    grp = Group(energy=energy, mu=stack, e0=8979.0)
+    rebin_xafs(grp)
+    t2 = time.time()
+    print("%7d points: one spectrum %7.1f ms, stack of %d %7.1f ms (%d bins)"
+          % (npts, 1000*(t1-t0), len(stack), 1000*(t2-t1), len(grp.rebinned.energy)))
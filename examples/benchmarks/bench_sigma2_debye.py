@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+benchmark the correlated Debye sigma2 for a list of Feff paths:
+the scalar python version, the vectorized numpy version per path
+(new temperatures, and memoized), and all paths at once.
+
+   python bench_sigma2_debye.py
+"""
+import time
+from glob import glob
+from pathlib import Path
+import numpy as np
+
+from larch.xafs import feffpath, sigma2_debye, sigma2_debye_paths
+from larch.xafs.sigma2_models import sigma2_correldebye_py
+
+FEFFDIR = Path(__file__).parent.parent / 'feffit' / 'Feff_Cu'
+paths = [feffpath(f) for f in sorted(glob((FEFFDIR / 'feff*.dat').as_posix()))]
+temps = np.linspace(10, 600, 20)
+
+def sigma2_py(t, theta, path):
+    fdat = path._feffdat
+    atoms = np.array([g[3:] for g in fdat.geom])
+    return sigma2_correldebye_py(len(atoms), t, theta, fdat.rnorman,
+                                 atoms[:, 1], atoms[:, 2], atoms[:, 3], atoms[:, 0])
+
+t0 = time.time()
+s_py = [[sigma2_py(t, 315, p) for p in paths] for t in temps[:2]]
+t_py = (time.time() - t0)/2
+
+t0 = time.time()
+s_np = [[sigma2_debye(t, 315, p) for p in paths] for t in temps]
+t_np = (time.time() - t0)/len(temps)
+
+t0 = time.time()
+for t in temps:
+    [sigma2_debye(t, 315, p) for p in paths]
+t_memo = (time.time() - t0)/len(temps)
+
+t0 = time.time()
+for t in temps + 0.5:
+    sigma2_debye_paths(t, 315, paths)
+t_all = (time.time() - t0)/len(temps)
+
+print("%d paths, time per evaluation of all paths:" % len(paths))
+print("  python loop        %9.3f ms" % (1000*t_py))
+print("  numpy, per path    %9.3f ms  (x%.0f)" % (1000*t_np, t_py/t_np))
+print("  numpy, memoized    %9.3f ms  (x%.0f)" % (1000*t_memo, t_py/t_memo))
+print("  sigma2_debye_paths %9.3f ms  (x%.0f)" % (1000*t_all, t_py/t_all))
+print("  max rel diff: %.2g" % abs(np.array(s_np[:2])/np.array(s_py) - 1).max())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+benchmark pre_edge_batch(), autobk_batch(), find_e0_batch(),
+estimate_noise_batch(), and mback_norm_batch() against looping over
+pre_edge(), autobk(), find_e0(), estimate_noise(), and mback_norm()
+for a stack of noisy copies of one spectrum, reporting spectra per
+second.  mback_norm() is also timed with the cache of tabulated f2
+cleared for each spectrum.
+
+   python bench_xafs_batch.py [nspectra] [nworkers]
+"""
+import sys
+import time
+import os
+from pathlib import Path
+import numpy as np
+
+from larch import Group
+from larch.io import read_ascii
+from larch.xafs import (pre_edge, autobk, pre_edge_batch, autobk_batch,
+                        find_e0, find_e0_batch, estimate_noise,
+                        estimate_noise_batch, mback_norm, mback_norm_batch)
+from larch.xafs.mback import clear_xraydb_cache
+
+DATADIR = Path(__file__).parent.parent / 'xafsdata'
+
+nspectra = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+nworkers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+dat = read_ascii((DATADIR / 'cu_metal_rt.xdi').as_posix())
+rng = np.random.RandomState(7)
+mu = np.array([dat.mutrans*(1 + 0.02*rng.uniform()) +
+               rng.normal(scale=2.e-4, size=len(dat.energy))
+               for i in range(nspectra)])
+
+t0 = time.time()
+for row in mu:
+    pre_edge(dat.energy, row, group=Group())
+tloop = time.time() - t0
+print("pre_edge  loop             : %8.1f spectra/sec" % (nspectra/tloop))
+for nw in sorted(set((1, nworkers))):
+    grp = Group()
+    pre_edge_batch(dat.energy, mu, group=grp, nworkers=nw)
+    print("pre_edge_batch nworkers=%-3d: %8.1f spectra/sec" %
+          (nw, grp.pre_edge_details.spectra_per_sec))
+
+t0 = time.time()
+for row in mu:
+    autobk(dat.energy, row, group=Group(), rbkg=1.0, kweight=2)
+tloop = time.time() - t0
+print("autobk    loop             : %8.1f spectra/sec" % (nspectra/tloop))
+for nw in sorted(set((1, nworkers))):
+    grp = Group()
+    autobk_batch(dat.energy, mu, group=grp, rbkg=1.0, kweight=2, nworkers=nw)
+    print("autobk_batch nworkers=%-3d  : %8.1f spectra/sec" %
+          (nw, grp.autobk_details.spectra_per_sec))
+
+def rate(func):
+    t0 = time.time()
+    func()
+    return nspectra/(time.time() - t0)
+
+print("find_e0   loop             : %8.1f spectra/sec" %
+      rate(lambda: [find_e0(dat.energy, row) for row in mu]))
+print("find_e0_batch              : %8.1f spectra/sec" %
+      rate(lambda: find_e0_batch(dat.energy, mu)))
+print("estimate_noise loop        : %8.1f spectra/sec" %
+      rate(lambda: [estimate_noise(grp.k, chi, group=Group(), kmax=15)
+                    for chi in grp.chi]))
+print("estimate_noise_batch       : %8.1f spectra/sec" %
+      rate(lambda: estimate_noise_batch(grp.k, grp.chi, group=Group(), kmax=15)))
+
+pre_kws = dict(pre1=-150, pre2=-30, norm1=150, nnorm=2)
+groups = []
+for row in mu:
+    groups.append(Group(energy=dat.energy, mu=row))
+    pre_edge(groups[-1], **pre_kws)
+
+def mback_loop(clear=False):
+    for g in groups:
+        if clear:
+            clear_xraydb_cache()
+        mback_norm(g, z=29, edge='K', **pre_kws)
+
+print("mback_norm loop, no cache  : %8.1f spectra/sec" %
+      rate(lambda: mback_loop(clear=True)))
+print("mback_norm loop            : %8.1f spectra/sec" % rate(mback_loop))
+grp = Group()
+pre_edge_batch(dat.energy, mu, group=grp, **pre_kws)
+print("mback_norm_batch           : %8.1f spectra/sec" %
+      rate(lambda: mback_norm_batch(dat.energy, mu, group=grp, z=29,
+                                    edge='K', **pre_kws)))
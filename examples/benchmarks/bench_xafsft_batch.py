@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+benchmark XAFS Fourier transforms of many chi(k) spectra: one complex
+FFT per spectrum (as xftf_fast() used to do) compared to a single,
+real-input FFT of the whole stack, and the feffit residual with 3 k-weights
+
+   python bench_xafsft_batch.py
+"""
+import time
+import numpy as np
+from scipy.fftpack import fft
+
+from larch.xafs import xftf_fast, feffit_transform
+from larch.xafs.feffit import transform_residual
+
+NSPEC, NFFT, KSTEP = 500, 2048, 0.05
+
+def xftf_loop(chis, nfft=NFFT, kstep=KSTEP):
+    out = []
+    for chi in chis:
+        cchi = np.zeros(nfft, dtype='complex128')
+        cchi[:len(chi)] = chi
+        out.append((kstep/np.sqrt(np.pi))*fft(cchi)[:nfft//2])
+    return np.array(out)
+
+def timeit(func, *args, nrepeat=5, **kws):
+    t0 = time.time()
+    for i in range(nrepeat):
+        out = func(*args, **kws)
+    return out, (time.time()-t0)/nrepeat
+
+k = KSTEP*np.arange(361)
+rng = np.random.RandomState(7)
+chis = np.sin(2*rng.uniform(2, 3, size=(NSPEC, 1))*k)*np.exp(-0.01*k*k)
+
+out1, t1 = timeit(xftf_loop, chis)
+out2, t2 = timeit(xftf_fast, chis)
+print("%d spectra, one complex FFT each:  %8.2f ms" % (NSPEC, 1000*t1))
+print("%d spectra, one real-input FFT:    %8.2f ms (x%.1f)" % (NSPEC, 1000*t2, t1/t2))
+print("   max difference: %.3g" % abs(out1-out2).max())
+
+trans = feffit_transform(kmin=3, kmax=16, kweight=[1, 2, 3], dk=4,
+                         rmin=1.4, rmax=3.0, fitspace='r')
+eps = [1.e-3, 1.e-3, 1.e-3]
+
+def resid_loop(chis):
+    out = []
+    for chi in chis:
+        out.append(np.concatenate([trans.fftf(chi, kweight=kw)
+                                   for kw in trans.kweight]))
+    return out
+
+_, t1 = timeit(resid_loop, chis[:50])
+_, t2 = timeit(transform_residual, chis[:50], trans, eps, eps)
+print("feffit r-space residual, 3 k-weights, 50 rows: loop %.2f ms, batched %.2f ms (x%.1f)"
+      % (1000*t1, 1000*t2, t1/t2))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+benchmark energy-range maps from GSEXRM_MapFile.get_mca_erange(), with
+and without the channel-integral cube, which turns a sum over channels
+into the difference of two channel planes of the cube.
+
+   python bench_xrmmap_erange.py [nrows] [nmca] [npts] [nranges]
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+# synthetic map files are shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'tests'))
+from xrmmap_utils import make_mapfile, add_rows
+
+nrows   = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+nmca    = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+npts    = int(sys.argv[3]) if len(sys.argv) > 3 else 201
+nranges = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+
+rng = np.random.default_rng(3)
+ranges = []
+for i in range(nranges):
+    lo = int(rng.integers(0, 1500))
+    ranges.append((lo, lo + int(rng.integers(10, 500))))
+
+def erange_maps(xrm, det='mca1'):
+    return [xrm.get_mca_erange(det=det, emin=lo, emax=hi, by_energy=False,
+                               dtcorrect=False) for lo, hi in ranges]
+
+with tempfile.TemporaryDirectory() as folder:
+    xrm = make_mapfile(folder, npts=npts, nmca=nmca, nrois=4)
+    add_rows(xrm, nrows, npts=npts, nmca=nmca)
+
+    t0 = time.time()
+    direct = erange_maps(xrm)
+    t_direct = time.time() - t0
+
+    t0 = time.time()
+    xrm.build_integral_cube()
+    t_build = time.time() - t0
+
+    t0 = time.time()
+    cube = erange_maps(xrm)
+    t_cube = time.time() - t0
+    ok = all(np.array_equal(a, b) for a, b in zip(direct, cube))
+    xrm.close()
+
+print("energy-range maps: %d rows, %d MCAs, %d pixels/row, %d ranges" % (nrows, nmca,
+                                                                         npts, nranges))
+print("  summing counts      : %8.3f sec" % t_direct)
+print("  build integral cube : %8.3f sec" % t_build)
+print("  from integral cube  : %8.3f sec" % t_cube)
+print("  results match       : %s" % ok)
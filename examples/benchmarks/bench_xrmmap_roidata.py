@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+benchmark recalculating ROI maps from the MCA counts of a map file with
+GSEXRM_MapFile.set_roidata(), which reads the counts once and finds all
+ROIs from a cumulative sum over channels, against reading and summing
+the counts for each ROI and detector in turn.
+
+   python bench_xrmmap_roidata.py [nrows] [nmca] [nrois] [npts]
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+# synthetic map files are shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'tests'))
+from xrmmap_utils import make_mapfile, add_rows
+
+def roidata_per_roi(xrm):
+    "ROI maps for all rows, one ROI and detector at a time"
+    lims = xrm.xrmmap['config/rois/limits'][()]
+    nrois, nmca, _ = lims.shape
+    out = []
+    for iroi in range(nrois):
+        for i in range(nmca):
+            counts = xrm.xrmmap['mca%d/counts' % (i+1)]
+            out.append(counts[:, :, lims[iroi, i, 0]:lims[iroi, i, 1]].sum(axis=2))
+    return np.array(out)
+
+nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+nmca  = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+nrois = int(sys.argv[3]) if len(sys.argv) > 3 else 40
+npts  = int(sys.argv[4]) if len(sys.argv) > 4 else 201
+
+with tempfile.TemporaryDirectory() as folder:
+    xrm = make_mapfile(folder, npts=npts, nmca=nmca, nrois=nrois)
+    add_rows(xrm, nrows, npts=npts, nmca=nmca)
+    det_raw = xrm.xrmmap['roimap/det_raw']
+    expected = det_raw[()]
+
+    t0 = time.time()
+    per_roi = roidata_per_roi(xrm)
+    t_loop = time.time() - t0
+
+    nscal = det_raw.shape[2] - nrois*nmca
+    det_raw[:, :, nscal:] = 0
+    t0 = time.time()
+    xrm.set_roidata()
+    t_pass = time.time() - t0
+    ok = (np.array_equal(det_raw[()], expected) and
+          np.array_equal(per_roi.transpose(1, 2, 0), expected[:, :, nscal:]))
+    xrm.close()
+
+print("ROI maps: %d rows, %d MCAs, %d ROIs, %d pixels/row" % (nrows, nmca, nrois, npts))
+print("  per-ROI reads (raw only) : %8.3f sec" % t_loop)
+print("  set_roidata (raw and cor): %8.3f sec" % t_pass)
+print("  results match add_rowdata: %s" % ok)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+benchmark repeated GSEXRM_MapFile.get_roimap() and get_rgbmap() calls,
+as from the map viewer, with and without the in-memory cache of ROI
+maps, and check that the cache is refreshed when rows are added.
+
+   python bench_xrmmap_roimap.py [nrows] [nmca] [nrepeat] [npts]
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+# synthetic map files are shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'tests'))
+from xrmmap_utils import make_mapfile, add_rows
+
+nrows   = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+nmca    = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+nrepeat = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+npts    = int(sys.argv[4]) if len(sys.argv) > 4 else 201
+
+rois = ['roi%d' % i for i in range(8)]
+dets = ['mcasum'] + ['mca%d' % (i+1) for i in range(nmca)]
+
+def get_maps(xrm, use_cache=True):
+    out = []
+    for roi in rois:
+        for det in dets:
+            for dtcorrect in (True, False):
+                out.append(xrm.get_roimap(roi, det=det, dtcorrect=dtcorrect,
+                                          use_cache=use_cache))
+    return out
+
+def get_rgbmaps(xrm):
+    return [xrm.get_rgbmap(rois[i], rois[i+1], rois[i+2], det='mcasum')
+            for i in range(len(rois)-2)]
+
+with tempfile.TemporaryDirectory() as folder:
+    xrm = make_mapfile(folder, npts=npts, nmca=nmca, nrois=len(rois))
+    add_rows(xrm, nrows, npts=npts, nmca=nmca)
+
+    t0 = time.time()
+    for i in range(nrepeat):
+        direct = get_maps(xrm, use_cache=False)
+    t_direct = time.time() - t0
+
+    xrm.clear_roimap_cache()
+    t0 = time.time()
+    for i in range(nrepeat):
+        cached = get_maps(xrm)
+        rgb = get_rgbmaps(xrm)
+    t_cached = time.time() - t0
+    stats = xrm.roimap_cache_stats()
+    ok = all(np.array_equal(a, b) for a, b in zip(direct, cached))
+
+    add_rows(xrm, 2, npts=npts, nmca=nmca)
+    fresh = get_maps(xrm, use_cache=False)
+    ok_rows = all(np.array_equal(a, b) for a, b in zip(fresh, get_maps(xrm)))
+    ok_rows = ok_rows and fresh[0].shape[0] == cached[0].shape[0] + 2
+    xrm.close()
+
+print("ROI maps: %d rows, %d MCAs, %d pixels/row, %d maps x %d repeats" % (
+    nrows, nmca, npts, len(direct), nrepeat))
+print("  uncached get_roimap          : %8.3f sec" % t_direct)
+print("  cached get_roimap+get_rgbmap : %8.3f sec" % t_cached)
+print("  cache: %d maps, %.1f MB, hit rate %.3f" % (stats['size'], stats['nbytes']/2**20,
+                                                    stats['hit_rate']))
+print("  results match: %s, refreshed after add_rowdata: %s" % (ok, ok_rows))
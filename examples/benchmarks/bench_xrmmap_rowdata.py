@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+benchmark per-row time for GSEXRM_MapFile.add_rowdata(), writing
+synthetic rows of XRF map data (scalers, positions, and MCA spectra
+for several detectors with many ROIs) to a new HDF5 map file.
+
+   python bench_xrmmap_rowdata.py [nrows] [nmca] [nrois] [npts]
+"""
+import os
+import sys
+import tempfile
+import numpy as np
+
+# synthetic map files are shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'tests'))
+from xrmmap_utils import make_mapfile, add_rows
+
+nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+nmca  = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+nrois = int(sys.argv[3]) if len(sys.argv) > 3 else 48
+npts  = int(sys.argv[4]) if len(sys.argv) > 4 else 201
+
+with tempfile.TemporaryDirectory() as folder:
+    xrm = make_mapfile(folder, npts=npts, nmca=nmca, nrois=nrois)
+    times = 1000*add_rows(xrm, nrows, npts=npts, nmca=nmca)
+    checksum = sum(float(xrm.xrmmap['roimap'][n][()].sum())
+                   for n in ('det_raw', 'det_cor', 'sum_raw', 'sum_cor'))
+    xrm.close()
+
+print("add_rowdata: %d rows, %d MCAs, %d ROIs, %d pixels/row" % (nrows, nmca, nrois, npts))
+print("  per row: median %.2f ms, mean %.2f ms, first row %.2f ms" %
+      (np.median(times), times.mean(), times[0]))
+print("  roimap checksum: %.6e" % checksum)
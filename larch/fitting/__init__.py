@@ -7,8 +7,7 @@ from scipy.stats import f
 
 import lmfit
 from lmfit import Parameter as lmfitParameter
-from lmfit import (Parameters, Minimizer, conf_interval,
-                   ci_report, conf_interval2d)
+from lmfit import Parameters, Minimizer, conf_interval, ci_report
 
 from lmfit.minimizer import eval_stderr, MinimizerResult
 from lmfit.model import (ModelResult, save_model, load_model,
@@ -325,17 +324,66 @@ def confidence_intervals(fit_result, sigmas=(1, 2, 3), **kws):
     result = getattr(fit_result, 'fit_details', None)
     return conf_interval(fitter, result, sigmas=sigmas, **kws)
 
-def chi2_map(fit_result, xname, yname, nx=11, ny=11, sigma=3, **kws):
+def chi2_map_points(x, y, nx=11, ny=11, sigma=3, xrange=None, yrange=None):
+    """return arrays of x and y values for a chi-square map of two
+    Parameters x and y, spanning value +/- sigma*stderr, or the
+    (min, max) ranges in xrange and yrange"""
+    out = []
+    for par, npts, prange in ((x, nx, xrange), (y, ny, yrange)):
+        if prange is None:
+            if par.stderr is None:
+                raise ValueError("chi2_map needs uncertainty for '%s', or a range"
+                                 % par.name)
+            prange = (par.value - sigma*par.stderr, par.value + sigma*par.stderr)
+        out.append(np.linspace(min(prange), max(prange), npts))
+    return out
+
+def chi2_map_waves(xpts, ypts, xbest, ybest):
+    """order the points of a chi-square map into waves moving out from
+    the point nearest (xbest, ybest).  Each point in a wave is given the
+    index of its nearest neighbor in the previous wave, so that a fit at
+    that point can start from the solution at the neighbor.
+
+    Returns a list of waves, each a list of (ix, iy, seed_ix, seed_iy),
+    with seed_ix = seed_iy = None for the first point.
+    """
+    nx, ny = len(xpts), len(ypts)
+    ix0 = int(np.abs(np.asarray(xpts) - xbest).argmin())
+    iy0 = int(np.abs(np.asarray(ypts) - ybest).argmin())
+    nwaves = max(ix0, nx-1-ix0, iy0, ny-1-iy0) + 1
+    waves = [[] for i in range(nwaves)]
+    for iy in range(ny):
+        for ix in range(nx):
+            dx, dy = ix-ix0, iy-iy0
+            dist = max(abs(dx), abs(dy))
+            if dist == 0:
+                waves[0].append((ix, iy, None, None))
+                continue
+            sx = ix - int(np.sign(dx)) if abs(dx) == dist else ix
+            sy = iy - int(np.sign(dy)) if abs(dy) == dist else iy
+            waves[dist].append((ix, iy, sx, sy))
+    return waves
+
+def chi2_map(fit_result, xname, yname, nx=11, ny=11, sigma=3, xrange=None,
+             yrange=None, refit=True, nworkers=1, callback=None):
     """generate a confidence map for any two parameters for a fit
 
     Arguments
     ==========
-       minout   output of minimize() fit (must be run first)
+       minout   output of minimize() or feffit() fit (must be run first)
        xname    name of variable parameter for x-axis
        yname    name of variable parameter for y-axis
        nx       number of steps in x [11]
        ny       number of steps in y [11]
        sigma    scale for uncertainty range [3]
+       xrange   (min, max) range of x values [None, use sigma]
+       yrange   (min, max) range of y values [None, use sigma]
+       refit    whether to refit the other variables at each point [True].
+                With False, only the residual is evaluated, for a fast
+                scan of the chi-square landscape.
+       nworkers number of worker processes, for feffit() results [1]
+       callback function called as callback(ix, iy, chi2, map) as each
+                point is done, for progressive display [None]
 
     Returns
     =======
@@ -345,28 +393,57 @@ def chi2_map(fit_result, xname, yname, nx=11, ny=11, sigma=3, **kws):
     =====
      1.  sigma sets the extent of values to explore:
               param.value +/- sigma * param.stderr
+     2.  map has shape (ny, nx), and holds chi-square scaled as for
+         fit_result.chi_square.  Points not yet done are NaN.
+     3.  points are done in waves moving out from the best-fit values,
+         and each refit starts from the solution at its nearest neighbor
+         in the previous wave.
     """
-    #
+    if hasattr(fit_result, 'datasets') and hasattr(fit_result, 'paramgroup'):
+        from larch.xafs.feffit import feffit_chi2_map
+        return feffit_chi2_map(fit_result, xname, yname, nx=nx, ny=ny,
+                               sigma=sigma, xrange=xrange, yrange=yrange,
+                               refit=refit, nworkers=nworkers,
+                               callback=callback)
+
     fitter = getattr(fit_result, 'fitter', None)
     result = getattr(fit_result, 'fit_details', None)
     if fitter is None or result is None:
         raise ValueError("chi2_map needs valid fit result as first argument")
 
     c2_scale = fit_result.chi_square / result.chisqr
-
-    def scaled_chisqr(ndata, nparas, new_chi, best_chi, nfix=1.):
-        """return scaled chi-sqaure, instead of probability"""
-        return new_chi * c2_scale
-
-    x = result.params[xname]
-    y = result.params[yname]
-    xrange = (x.value + sigma * x.stderr, x.value - sigma * x.stderr)
-    yrange = (y.value + sigma * y.stderr, y.value - sigma * y.stderr)
-
-    return conf_interval2d(fitter, result, xname, yname,
-                           limits=(xrange, yrange),
-                           prob_func=scaled_chisqr,
-                           nx=nx, ny=ny, **kws)
+    params = deepcopy(result.params)
+    x, y = params[xname], params[yname]
+    xpts, ypts = chi2_map_points(x, y, nx=nx, ny=ny, sigma=sigma,
+                                 xrange=xrange, yrange=yrange)
+    names = [name for name, par in params.items() if par.expr is None]
+    best = {name: params[name].value for name in names}
+    x.vary = y.vary = False
+    refit = refit and len(result.var_names) > 2
+
+    chi2 = np.nan*np.zeros((ny, nx))
+    solved = {}
+    for wave in chi2_map_waves(xpts, ypts, x.value, y.value):
+        for ix, iy, sx, sy in wave:
+            start = solved.get((sx, sy), best)
+            for name in names:
+                params[name].value = start[name]
+            x.value, y.value = xpts[ix], ypts[iy]
+            if refit:
+                out = fitter.leastsq(params=params)
+                chisqr, pars = out.chisqr, out.params
+            else:
+                params.update_constraints()
+                resid = fitter.userfcn(params, *fitter.userargs, **fitter.userkws)
+                chisqr, pars = (np.asarray(resid)**2).sum(), params
+            solved[(ix, iy)] = {name: pars[name].value for name in names}
+            chi2[iy, ix] = chisqr*c2_scale
+            if callback is not None:
+                callback(ix, iy, chi2[iy, ix], chi2)
+    # the residual function may copy values to the parameter group:
+    # evaluate it once at the best-fit values to restore them.
+    fitter.userfcn(deepcopy(result.params), *fitter.userargs, **fitter.userkws)
+    return xpts, ypts, chi2
 
 def _Parameters(*arg, **kws):
     return Parameters(*arg, **kws)
@@ -7,11 +7,13 @@ Generic discrete convolution
 Description
 -----------
 
- This is a manual (not optimized!) implementation of discrete 1D
- convolution intended for spectroscopy analysis. The difference with
- commonly used methods is the possibility to adapt the convolution
- kernel for each convolution point, e.g. change the FWHM of the
- Gaussian kernel as a function of the energy scale.
+ This is an implementation of discrete 1D convolution intended for
+ spectroscopy analysis. The difference with commonly used methods is
+ the possibility to adapt the convolution kernel for each convolution
+ point, e.g. change the FWHM of the Gaussian kernel as a function of
+ the energy scale.  The kernels for all points are built once into a
+ sparse, banded matrix (see conv_matrix), which is cached and applied
+ to one spectrum or to a stack of spectra.
 
 Resources
 ---------
@@ -47,9 +49,12 @@ import subprocess
 from optparse import OptionParser
 from datetime import date
 from string import Template
+import hashlib
 import numpy as np
+from scipy import sparse
+from scipy.signal import fftconvolve
 
-from .lineshapes import gaussian, lorentzian
+from larch.utils.lrucache import LRUCache
 
 def get_ene_index(ene, cen, hwhm):
     """ returns the min/max indexes for array ene at (cen-hwhm) and (cen+hwhm)
@@ -61,7 +66,7 @@ def get_ene_index(ene, cen, hwhm):
         else:
             ene_imin = max(np.where(ene < (cen-hwhm))[0])
         if ((cen+hwhm) >= max(ene)):
-            ene_imax = (len(e)-1)
+            ene_imax = (len(ene)-1)
         else:
             ene_imax = min(np.where(ene > (cen+hwhm))[0])
         return ene_imin, ene_imax
@@ -113,13 +118,125 @@ def atan_gamma(ene, gamma_hole, gamma_max=15., e0=0, eslope=1.):
         eslope = 1.
     return gamma_hole + gamma_max * ( ( np.arctan( (ene - e0) / eslope ) / np.pi ) + 0.5 )
 
+class ConvolutionMatrix(object):
+    """linear operator for a convolution with an energy-dependent kernel,
+    built by conv_matrix(), applied with
+
+        z = cmat.apply(mu)     # mu: 1-d array, or 2-d array, one spectrum per row
+
+    z = band*(mask*mu) + extrap*(fit*(mask*mu)[-nfit:]), where band is a
+    sparse banded matrix of normalized kernel weights inside the energy
+    range, and the rank-2 term (extrap, fit) is the linear extrapolation
+    of the upper half of the spectrum, used for kernel points above
+    the last energy.
+    """
+    def __init__(self, band, extrap, fit, mask):
+        self.band = band
+        self.extrap = extrap
+        self.fit = fit
+        self.mask = mask
+
+    def __repr__(self):
+        return '<ConvolutionMatrix: %d points, %d nonzero>' % (self.band.shape[0],
+                                                               self.band.nnz)
+
+    def apply(self, mu):
+        """convolve mu (1-d, or 2-d with one spectrum per row)"""
+        mu = np.asarray(mu, dtype=np.float64)
+        f = np.atleast_2d(mu) * self.mask
+        nfit = self.fit.shape[1]
+        z = (self.band @ f.T).T + (f[:, -nfit:] @ self.fit.T) @ self.extrap.T
+        return z[0] if mu.ndim == 1 else z
+
+def _conv_kernel(kernel, dx, hwhm):
+    """unnormalized kernel values for conv()"""
+    if 'gauss' in kernel.lower():
+        return np.exp(-dx**2 / np.maximum(1.e-300, 2*hwhm**2))
+    elif 'lor' in kernel.lower():
+        return 1.0/(1 + (dx/np.maximum(1.e-300, hwhm))**2)
+    raise ValueError("convolution kernel '{0}' not implemented".format(kernel))
+
+_conv_matrices = LRUCache(maxsize=32, maxbytes=512*2**20)
+
+def _array_key(arr):
+    return hashlib.blake2b(np.ascontiguousarray(arr, dtype=np.float64).tobytes(),
+                           digest_size=16).hexdigest()
+
+def conv_matrix(e, fwhm_e, kernel='gaussian', efermi=None):
+    """return a ConvolutionMatrix for conv(), cached by energy array,
+    fwhm_e array, kernel, and efermi
+
+    Parameters
+    ----------
+    e : x-axis (energy)
+    fwhm_e : array of full width at half maximum for each energy
+    kernel : 'gaussian' or 'lorentzian'
+    efermi : energy below which mu is set to 0 [None]
+    """
+    e = np.asarray(e, dtype=np.float64)
+    fwhm_e = np.asarray(fwhm_e, dtype=np.float64)
+    key = (_array_key(e), _array_key(fwhm_e), kernel.lower(), efermi)
+    cached = _conv_matrices.get(key)
+    if cached is not None:
+        return cached[0]
+    _conv_kernel(kernel, 0.0, 1.0)   # check kernel name
+    npts = len(e)
+    mask = np.ones(npts)
+    if efermi is not None:
+        mask[:np.argmin(np.abs(e-efermi))] = 0.0
+
+    # linear fit of upper part of spectrum, as a (2, nfit) matrix
+    nfit = npts//2
+    vander = np.vander(e[-nfit:], 2)
+    fit = np.linalg.pinv(vander)
+
+    # extend upper energy border to 3*fhwm_e[-1]
+    estep = (e[-1] - e[-2])
+    eup = np.append(e, np.arange(e[-1]+estep, e[-1]+3*fwhm_e[-1], estep))
+    nup = len(eup)
+
+    # kernel range for each point, as get_ene_index(), with odd lengths
+    cen, hw = eup[:npts], 1.5*fwhm_e
+    imin = np.searchsorted(eup, cen-hw, side='left') - 1
+    imin[(cen-hw) <= eup.min()] = 0
+    imax = np.searchsorted(eup, cen+hw, side='right')
+    imax[(cen+hw) >= eup.max()] = nup - 1
+    nker = imax - imin
+    nker[nker % 2 == 0] += 1
+
+    # kernel weights, normalized for each row; the kernel is evaluated at
+    # eup[imin:imin+nker] and applied to points n-nker//2 ... n+nker//2
+    rows = np.repeat(np.arange(npts), nker)
+    offs = np.arange(nker.sum()) - np.repeat(np.cumsum(nker) - nker, nker)
+    wts = _conv_kernel(kernel, eup[np.repeat(imin, nker) + offs] - cen[rows],
+                       fwhm_e[rows]/2.0)
+    wts /= np.bincount(rows, weights=wts, minlength=npts)[rows]
+    cols = rows - np.repeat(nker//2, nker) + offs
+
+    # rows are in order, with increasing columns, so CSR arrays are direct
+    inside = (cols >= 0) & (cols < npts)
+    indptr = np.append(0, np.cumsum(np.bincount(rows[inside], minlength=npts)))
+    band = sparse.csr_matrix((wts[inside], cols[inside], indptr),
+                             shape=(npts, npts))
+    above = cols >= npts
+    extrap = np.zeros((npts, 2))
+    extrap[:, 0] = np.bincount(rows[above], minlength=npts,
+                               weights=wts[above]*eup[cols[above]])
+    extrap[:, 1] = np.bincount(rows[above], minlength=npts, weights=wts[above])
+
+    # arrays are included in the cached value so that their size is counted
+    cmat = ConvolutionMatrix(band, extrap, fit, mask)
+    _conv_matrices.put(key, (cmat, band.data, band.indices, extrap))
+    return cmat
+
 def conv(e, mu, kernel='gaussian', fwhm_e=None, efermi=None):
     """ linear broadening
 
     Parameters
     ----------
     e : x-axis (energy)
-    mu : f(x) to convolve with g(x) kernel, mu(energy)
+    mu : f(x) to convolve with g(x) kernel, mu(energy), or 2-d array
+         of spectra, one per row
     kernel : convolution kernel, g(x)
              'gaussian'
              'lorentzian'
@@ -127,52 +244,28 @@ def conv(e, mu, kernel='gaussian', fwhm_e=None, efermi=None):
             broadening. It is an array of size 'e' with constants or
             an energy-dependent values determined by a function as
             'lin_gamma()' or 'atan_gamma()'
+    efermi: energy below which mu is set to 0 before convolution [None]
+
+    Notes
+    -----
+    the convolution is done with a sparse, banded matrix built by
+    conv_matrix(), which is cached for each energy array, fwhm_e array,
+    kernel, and efermi.
     """
-    f = np.copy(mu)
-    z = np.zeros_like(f)
-    if efermi is not None:
-        #ief = index_nearest(e, efermi)
-        ief = np.argmin(np.abs(e-efermi))
-        f[0:ief] *= 0
     if e.shape != fwhm_e.shape:
         print("Error: 'fwhm_e' does not have the same shape of 'e'")
         return 0
-    # linar fit upper part of the spectrum to avoid border effects
-    # polyfit => pf
-    lpf = len(e)/2.
-    cpf = np.polyfit(e[-lpf:], f[-lpf:], 1)
-    fpf = np.poly1d(cpf)
-    # extend upper energy border to 3*fhwm_e[-1]
-    estep = (e[-1] - e[-2])
-    eup = np.append(e, np.arange(e[-1]+estep, e[-1]+3*fwhm_e[-1], estep))
-    for n in range(len(f)):
-        #from now on I change e with eup
-        eimin, eimax = get_ene_index(eup, eup[n], 1.5*fwhm_e[n])
-        if ((eimin is None) or (eimax is None)):
-            if DEBUG:
-                raise IndexError('e[{0}]'.format(n))
-        if len(range(eimin, eimax)) % 2 == 0:
-            kx = eup[eimin:eimax+1] # odd range centered at the convolution point
-        else:
-            kx = eup[eimin:eimax]
-        ### kernel ###
-        hwhm = fwhm_e[n]/2.0
-        if ('gauss' in kernel.lower()):
-            ky = gaussian(kx, center=eup[n], sigma=hwhm)
-        elif ('lor' in kernel.lower()):
-            ky = lorentzian(kx, center=eup[n], sigma=hwhm)
-        else:
-            raise ValueError("convolution kernel '{0}' not implemented".format(kernel))
-        ky = ky/ky.sum() # normalize
-        zn = 0
-        lk = len(kx)
-        for mf, mg in zip( range(-(lk/2), (lk/2)+1), range(lk) ):
-            if ( ((n+mf) >= 0) and ((n+mf) < len(f)) ):
-                zn += f[n+mf] * ky[mg]
-            elif ((n+mf) >= 0):
-                zn += fpf(eup[n+mf]) * ky[mg]
-        z[n] = zn
-    return z
+    return conv_matrix(e, fwhm_e, kernel=kernel, efermi=efermi).apply(mu)
+
+def conv_uniform(y, kernel, axis=-1):
+    """convolve y (1-d or 2-d) on a uniform grid with a fixed kernel
+    array, using FFTs, giving the first len(y) points of
+    np.convolve(y, kernel, mode='full') along axis"""
+    y = np.asarray(y, dtype=np.float64)
+    shape = [1]*y.ndim
+    shape[axis] = len(kernel)
+    out = fftconvolve(y, np.reshape(kernel, shape), mode='full', axes=axis)
+    return np.take(out, np.arange(y.shape[axis]), axis=axis)
 
 def glinbroad(e, mu, fwhm_e=None, efermi=None):
     """ gaussian linear convolution in Larch """
@@ -63,14 +63,15 @@ deriv.__doc__ = np.gradient.__doc__
 
 def realimag(arr):
     "return real array of real/imag pairs from complex array"
-    return np.array([(i.real, i.imag) for i in arr]).flatten()
+    arr = np.asarray(arr)
+    return np.stack((arr.real, arr.imag), axis=1).flatten()
 
 def complex_phase(arr):
-    "return phase, modulo 2pi jumps"
+    "return phase, modulo 2pi jumps (along the last axis)"
     phase = np.arctan2(arr.imag, arr.real)
     d   = np.diff(phase)/np.pi
     out = 1.0*phase[:]
-    out[1:] -= np.pi*(np.round(abs(d))*np.sign(d)).cumsum()
+    out[..., 1:] -= np.pi*(np.round(abs(d))*np.sign(d)).cumsum(axis=-1)
     return out
 
 def interp1d(x, y, xnew, kind='linear', fill_value=np.nan, **kws):
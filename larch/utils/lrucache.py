@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+bounded, least-recently-used cache with hit / miss statistics
+"""
+from collections import OrderedDict
+from threading import RLock
+import numpy as np
+
+def nbytes(value):
+    """approximate size in bytes of a cached value: counts numpy
+    arrays, including those in tuples, lists, and dicts"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    return 0
+
+class LRUCache(object):
+    """bounded, least-recently-used cache, with hit / miss counts
+
+       cache = LRUCache(maxsize=64)
+       val = cache.get(key)         # None if not found
+       if val is None:
+           val = cache.put(key, calculate(key))
+
+    Arguments
+    ---------
+      maxsize    maximum number of entries [128]
+      maxbytes   maximum total size of numpy arrays held [None, no limit]
+
+    The least recently used entries are discarded when either limit is
+    exceeded.  Access is protected with a lock, so that a cache may be
+    shared between threads.  A pickled cache is restored empty.
+    """
+    def __init__(self, maxsize=128, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._data = OrderedDict()
+        self._lock = RLock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '<LRUCache: %d entries, %d hits, %d misses>' % (len(self._data),
+                                                              self.hits, self.misses)
+
+    def __getstate__(self):
+        """state for pickling: the limits only, so that an object holding
+        a cache can be pickled.  The cache is restored empty."""
+        return dict(maxsize=self.maxsize, maxbytes=self.maxbytes)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def keys(self):
+        return list(self._data.keys())
+
+    def get(self, key, default=None):
+        """return cached value for key, or default if not found"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """add value to cache, returning value"""
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= nbytes(self._data.pop(key))
+            self._data[key] = value
+            self.nbytes += nbytes(value)
+            while len(self._data) > 0 and (len(self._data) > self.maxsize or
+                   (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+                _key, _val = self._data.popitem(last=False)
+                self.nbytes -= nbytes(_val)
+        return value
+
+    def pop(self, key, default=None):
+        """remove and return value for key"""
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self.nbytes -= nbytes(value)
+        return value
+
+    def discard(self, test):
+        """remove all entries for which test(key) is True"""
+        with self._lock:
+            for key in [k for k in self._data if test(k)]:
+                self.nbytes -= nbytes(self._data.pop(key))
+
+    def clear(self, reset_stats=True):
+        """remove all entries, and optionally reset hit / miss counts"""
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+            if reset_stats:
+                self.hits = self.misses = 0
+
+    def stats(self):
+        """return dict of cache statistics"""
+        ncalls = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses,
+                    hit_rate=self.hits/max(1, ncalls),
+                    size=len(self._data), maxsize=self.maxsize,
+                    nbytes=self.nbytes, maxbytes=self.maxbytes)
@@ -7,6 +7,11 @@ function         description
 ------------     ------------------------------
 pre_edge         pre_edge subtraction, normalization
 autobk           XAFS background subtraction (mu(E) to chi(k))
+pre_edge_batch   pre_edge for many spectra on one energy array
+autobk_batch     autobk for many spectra on one energy array
+find_e0_batch    find_e0 for many spectra at once
+estimate_noise_batch  estimate_noise for many chi(k) spectra at once
+mback_norm_batch mback_norm for many spectra on one energy array
 xftf             forward XAFS Fourier transform (k -> R)
 xftr             backward XAFS Fourier transform, Filter (R -> q)
 ftwindow         create XAFS Fourier transform window
@@ -19,32 +24,42 @@ feffit_dataset   create a Dataset for Feffit
 feffit_transform create a Feffit transform group
 feffit           fit a set of Feff Paths to Feffit Datasets
 feffit_report    create a report from feffit() results
+feffit_bootstrap parameter distributions from refits of synthetic data
+feffit_chi2_map  chi-square map for two variables of a feffit
 '''
 
 
 from .xafsutils import KTOE, ETOK, set_xafsGroup, etok, ktoe, guess_energy_units
-from .xafsft import xftf, xftr, xftf_fast, xftr_fast, ftwindow, xftf_prep
-from .pre_edge import pre_edge, preedge, find_e0, pre_edge_baseline, prepeaks_setup
-from .feffdat import FeffDatFile, FeffPathGroup, feffpath, path2chi, ff2chi
-from .feffit import (FeffitDataSet, TransformGroup, feffit,
-                     feffit_dataset, feffit_transform, feffit_report)
+from .xafsft import (xftf, xftr, xftf_fast, xftr_fast, ftwindow, xftf_prep,
+                     ftwindow_uniform, ftwindow_kweight, ftwindow_cache_stats)
+from .pre_edge import (pre_edge, preedge, find_e0, pre_edge_baseline,
+                       prepeaks_setup, pre_edge_batch, find_e0_batch)
+from .feffdat import (FeffDatFile, FeffPathGroup, FeffPathStack, feffpath,
+                      path2chi, ff2chi)
+from .feffit import (FeffitDataSet, TransformGroup, FeffitResidualPool, feffit,
+                     feffit_dataset, feffit_transform, feffit_report,
+                     feffit_bootstrap, feffit_chi2_map, iter_feffit_chi2_map)
 
-from .autobk import autobk
-from .mback import mback, mback_norm
+from .autobk import autobk, autobk_batch
+from .mback import (mback, mback_norm, mback_norm_batch, xray_table,
+                    xraydb_cache_stats)
 from .diffkk import diffkk, diffKKGroup
 from .fluo import fluo_corr
 
 ## from .cif2feff import cif_sites, cif2feff6l
 
-from .feffrunner import FeffRunner, feffrunner, feff6l, feff8l, find_exe
+from .feffcache import FeffDatCache, get_feffdat_cache, set_feffdat_cache
+from .feffrunner import (FeffRunner, feffrunner, feff6l, feff8l, find_exe,
+                         FeffJob, FeffJobQueue, feff_jobs)
 from .feff8lpath import feff8_xafs
 from .feffutils import get_feff_pathinfo
 
 from .cauchy_wavelet import cauchy_wavelet
 from .deconvolve import xas_convolve, xas_deconvolve
-from .estimate_noise import estimate_noise
+from .estimate_noise import estimate_noise, estimate_noise_batch
 from .rebin_xafs import rebin_xafs, sort_xafs
-from .sigma2_models import sigma2_eins, sigma2_debye, sigma2_correldebye, gnxas
+from .sigma2_models import (sigma2_eins, sigma2_debye, sigma2_correldebye, gnxas,
+                            sigma2_debye_paths)
 
 
 def _larch_init(_larch):
@@ -54,33 +69,47 @@ def _larch_init(_larch):
     _larch.symtable.set_symbol('_xafs._feff_executable', feff6_exe)
 
 
-_larch_groups = (diffKKGroup, FeffRunner, FeffDatFile, FeffPathGroup,
+_larch_groups = (diffKKGroup, FeffRunner, FeffJob, FeffDatFile, FeffPathGroup,
                  TransformGroup, FeffitDataSet)
 
-_larch_builtins = {'_xafs': dict(autobk=autobk, etok=etok, ktoe=ktoe,
+_larch_builtins = {'_xafs': dict(autobk=autobk, autobk_batch=autobk_batch,
+                                 etok=etok, ktoe=ktoe,
                                  guess_energy_units=guess_energy_units,
                                  diffkk=diffkk, xftf=xftf, xftr=xftr,
                                  xftf_prep=xftf_prep, xftf_fast=xftf_fast,
                                  xftr_fast=xftr_fast, ftwindow=ftwindow,
-                                 find_e0=find_e0, pre_edge=pre_edge,
+                                 find_e0=find_e0, find_e0_batch=find_e0_batch,
+                                 pre_edge=pre_edge,
+                                 pre_edge_batch=pre_edge_batch,
                                  prepeaks_setup=prepeaks_setup,
                                  pre_edge_baseline=pre_edge_baseline,
                                  mback=mback, mback_norm=mback_norm,
+                                 mback_norm_batch=mback_norm_batch,
+                                 xray_table=xray_table,
+                                 xraydb_cache_stats=xraydb_cache_stats,
                                  cauchy_wavelet=cauchy_wavelet,
                                  xas_deconvolve=xas_deconvolve,
                                  xas_convolve=xas_convolve,
                                  fluo_corr=fluo_corr,
                                  estimate_noise=estimate_noise,
+                                 estimate_noise_batch=estimate_noise_batch,
                                  rebin_xafs=rebin_xafs,
                                  sort_xafs=sort_xafs,
                                  gnxas=gnxas,
                                  sigma2_eins=sigma2_eins,
-                                 sigma2_debye=sigma2_debye, feffit=feffit,
+                                 sigma2_debye=sigma2_debye,
+                                 sigma2_debye_paths=sigma2_debye_paths,
+                                 feffit=feffit,
                                  feffit_dataset=feffit_dataset,
                                  feffit_transform=feffit_transform,
                                  feffit_report=feffit_report,
+                                 feffit_bootstrap=feffit_bootstrap,
+                                 feffit_chi2_map=feffit_chi2_map,
                                  feffrunner=feffrunner, feff6l=feff6l,
-                                 feff8l=feff8l, feffpath= feffpath,
+                                 feff8l=feff8l, feff_jobs=feff_jobs,
+                                 feffpath= feffpath,
                                  path2chi=path2chi, ff2chi=ff2chi,
                                  feff8_xafs=feff8_xafs,
-                                 get_feff_pathinfo=get_feff_pathinfo)}
+                                 get_feff_pathinfo=get_feff_pathinfo,
+                                 get_feffdat_cache=get_feffdat_cache,
+                                 set_feffdat_cache=set_feffdat_cache)}
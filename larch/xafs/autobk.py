@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 import sys
+import time
 import numpy as np
-from scipy.interpolate import splrep, splev, UnivariateSpline
+from scipy.interpolate import splrep, splev, UnivariateSpline, BSpline
 from scipy.stats import t
 from scipy.special import erf
+from scipy.optimize import leastsq as scipy_leastsq
 from lmfit import Parameter, Parameters, minimize, fit_report
+from lmfit.minimizer import MinimizerResult
 
 import uncertainties
 
@@ -12,9 +15,10 @@ from larch import (Group, Make_CallArgs, parse_group_args, isgroup)
 
 from larch.math import index_of, index_nearest, realimag, remove_dups
 
-from .xafsutils import ETOK, set_xafsGroup
-from .xafsft import ftwindow, xftf_fast
-from .pre_edge import find_e0, pre_edge
+from .xafsutils import ETOK, set_xafsGroup, batch_chunks, batch_map
+from .xafsft import ftwindow_kweight, xftf_fast
+from .pre_edge import find_e0, pre_edge, pre_edge_batch
+from .estimate_noise import estimate_noise_batch
 
 FMT_COEF = 'coef_%2.2i'
 
@@ -24,6 +28,159 @@ def spline_eval(kraw, mu, knots, coefs, order, kout):
     chi = UnivariateSpline(kraw, (mu-bkg), s=0)(kout)
     return bkg, chi
 
+def spline_design(kraw, kout, knots, order, ncoefs):
+    """design matrices for the background spline: returns
+    (bkg_basis, chi_basis), with bkg_basis[:, i] the background on the
+    kraw grid and chi_basis[:, i] the resulting chi on the kout grid for
+    coefficient i set to 1 (and mu=0), so that for any coefficients
+
+       bkg = bkg_basis @ coefs
+       chi = spline(mu)(kout) + chi_basis @ coefs
+    """
+    bkg_basis = BSpline(knots, np.eye(ncoefs), order)(kraw)
+    chi_basis = np.zeros((len(kout), ncoefs))
+    for i in range(ncoefs):
+        if abs(bkg_basis[:, i]).max() > 0:
+            chi_basis[:, i] = UnivariateSpline(kraw, -bkg_basis[:, i], s=0)(kout)
+    return bkg_basis, chi_basis
+
+def autobk_lstsq(params, nvarys=1, knots=None, order=3, irbkg=1, nfft=2048,
+                 kraw=None, mu=None, kout=None, ftwin=1, chi_std=None,
+                 nclamp=0, clamp_lo=1, clamp_hi=1, design=None, start=None,
+                 max_nfev=200, **kws):
+    """solve for the autobk spline coefficients by linear least-squares.
+
+    The autobk residual is linear in the spline coefficients, except for
+    the scale of the clamps, which depends on the size of the residual.
+    The design matrix is calculated once, so that the residual and its
+    Jacobian need no more spline fits or FFTs.  Without clamps, the
+    coefficients are found with lstsq().  With clamps, they are refined
+    with leastsq() using the exact Jacobian.
+
+    design can be the `design` from an earlier result for the same energy
+    and k arrays, knots and FT window, to skip calculating the design
+    matrices.  start can give starting values for the coefficients for
+    the nonlinear refinement, as from the solution for a similar spectrum.
+
+    Returns a MinimizerResult with the same statistics and parameter
+    uncertainties as from the nonlinear fit, and with `design` holding the
+    design matrices.  The values in params are updated.
+    """
+    ncoefs = len(params)
+    coefs = np.array([params[FMT_COEF % i].value for i in range(ncoefs)])
+    if design is None:
+        bkg_basis, chi_basis = spline_design(kraw, kout, knots, order, ncoefs)
+        # FT of the varied chi columns
+        dft = xftf_fast((chi_basis[:, :nvarys]*ftwin[:, np.newaxis]).T,
+                        nfft=nfft)[:, :irbkg]
+        dft = np.stack((dft.real, dft.imag), axis=-1).reshape(nvarys, -1).T
+        design = (bkg_basis, chi_basis, dft)
+    bkg_basis, chi_basis, dft = design
+
+    # chi = chi0 + dchi @ coefs[:nvarys]
+    chi0 = UnivariateSpline(kraw, mu, s=0)(kout)
+    if chi_std is not None:
+        chi0 = chi0 - chi_std
+    chi0 = chi0 + chi_basis[:, nvarys:] @ coefs[nvarys:]
+    dchi = chi_basis[:, :nvarys]
+
+    # FT part of residual = ft0 + dft @ coefs[:nvarys]
+    ft0 = realimag(xftf_fast(chi0*ftwin, nfft=nfft)[:irbkg])
+
+    # residual = [ft0 + dft @ x, scale(x)*(clamp0 + dclamp @ x)]
+    # with clamp scale = 1 + 100*mean(ftres**2)
+    nft = len(ft0)
+    if nclamp > 0:
+        clamps = np.concatenate((abs(clamp_lo)*np.ones(nclamp),
+                                 abs(clamp_hi)*np.ones(nclamp)))
+        iclamp = np.concatenate((np.arange(nclamp),
+                                 np.arange(len(kout)-nclamp, len(kout))))
+        clamp0 = clamps*chi0[iclamp]
+        dclamp = clamps[:, np.newaxis]*dchi[iclamp]
+
+    def resid_func(x):
+        ftres = ft0 + dft @ x
+        if nclamp == 0:
+            return ftres
+        scale = 1.0 + 100*(ftres*ftres).mean()
+        return np.concatenate((ftres, scale*(clamp0 + dclamp @ x)))
+
+    def jacobian(x):
+        if nclamp == 0:
+            return dft
+        ftres = ft0 + dft @ x
+        scale = 1.0 + 100*(ftres*ftres).mean()
+        dscale = (200.0/nft) * (ftres @ dft)
+        return np.concatenate((dft, scale*dclamp +
+                               np.outer(clamp0 + dclamp @ x, dscale)))
+
+    # without clamps, the residual is linear: solve with lstsq.
+    # with clamps, refine from the initial (or start) coefficients and
+    # from the linear solution (with the initial clamp scale) using the
+    # exact Jacobian, keeping the better result.
+    vals = coefs[:nvarys]
+    ftres = ft0 + dft @ vals
+    scale = 1.0
+    if nclamp > 0:
+        scale = 1.0 + 100*(ftres*ftres).mean()
+        amat = np.concatenate((dft, scale*dclamp))
+        target = np.concatenate((ft0, scale*clamp0))
+    else:
+        amat, target = dft, ft0
+    lvals = np.linalg.lstsq(amat, -target, rcond=None)[0]
+    nfev = 1
+    if nclamp == 0:
+        vals = lvals
+    else:
+        best = None
+        if start is not None:
+            vals = np.asarray(start)
+        for x0 in (vals, lvals):
+            out = scipy_leastsq(resid_func, x0, Dfun=jacobian,
+                                full_output=True, maxfev=max_nfev)
+            nfev += out[2]['nfev']
+            chisqr = (out[2]['fvec']**2).sum()
+            if best is None or chisqr < best[0]:
+                best = (chisqr, out[0])
+        vals = best[1]
+    amat = jacobian(vals)
+    resid = resid_func(vals)
+    ndata = len(resid)
+    chisqr = (resid*resid).sum()
+    nfree = max(1, ndata - nvarys)
+    redchi = chisqr / nfree
+    _neg2_log_likel = ndata*np.log(max(chisqr, 1.e-250)/ndata)
+
+    var_names = [FMT_COEF % i for i in range(nvarys)]
+    for name, val in zip(var_names, vals):
+        params[name].value = val
+
+    result = MinimizerResult(method='lstsq', params=params, var_names=var_names,
+                             nvarys=nvarys, ndata=ndata, nfree=nfree, nfev=nfev,
+                             residual=resid, chisqr=chisqr, redchi=redchi,
+                             aic=_neg2_log_likel + 2*nvarys,
+                             bic=_neg2_log_likel + np.log(ndata)*nvarys,
+                             init_vals=list(coefs[:nvarys]), covar=None,
+                             errorbars=False, success=True,
+                             message='linear least-squares solution',
+                             design=design)
+    try:
+        covar = np.linalg.inv(amat.T @ amat) * redchi
+    except np.linalg.LinAlgError:
+        covar = None
+    if covar is not None and np.all(np.diag(covar) > 0):
+        result.covar = covar
+        result.errorbars = True
+        stderr = np.sqrt(np.diag(covar))
+        for i, name in enumerate(var_names):
+            par = params[name]
+            par.stderr = stderr[i]
+            par.correl = {}
+            for j, name2 in enumerate(var_names):
+                if i != j:
+                    par.correl[name2] = covar[i, j]/(stderr[i]*stderr[j])
+    return result
+
 def __resid(pars, ncoefs=1, knots=None, order=3, irbkg=1, nfft=2048,
             kraw=None, mu=None, kout=None, ftwin=1, kweight=1, chi_std=None,
             nclamp=0, clamp_lo=1, clamp_hi=1, **kws):
@@ -47,7 +204,7 @@ def __resid(pars, ncoefs=1, knots=None, order=3, irbkg=1, nfft=2048,
 def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None,
            edge_step=None, kmin=0, kmax=None, kweight=1, dk=0.1,
            win='hanning', k_std=None, chi_std=None, nfft=2048, kstep=0.05,
-           pre_edge_kws=None, nclamp=3, clamp_lo=0, clamp_hi=1,
+           pre_edge_kws=None, nclamp=3, clamp_lo=0, clamp_hi=1, linear=True,
            calc_uncertainties=True, err_sigma=1, _larch=None, **kws):
     """Use Autobk algorithm to remove XAFS background
 
@@ -74,6 +231,8 @@ def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None,
       nclamp:    number of energy end-points for clamp [3]
       clamp_lo:  weight of low-energy clamp [0]
       clamp_hi:  weight of high-energy clamp [1]
+      linear:    solve for the spline coefficients by linear least-squares
+                 [True].  If False, the nonlinear fit with lmfit is used.
       calc_uncertaintites:  Flag to calculate uncertainties in
                             mu_0(E) and chi(k) [True]
       err_sigma: sigma level for uncertainties in mu_0(E) and chi(k) [1]
@@ -125,6 +284,24 @@ def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None,
         msg('autobk() could not determine e0 or edge_step!: trying running pre_edge first\n')
         return
 
+    setup = _autobk_setup(energy, e0, rbkg=rbkg, nknots=nknots, kmin=kmin,
+                          kmax=kmax, kweight=kweight, dk=dk, win=win,
+                          k_std=k_std, chi_std=chi_std, nfft=nfft, kstep=kstep)
+
+    group = set_xafsGroup(group, _larch=_larch)
+    _autobk_spectrum(setup, mu, edge_step, group, linear=linear,
+                     nclamp=nclamp, clamp_lo=clamp_lo, clamp_hi=clamp_hi,
+                     calc_uncertainties=calc_uncertainties,
+                     err_sigma=err_sigma)
+
+
+def _autobk_setup(energy, e0, rbkg=1, nknots=None, kmin=0, kmax=None,
+                  kweight=1, dk=0.1, win='hanning', k_std=None, chi_std=None,
+                  nfft=2048, kstep=0.05):
+    """the parts of autobk() that depend only on the energy array and e0,
+    and so can be shared by many spectra: k arrays, FT window, spline knots,
+    and indices for the initial spline values.  Returns a Group.
+    """
     # get array indices for rkbg and e0: irbkg, ie0
     ie0 = index_of(energy, e0)
     rgrid = np.pi/(kstep*nfft)
@@ -145,75 +322,87 @@ def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None,
     if chi_std is not None and k_std is not None:
         chi_std = np.interp(kout, k_std, chi_std)
     # pre-load FT window
-    ftwin = kout**kweight * ftwindow(kout, xmin=kmin, xmax=kmax,
-                                     window=win, dx=dk, dx2=dk)
-    # calc k-value and initial guess for y-values of spline params
+    ftwin = ftwindow_kweight(kweight, len(kout), kstep=kstep, kmin=kmin,
+                             kmax=kmax, dk=dk, dk2=dk, window=win)
+    # calc k-value and indices for initial guess of y-values of spline params
     nspl = 1 + int(2*rbkg*(kmax-kmin)/np.pi)
     irbkg = int(1 + (nspl-1)*np.pi/(2*rgrid*(kmax-kmin)))
     if nknots is not None:
         nspl = nknots
     nspl = max(5, min(128, nspl))
-    spl_y, spl_k  = np.ones(nspl), np.zeros(nspl)
+    spl_k = np.zeros(nspl)
+    ispl = np.zeros((3, nspl), dtype=int)
     for i in range(nspl):
         q  = kmin + i*(kmax-kmin)/(nspl - 1)
         ik = index_nearest(kraw, q)
-        i1 = min(len(kraw)-1, ik + 5)
-        i2 = max(0, ik - 5)
         spl_k[i] = kraw[ik]
-        spl_y[i] = (2*mu[ik+ie0] + mu[i1+ie0] + mu[i2+ie0] ) / 4.0
+        ispl[:, i] = (ik, min(len(kraw)-1, ik + 5), max(0, ik - 5))
+
+    return Group(e0=e0, ie0=ie0, iemax=iemax, kraw=kraw[:iemax-ie0+1],
+                 kout=kout, kmin=kmin, kmax=kmax, kweight=kweight,
+                 ftwin=ftwin, nfft=nfft, chi_std=chi_std, nspl=nspl,
+                 irbkg=irbkg, spl_k=spl_k, ispl=ispl+ie0, order=3,
+                 design=None)
 
-    order = 3
-    qmin, qmax  = spl_k[0], spl_k[nspl-1]
-    knots = [spl_k[0] - 1.e-4*(order-i) for i in range(order)]
 
-    for i in range(order, nspl):
-        knots.append((i-order)*(qmax - qmin)/(nspl-order+1))
-    qlast = knots[-1]
-    for i in range(order+1):
-        knots.append(qlast + 1.e-4*(i+1))
+def _autobk_spectrum(setup, mu, edge_step, group, linear=True, start=None,
+                     nclamp=3, clamp_lo=0, clamp_hi=1, calc_uncertainties=True,
+                     err_sigma=1, report=True):
+    """remove background for one spectrum mu, with the shared parts from
+    _autobk_setup(), writing outputs to group.
 
-    coefs = [mu[index_nearest(energy, e0 + q**2/ETOK)] for q in knots]
-    knots, coefs, order = splrep(spl_k, spl_y, k=order)
+    For linear=True, the design matrices are saved in setup for reuse with
+    other spectra, and start can give starting values for the coefficients,
+    as from a similar spectrum.  Returns the varied coefficients.
+    """
+    ie0, iemax, nspl = setup.ie0, setup.iemax, setup.nspl
+    kraw, kout = setup.kraw, setup.kout
+    spl_y = (2*mu[setup.ispl[0]] + mu[setup.ispl[1]] + mu[setup.ispl[2]])/4.0
+    knots, coefs, order = splrep(setup.spl_k, spl_y, k=setup.order)
     coefs[nspl:] = coefs[nspl-1]
 
     # set fit parameters from initial coefficients
     params = Parameters()
     for i in range(len(coefs)):
-        params.add(name = FMT_COEF % i, value=coefs[i], vary=i<len(spl_y))
+        params.add(name = FMT_COEF % i, value=coefs[i], vary=i<nspl)
 
-    initbkg, initchi = spline_eval(kraw[:iemax-ie0+1], mu[ie0:iemax+1],
+    initbkg, initchi = spline_eval(kraw, mu[ie0:iemax+1],
                                    knots, coefs, order, kout)
 
     # do fit
-    result = minimize(__resid, params, method='leastsq',
-                      gtol=1.e-6, ftol=1.e-6, xtol=1.e-6, epsfcn=1.e-6,
-                      kws = dict(ncoefs=len(coefs), chi_std=chi_std,
-                                 knots=knots, order=order,
-                                 kraw=kraw[:iemax-ie0+1],
-                                 mu=mu[ie0:iemax+1], irbkg=irbkg, kout=kout,
-                                 ftwin=ftwin, kweight=kweight,
-                                 nfft=nfft, nclamp=nclamp,
-                                 clamp_lo=clamp_lo, clamp_hi=clamp_hi))
+    fit_kws = dict(chi_std=setup.chi_std, knots=knots, order=order,
+                   kraw=kraw, mu=mu[ie0:iemax+1],
+                   irbkg=setup.irbkg, kout=kout, ftwin=setup.ftwin,
+                   kweight=setup.kweight, nfft=setup.nfft, nclamp=nclamp,
+                   clamp_lo=clamp_lo, clamp_hi=clamp_hi)
+    if linear:
+        result = autobk_lstsq(params, nvarys=nspl, design=setup.design,
+                              start=start, **fit_kws)
+        setup.design = result.design
+    else:
+        result = minimize(__resid, params, method='leastsq',
+                          gtol=1.e-6, ftol=1.e-6, xtol=1.e-6, epsfcn=1.e-6,
+                          kws=dict(ncoefs=len(coefs), **fit_kws))
 
     # write final results
     coefs = [result.params[FMT_COEF % i].value for i in range(len(coefs))]
-    bkg, chi = spline_eval(kraw[:iemax-ie0+1], mu[ie0:iemax+1],
-                           knots, coefs, order, kout)
+    bkg, chi = spline_eval(kraw, mu[ie0:iemax+1], knots, coefs, order, kout)
     obkg = np.copy(mu)
     obkg[ie0:ie0+len(bkg)] = bkg
 
     # outputs to group
-    group = set_xafsGroup(group, _larch=_larch)
     group.bkg  = obkg
     group.chie = (mu-obkg)/edge_step
     group.k    = kout
     group.chi  = chi/edge_step
-    group.e0   = e0
+    group.e0   = setup.e0
 
     # now fill in 'autobk_details' group
-    details = Group(kmin=kmin, kmax=kmax, irbkg=irbkg, nknots=len(spl_k),
-                    knots_k=knots, init_knots_y=spl_y, nspl=nspl,
-                    init_chi=initchi/edge_step, report=fit_report(result))
+    details = Group(kmin=setup.kmin, kmax=setup.kmax, irbkg=setup.irbkg,
+                    nknots=nspl, knots_k=knots, init_knots_y=spl_y,
+                    nspl=nspl, init_chi=initchi/edge_step)
+    if report:
+        details.report = fit_report(result)
     details.init_bkg = np.copy(mu)
     details.init_bkg[ie0:ie0+len(bkg)] = initbkg
     details.knots_y  = np.array([coefs[i] for i in range(nspl)])
@@ -241,27 +430,30 @@ def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None,
         cvals = np.array(cvals)
         cerrs = np.array(cerrs)
 
-        # find derivatives by hand!
-        _k = kraw[:nmue]
-        _m = mu[ie0:iemax+1]
-        for i in range(nspl):
-            cval0 = cvals[i]
-            cvals[i] = cval0 + cerrs[i]
-            bkg1, chi1 = spline_eval(_k, _m, knots, cvals, order, kout)
-
-            cvals[i] = cval0 - cerrs[i]
-            bkg2, chi2 = spline_eval(_k, _m, knots, cvals, order, kout)
-
-            cvals[i] = cval0
-            jac_chi[i] = (chi1 - chi2) / (2*cerrs[i])
-            jac_bkg[i] = (bkg1 - bkg2) / (2*cerrs[i])
-
-        dfchi = np.zeros(nchi)
-        dfbkg = np.zeros(nmue)
-        for i in range(nspl):
-            for j in range(nspl):
-                dfchi += jac_chi[i]*jac_chi[j]*covar[i,j]
-                dfbkg += jac_bkg[i]*jac_bkg[j]*covar[i,j]
+        # derivatives of bkg and chi with respect to the coefficients:
+        # known from the design matrices for the linear least-squares
+        # solution, otherwise find derivatives by hand!
+        design = getattr(result, 'design', None)
+        if design is not None:
+            jac_bkg = design[0][:, :nspl].T
+            jac_chi = design[1][:, :nspl].T
+        else:
+            for i in range(nspl):
+                cval0 = cvals[i]
+                cvals[i] = cval0 + cerrs[i]
+                bkg1, chi1 = spline_eval(kraw, mu[ie0:iemax+1], knots, cvals,
+                                         order, kout)
+
+                cvals[i] = cval0 - cerrs[i]
+                bkg2, chi2 = spline_eval(kraw, mu[ie0:iemax+1], knots, cvals,
+                                         order, kout)
+
+                cvals[i] = cval0
+                jac_chi[i] = (chi1 - chi2) / (2*cerrs[i])
+                jac_bkg[i] = (bkg1 - bkg2) / (2*cerrs[i])
+
+        dfchi = np.einsum('ik,ij,jk->k', jac_chi, covar, jac_chi)
+        dfbkg = np.einsum('ik,ij,jk->k', jac_bkg, covar, jac_bkg)
 
         prob = 0.5*(1.0 + erf(err_sigma/np.sqrt(2.0)))
         dchi = t.ppf(prob, nchi-nspl) * np.sqrt(dfchi*redchi)
@@ -270,3 +462,152 @@ def autobk(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None,
         group.delta_chi = dchi
         group.delta_bkg = 0.0*mu
         group.delta_bkg[ie0:ie0+len(dbkg)] = dbkg
+    return np.array(coefs[:nspl])
+
+
+def _autobk_chunk(args):
+    """autobk_batch() worker: remove background for a chunk of spectra,
+    sharing the setup for spectra with the same e0, and starting each
+    fit from the solution for the previous spectrum"""
+    energy, mu, e0, edge_step, setup_kws, kws, warm_start = args
+    setups = {}
+    out = []
+    coefs = None
+    for i in range(mu.shape[0]):
+        if e0[i] not in setups:
+            setups[e0[i]] = _autobk_setup(energy, e0[i], **setup_kws)
+        setup = setups[e0[i]]
+        start = None
+        if warm_start and coefs is not None and len(coefs) == setup.nspl:
+            start = coefs
+        grp = Group()
+        coefs = _autobk_spectrum(setup, mu[i], edge_step[i], grp,
+                                 start=start, report=False, **kws)
+        out.append(grp)
+    return out
+
+def _stack(arrays, fill=0.0):
+    "stack 1-d arrays as rows of a 2-d array, padding to the longest"
+    npts = max(len(a) for a in arrays)
+    out = fill*np.ones((len(arrays), npts))
+    for i, a in enumerate(arrays):
+        out[i, :len(a)] = a
+    return out
+
+@Make_CallArgs(["energy" ,"mu"])
+def autobk_batch(energy, mu=None, group=None, rbkg=1, nknots=None, e0=None,
+                 edge_step=None, kmin=0, kmax=None, kweight=1, dk=0.1,
+                 win='hanning', k_std=None, chi_std=None, nfft=2048,
+                 kstep=0.05, pre_edge_kws=None, nclamp=3, clamp_lo=0,
+                 clamp_hi=1, calc_uncertainties=False, err_sigma=1,
+                 calc_noise=False, nworkers=1, warm_start=True, _larch=None,
+                 **kws):
+    """Use Autobk algorithm to remove XAFS background, as for autobk(),
+    for many spectra measured on the same energy array, such as from a
+    time-resolved experiment.
+
+    Parameters:
+    -----------
+      energy:    1-d array of x-ray energies, in eV, or group
+      mu:        2-d array of mu(E), with one spectrum per row
+      group:     output group (and input group for e0 and edge_step).
+      e0:        edge energy, in eV: a single value, an array with one value
+                 per spectrum, or None to use pre_edge_batch().
+      edge_step: edge step: a single value, an array of values, or None
+                 to use pre_edge_batch().
+      calc_uncertaintites:  Flag to calculate uncertainties in
+                            mu_0(E) and chi(k) [False]
+      calc_noise: Flag to estimate the noise in chi(k) for all spectra
+                 with estimate_noise_batch(), using kweight and the k
+                 range common to all spectra [False]
+      nworkers:  number of processes to use [1]
+      warm_start: whether to start the fit for each spectrum from the
+                 result for the previous spectrum [True]
+
+    All other arguments are as for autobk(), and are used for all spectra.
+
+    Output arrays are written to the provided group, as for autobk(), with
+    one row per spectrum.  The chi arrays for spectra with different e0
+    may have different lengths: these are padded with zeros to the longest
+    k array.  In addition, autobk_details will have
+        nspectra          number of spectra
+        nworkers          number of processes used
+        elapsed_time      time for processing, in seconds
+        spectra_per_sec   throughput, in spectra per second
+
+    Notes:
+    ------
+      1. The k arrays, FT window, spline knots, and the design matrix for
+         the linear least-squares solution are calculated once for each
+         distinct value of e0, and shared by all spectra with that e0.
+      2. The spectra are split into contiguous chunks, one per process,
+         so that warm starts come from neighboring spectra.
+      3. Follows the 'First Argument Group' convention.
+    """
+    t0 = time.time()
+    if 'kw' in kws:
+        kweight = kws.pop('kw')
+    if len(kws) > 0:
+        raise TypeError('unrecognized arguments for autobk_batch(): %s' %
+                        (', '.join(kws.keys())))
+    energy, mu, group = parse_group_args(energy, members=('energy', 'mu'),
+                                         defaults=(mu,), group=group,
+                                         fcn_name='autobk_batch')
+    energy = remove_dups(energy.squeeze())
+    mu = np.atleast_2d(mu)
+    nspec = mu.shape[0]
+    group = set_xafsGroup(group, _larch=_larch)
+
+    if edge_step is None and isgroup(group, 'edge_step'):
+        edge_step = group.edge_step
+    if e0 is None and isgroup(group, 'e0'):
+        e0 = group.e0
+    if e0 is None or edge_step is None:
+        pre_kws = dict(nnorm=None, nvict=0, pre1=None,
+                       pre2=None, norm1=None, norm2=None)
+        if pre_edge_kws is not None:
+            pre_kws.update(pre_edge_kws)
+        pre_edge_batch(energy, mu, group=group, e0=e0, nworkers=nworkers,
+                       _larch=_larch, **pre_kws)
+        if e0 is None:
+            e0 = group.e0
+        if edge_step is None:
+            edge_step = group.edge_step
+    e0 = e0*np.ones(nspec)
+    edge_step = edge_step*np.ones(nspec)
+
+    setup_kws = dict(rbkg=rbkg, nknots=nknots, kmin=kmin, kmax=kmax,
+                     kweight=kweight, dk=dk, win=win, k_std=k_std,
+                     chi_std=chi_std, nfft=nfft, kstep=kstep)
+    fit_kws = dict(nclamp=nclamp, clamp_lo=clamp_lo, clamp_hi=clamp_hi,
+                   calc_uncertainties=calc_uncertainties, err_sigma=err_sigma)
+    chunks = batch_chunks(nspec, nworkers)
+    args = [(energy, mu[c], e0[c], edge_step[c], setup_kws, fit_kws,
+             warm_start) for c in chunks]
+    outs = []
+    for out in batch_map(_autobk_chunk, args, nworkers=nworkers):
+        outs.extend(out)
+
+    group.bkg  = np.array([o.bkg for o in outs])
+    group.chie = np.array([o.chie for o in outs])
+    group.chi  = _stack([o.chi for o in outs])
+    group.k    = kstep*np.arange(group.chi.shape[1])
+    group.e0   = e0
+    if calc_uncertainties:
+        group.delta_chi = _stack([o.delta_chi for o in outs])
+        group.delta_bkg = np.array([o.delta_bkg for o in outs])
+
+    details = group.autobk_details = Group()
+    for attr in ('kmin', 'kmax', 'irbkg', 'nknots', 'nspl', 'nfev',
+                 'redchi', 'chisqr', 'aic', 'bic'):
+        setattr(details, attr, np.array([getattr(o.autobk_details, attr)
+                                         for o in outs]))
+    details.knots_y = [o.autobk_details.knots_y for o in outs]
+    if calc_noise:
+        estimate_noise_batch(group.k, group.chi, group=group, kweight=kweight,
+                             kmin=details.kmin.max(), kmax=details.kmax.min(),
+                             kstep=kstep, nfft=nfft)
+    details.nspectra = nspec
+    details.nworkers = nworkers
+    details.elapsed_time = time.time() - t0
+    details.spectra_per_sec = nspec/max(details.elapsed_time, 1.e-9)
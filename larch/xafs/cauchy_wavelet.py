@@ -23,13 +23,41 @@
 # 2014-Apr M Newville : translated to Python for Larch
 
 import numpy as np
+from scipy.fft import rfft, ifft
 from larch import Make_CallArgs, parse_group_args
 from larch.math import complex_phase
 from .xafsutils import set_xafsGroup
 
+def cauchy_filters(omega, alpha, dtype='float64'):
+    """
+    Cauchy wavelet filter bank: one row of filter values on
+    the frequency array omega for each scale value in alpha.
+
+    Returns a 2-d array of shape (len(alpha), len(omega)),
+    using dtype ('float64', or 'float32' to save memory).
+    """
+    nrpts = len(alpha)
+    cauchy_sum = np.log(2*np.pi) - np.log(1.0+np.arange(nrpts)).sum()
+    aom = np.asarray(alpha)[:, np.newaxis] * omega
+    aom[np.where(aom==0)] = 1.e-19
+    return np.exp(cauchy_sum + nrpts*np.log(aom) - aom).astype(dtype)
+
+def cauchy_transform(tff, filters, nkout, workers=None):
+    """
+    apply a Cauchy filter bank from cauchy_filters() to the FFT of chi(k)
+    tff (of length 2*nfft), with all rows in a single inverse FFT.
+
+    Returns the complex wavelet transform of shape (len(filters), nkout).
+    """
+    nfft = filters.shape[1]
+    tff = tff[:nfft]
+    if filters.dtype == np.float32:
+        tff = tff.astype('complex64')
+    return ifft(filters*tff, n=2*nfft, axis=-1, workers=workers)[:, :nkout]
+
 @Make_CallArgs(["k" ,"chi"])
 def cauchy_wavelet(k, chi=None, group=None, kweight=0, rmax_out=10,
-                   nfft=2048, _larch=None):
+                   nfft=2048, float32=False, _larch=None):
     """
     Cauchy Wavelet Transform for XAFS, following work of Munoz, Argoul, and Farges
 
@@ -41,6 +69,7 @@ def cauchy_wavelet(k, chi=None, group=None, kweight=0, rmax_out=10,
       rmax_out: highest R for output data (10 Ang)
       kweight:  exponent for weighting spectra by k**kweight
       nfft:     value to use for N_fft (2048).
+      float32:  use single precision for the wavelet, to save memory [False]
 
       Returns:
     ---------
@@ -87,25 +116,17 @@ def cauchy_wavelet(k, chi=None, group=None, kweight=0, rmax_out=10,
     omega = 2*np.pi*freq
 
     # simple FT calculation
-    tff = np.fft.fft(xnew, n= 2*nfft)
+    tff = rfft(xnew, n= 2*nfft)
 
     # scale parameter
     r  = np.linspace(0, rmax, nrpts)
     r[0] = 1.e-19
     a  = nrpts/(2*r)
 
-    # Characteristic values for Cauchy wavelet:
-    cauchy_sum = np.log(2*np.pi) - np.log(1.0+np.arange(nrpts)).sum()
-
-    # Main calculation:
-    out = np.zeros(nkout*nrpts,
-                   dtype='complex128').reshape(nrpts, nkout)
-    for i in range(nrpts):
-        aom = a[i]*omega
-        aom[np.where(aom==0)] = 1.e-19
-        filt = cauchy_sum + nrpts*np.log(aom) - aom
-        tmp  = np.conj(np.exp(filt))*tff[:nfft]
-        out[i, :] = np.fft.ifft(tmp, 2*nfft)[:nkout]
+    # Main calculation: all R values at once
+    filters = cauchy_filters(omega, a,
+                             dtype='float32' if float32 else 'float64')
+    out = cauchy_transform(tff, filters, nkout)
 
     group = set_xafsGroup(group, _larch=_larch)
     group.r  =  r
@@ -9,6 +9,7 @@ from larch import parse_group_args
 from larch.math import (gaussian, lorentzian, interp,
                         index_of, index_nearest, remove_dups,
                         savitzky_golay)
+from larch.math.convolution1D import conv_uniform
 
 from .xafsutils import set_xafsGroup
 
@@ -145,9 +146,9 @@ def xas_convolve(energy, norm=None, group=None, form='lorentzian',
         kernel = gaussian
 
     k = kernel(x, center=0, sigma=esigma)
-    ret = np.convolve(y, k, mode='full')
+    ret = conv_uniform(y, k)
 
-    out = interp(x-eshift, ret[:len(x)], en, kind='cubic')
+    out = interp(x-eshift, ret, en, kind='cubic')
 
     group = set_xafsGroup(group, _larch=_larch)
     group.conv = out / k.sum()
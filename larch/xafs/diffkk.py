@@ -2,6 +2,7 @@
 import time
 import numpy as np
 from scipy.special import erfc
+from scipy.signal import fftconvolve
 
 from larch import Group
 from larch.math import interp
@@ -77,7 +78,7 @@ def kkmclf_sca(e, finp):
     fout = [0.0]*npts
     if npts >= 2:
         factor = FOPI * (e[npts-1] - e[0]) / (npts - 1)
-        nptsk = npts / 2
+        nptsk = npts // 2
         for i in range(npts):
             fout[i] = 0.0
             ei2 = e[i]*e[i]
@@ -112,7 +113,7 @@ def kkmclr_sca(e, finp):
     fout = [0.0]*npts
 
     factor = -FOPI * (e[npts-1] - e[0]) / (npts - 1)
-    nptsk  = npts / 2
+    nptsk  = npts // 2
     for i in range(npts):
         fout[i] = 0.0
         ei2 = e[i]*e[i]
@@ -161,7 +162,7 @@ def kkmclf(e, finp):
         de2  = e[j]**2 - ei2[i]
         fout[i] = sum(finp[j]/de2)
 
-    fout = fout * factor
+    fout = fout * factor * e
     return fout
 
 
@@ -198,6 +199,74 @@ def kkmclr(e, finp):
     fout = fout * factor
     return fout
 
+###
+###  These are FFT forms of the MacLaurin series algorithm, giving the same sums
+###  as the forms above in O(n log n).  On an even grid, e_j = e_0 + j*h, and
+###      e_j/(e_j^2-e_i^2) = [1/(e_j-e_i) + 1/(e_j+e_i)]/2
+###      1/(e_j^2-e_i^2)   = [1/(e_j-e_i) - 1/(e_j+e_i)]/(2*e_i)
+###  so that each sum over j (of opposite parity to i) is a convolution with
+###  1/((j-i)*h) and a correlation with 1/(2*e_0+(i+j)*h), done with FFTs.
+###
+
+def _kkmcl_fftsums(e, finp):
+    """
+    MacLaurin series sums for KK transforms, using FFT convolutions
+
+    returns (tdiff, tsum) with
+       tdiff[i] = sum_j finp[j]/(e[j]-e[i])
+       tsum[i]  = sum_j finp[j]/(e[j]+e[i])
+    with sums over j with (j-i) odd.
+    """
+    npts = len(e)
+    if npts != len(finp):
+        raise ValueError("Input arrays not of same length for diff KK transform")
+    if npts < 2 or npts % 2:
+        raise ValueError("diff KK transform needs an even number of points")
+    step = (e[-1] - e[0]) / (npts-1)
+    finp = np.asarray(finp, dtype=np.float64)
+
+    # kernel for (i-j) = -(npts-1), ..., (npts-1)
+    dij = np.arange(1-npts, npts)
+    kdiff = np.zeros(2*npts-1)
+    kdiff[dij % 2 == 1] = -1.0/(step*dij[dij % 2 == 1])
+    tdiff = fftconvolve(finp, kdiff)[npts-1:2*npts-1]
+
+    # kernel for (i+j) = 0, ..., 2*(npts-1)
+    sij = np.arange(2*npts-1)
+    esum = 2*e[0] + step*sij
+    esum[abs(esum) < TINY] = TINY
+    ksum = np.zeros(2*npts-1)
+    ksum[sij % 2 == 1] = 1.0/esum[sij % 2 == 1]
+    tsum = fftconvolve(finp[::-1], ksum)[npts-1:2*npts-1]
+    return tdiff, tsum
+
+def kkmclf_fft(e, finp):
+    """
+    forward (f'->f'') kk transform, using maclaurin series algorithm with FFTs
+
+    arguments:
+      e      energy array *must be on an even grid with an even number of points* [npts] (in)
+      finp   f' array [npts] (in)
+      fout   f'' array [npts] (out)
+    """
+    tdiff, tsum = _kkmcl_fftsums(e, finp)
+    factor = FOPI * (e[-1] - e[0]) / (len(e)-1)
+    return factor * (tdiff - tsum) / 2.0
+
+def kkmclr_fft(e, finp):
+    """
+    reverse (f''->f') kk transform, using maclaurin series algorithm with FFTs
+
+    arguments:
+      e      energy array *must be on an even grid with an even number of points* [npts] (in)
+      finp   f'' array [npts] (in)
+      fout   f' array [npts] (out)
+    """
+    tdiff, tsum = _kkmcl_fftsums(e, finp)
+    factor = -FOPI * (e[-1] - e[0]) / (len(e)-1)
+    return factor * (tdiff + tsum) / 2.0
+
+KKMCLR = {'fft': kkmclr_fft, 'vector': kkmclr, 'scalar': kkmclr_sca}
 
 class diffKKGroup(Group):
     """
@@ -218,7 +287,7 @@ class diffKKGroup(Group):
 
 
 # e0=None, z=None, edge=None, order=3, form='mback', whiteline=False, how=None
-    def kk(self, energy=None, mu=None, z=None, edge='K', how='scalar', mback_kws=None):
+    def kk(self, energy=None, mu=None, z=None, edge='K', how='vector', mback_kws=None):
         """
         Convert mu(E) data into f'(E) and f"(E).  f"(E) is made by
         matching mu(E) to the tabulated values of the imaginary part
@@ -232,6 +301,9 @@ class diffKKGroup(Group):
             z:          Z number of absorber
             edge:       absorption edge, usually 'K' or 'L3'
             mback_kws:  arguments for the mback algorithm
+            how:        KK transform algorithm, one of 'vector', 'fft', or
+                        'scalar' ['vector'].  'fft' gives the same result
+                        as the others in O(n log n) time.
 
           Returns
             self.f1, self.f2:  CL values over on the input energy grid
@@ -273,10 +345,13 @@ class diffKKGroup(Group):
         fpp = interp(self.energy, self.f2-self.fpp, self.grid, fill_value=0.0)
 
         ## do difference KK
-        if repr(how).startswith('sca'):
-            fp = kkmclr_sca(self.grid, fpp)
-        else:
-            fp = kkmclr(self.grid, fpp)
+        if how is None:
+            how = 'vector'
+        if how.startswith('sca'):
+            how = 'scalar'
+        if how not in KKMCLR:
+            raise ValueError("diffkk: how must be one of 'vector', 'fft', 'scalar'")
+        fp = np.asarray(KKMCLR[how](self.grid, fpp))
 
         ## interpolate back to original grid and add diffKK result to f1 to make fp array
         self.fp = self.f1 + interp(self.grid, fp, self.energy, fill_value=0.0)
@@ -2,6 +2,7 @@
 """
   Estimate Noise in an EXAFS spectrum
 """
+import numpy as np
 from numpy import pi, sqrt, where
 
 from larch import parse_group_args, Group, isgroup
@@ -67,7 +68,7 @@ def estimate_noise(k, chi=None, group=None, rmin=15.0, rmax=30.0,
     rmax_out = min(10*pi, rmax+2)
 
     xftf(k, chi, kmin=kmin, kmax=kmax, rmax_out=rmax_out,
-         kweight=kweight, dk=dk, dk2=dk2, kwindow=kwindow,
+         kweight=kweight, dk=dk, dk2=dk2, window=kwindow,
          nfft=nfft, kstep=kstep, group=tmpgroup, _larch=_larch)
 
     chir  = tmpgroup.chir
@@ -99,7 +100,78 @@ def estimate_noise(k, chi=None, group=None, rmin=15.0, rmax=30.0,
     kmax_suggest = tmpgroup.q[iq0 + where(tst < eps_k)[0][0]]
 
     # restore original _sys.xafsGroup, set output variables
-    _larch.symtable._sys.xafsGroup = savgroup
+    if _larch is not None:
+        _larch.symtable._sys.xafsGroup = savgroup
+    group = set_xafsGroup(group, _larch=_larch)
+    group.epsilon_k = eps_k
+    group.epsilon_r = eps_r
+    group.kmax_suggest = kmax_suggest
+
+def estimate_noise_batch(k, chi=None, group=None, rmin=15.0, rmax=30.0,
+                         kweight=1, kmin=0, kmax=20, dk=4, dk2=None, kstep=0.05,
+                         kwindow='kaiser', nfft=2048, _larch=None, **kws):
+    """
+    estimate noise levels, as for estimate_noise(), for many EXAFS spectra
+    on the same k array.
+
+    Parameters:
+    -----------
+      k:        1-d array of photo-electron wavenumber in Ang^-1 (or group)
+      chi:      2-d array of chi, with one spectrum per row
+      group:    output Group
+
+    All other arguments are as for estimate_noise(), and are used for all
+    spectra.
+
+    Returns:
+    ---------
+      None   -- outputs are written to supplied group, as for estimate_noise(),
+      as arrays with one value per spectrum: epsilon_k, epsilon_r, and
+      kmax_suggest.
+
+    Notes:
+    -------
+      1. All spectra are transformed together, with one forward and one
+         reverse Fourier transform of the stack, and the noise levels and
+         kmax_suggest are found for all spectra without a loop over spectra.
+      2. Where |chi(q)| / k**kweight does not drop below epsilon_k,
+         kmax_suggest is the highest q value, rather than an error.
+      3. Follows the 'First Argument Group' convention.
+    """
+    k, chi, group = parse_group_args(k, members=('k', 'chi'),
+                                     defaults=(chi,), group=group,
+                                     fcn_name='estimate_noise_batch')
+    chi = np.atleast_2d(chi)
+    tmpgroup = Group()
+    rmax_out = min(10*pi, rmax+2)
+    xftf(k, chi, kmin=kmin, kmax=kmax, rmax_out=rmax_out,
+         kweight=kweight, dk=dk, dk2=dk2, window=kwindow,
+         nfft=nfft, kstep=kstep, group=tmpgroup)
+
+    chir  = tmpgroup.chir
+    rstep = tmpgroup.r[1] - tmpgroup.r[0]
+
+    irmin = int(0.01 + rmin/rstep)
+    irmax = int(min(nfft/2,  int(1.01 + rmax/rstep)))
+    highr = chir[:, irmin:irmax]
+    highr2 = (highr.real**2 + highr.imag**2).sum(axis=1)
+
+    kwin_ave = tmpgroup.kwin.sum()*kstep/(kmax-kmin)
+    eps_r = sqrt(highr2 / (2*highr.shape[1])) / kwin_ave
+
+    w = 2 * kweight + 1
+    scale = sqrt((2*pi*w)/(kstep*(kmax**w - kmin**w)))
+    eps_k = scale*eps_r
+
+    xftr(tmpgroup.r, tmpgroup.chir, group=tmpgroup, rmin=0.5, rmax=9.5,
+         dr=1.0, window='parzen', nfft=nfft, kstep=kstep)
+
+    iq0 = index_of(tmpgroup.q, (kmax+kmin)/2.0)
+    tst = tmpgroup.chiq_mag[:, iq0:] / (tmpgroup.q[iq0:])**kweight
+    below = tst < eps_k[:, np.newaxis]
+    ibelow = np.where(below.any(axis=1), below.argmax(axis=1), below.shape[1]-1)
+    kmax_suggest = tmpgroup.q[iq0 + ibelow]
+
     group = set_xafsGroup(group, _larch=_larch)
     group.epsilon_k = eps_k
     group.epsilon_r = eps_r
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""
+persistent, on-disk cache of parsed feffNNNN.dat files
+
+  cache = FeffDatCache(folder=None, maxbytes=256*2**20)
+  cache.prewarm('path/to/feff/output', nworkers=4)
+
+Each entry holds the parsed header, path geometry, the data columns,
+and the spline coefficients for pha/amp/rep/lam, stored as a JSON
+header followed by a block of float64 values, in a file named by a
+hash of the file path, size, modification time and contents.  When
+the total size of the cache exceeds maxbytes, the least recently used
+entries are removed.
+
+FeffDatFile uses the process-wide cache from get_feffdat_cache().  This
+is off by default, and is turned on (or off again, with None) using
+set_feffdat_cache():
+
+  set_feffdat_cache(FeffDatCache())   # use ~/.larch/feffdat_cache
+"""
+import os
+import glob
+import json
+import hashlib
+from os.path import abspath, join, isdir
+import numpy as np
+
+from larch.site_config import user_larchdir
+from .xafsutils import batch_map
+
+SPLINE_TABLES = ('pha', 'amp', 'rep', 'lam')
+CACHE_VERSION = 1
+CACHE_MAGIC = b'LARCHFD1'
+CACHE_SUFFIX = '.fdat'
+
+def file_hashkey(filename, text=None):
+    """return hash key for a file from its full path, size, modification
+    time and contents (read from file if text is None)"""
+    filename = abspath(filename)
+    stat = os.stat(filename)
+    if text is None:
+        with open(filename, 'rb') as fh:
+            text = fh.read()
+    chash = hashlib.blake2b(text, digest_size=16).hexdigest()
+    key = '%s|%d|%d|%s|%d' % (filename, stat.st_size, stat.st_mtime_ns,
+                              chash, CACHE_VERSION)
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+class FeffDatCache(object):
+    """on-disk cache of parsed feffNNNN.dat files
+
+    Arguments
+    ---------
+      folder     folder for cache files [None, use ~/.larch/feffdat_cache]
+      maxbytes   maximum total size of cache files [256 MB, None for no limit]
+
+    Read and write errors (for example, a read-only folder) are not
+    raised: a failed read is a cache miss and a failed write is ignored.
+    """
+    def __init__(self, folder=None, maxbytes=256*2**20):
+        if folder is None:
+            folder = join(user_larchdir, 'feffdat_cache')
+        self.folder = abspath(folder)
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self._nbytes = None
+
+    def __repr__(self):
+        return '<FeffDatCache %s: %d hits, %d misses>' % (self.folder,
+                                                          self.hits, self.misses)
+
+    def _entry(self, key):
+        return join(self.folder, '%s%s' % (key, CACHE_SUFFIX))
+
+    def get(self, key):
+        """return (header, data, spline_tck) for hash key, or None"""
+        fname = self._entry(key)
+        try:
+            with open(fname, 'rb') as fh:
+                buff = fh.read()
+            if buff[:8] != CACHE_MAGIC:
+                raise ValueError('not a feffdat cache file')
+            hlen = int(np.frombuffer(buff, dtype='<u4', count=1, offset=8)[0])
+            header = json.loads(buff[12:12+hlen].decode('utf-8'))
+            arrays = np.frombuffer(buff, dtype='<f8', offset=12+hlen).copy()
+            os.utime(fname)
+        except Exception:
+            self.misses += 1
+            return None
+        shape = header.pop('_shape')
+        npts = shape[0]*shape[1]
+        data = arrays[:npts].reshape(shape)
+        tck = {}
+        for name in SPLINE_TABLES:
+            nt, nc = header.pop('_spline_%s' % name)
+            tck[name] = (arrays[npts:npts+nt], arrays[npts+nt:npts+nt+nc], 3)
+            npts += nt + nc
+        self.hits += 1
+        return header, data, tck
+
+    def put(self, key, header, data, spline_tck):
+        """save parsed header, data array, and spline (t, c, k) tuples"""
+        header = dict(header)
+        header['_shape'] = data.shape
+        arrays = [data.ravel()]
+        for name in SPLINE_TABLES:
+            t, c = spline_tck[name][:2]
+            header['_spline_%s' % name] = (len(t), len(c))
+            arrays.extend([t, c])
+        hbytes = json.dumps(header).encode('utf-8')
+        hbytes += b' '*(-(len(hbytes)+12) % 8)
+        buff = b''.join([CACHE_MAGIC, np.array(len(hbytes), dtype='<u4').tobytes(),
+                         hbytes, np.concatenate(arrays).astype('<f8').tobytes()])
+        fname = self._entry(key)
+        tmpname = '%s.%d.tmp' % (fname, os.getpid())
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(tmpname, 'wb') as fh:
+                fh.write(buff)
+            os.replace(tmpname, fname)
+        except OSError:
+            return
+        if self._nbytes is not None:
+            self._nbytes += len(buff)
+        if self.maxbytes is not None:
+            self.evict()
+
+    def entries(self):
+        """list of (filename, size, last access time) for cache files"""
+        out = []
+        if not isdir(self.folder):
+            return out
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(CACHE_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                out.append((entry.path, stat.st_size, stat.st_mtime))
+        return out
+
+    @property
+    def nbytes(self):
+        """total size of cache files"""
+        if self._nbytes is None:
+            self._nbytes = sum(e[1] for e in self.entries())
+        return self._nbytes
+
+    def evict(self, maxbytes=None):
+        """remove least recently used entries until the total size
+        is below maxbytes [self.maxbytes].  Returns number removed"""
+        if maxbytes is None:
+            maxbytes = self.maxbytes
+        if maxbytes is None or self.nbytes <= maxbytes:
+            return 0
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(e[1] for e in entries)
+        nremoved = 0
+        for fname, size, _ in entries:
+            if total <= maxbytes:
+                break
+            try:
+                os.unlink(fname)
+            except OSError:
+                continue
+            total -= size
+            nremoved += 1
+        self._nbytes = total
+        return nremoved
+
+    def clear(self):
+        """remove all cache files, and reset hit / miss counts"""
+        self.evict(maxbytes=0)
+        self.hits = self.misses = 0
+
+    def stats(self):
+        """return dict of cache statistics"""
+        ncalls = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses,
+                    hit_rate=self.hits/max(1, ncalls),
+                    size=len(self.entries()), nbytes=self.nbytes,
+                    maxbytes=self.maxbytes, folder=self.folder)
+
+    def prewarm(self, folder, pattern='feff*.dat', nworkers=None):
+        """parse and cache all files matching pattern in a FEFF output
+        folder, using a pool of nworkers processes [os.cpu_count()].
+        Returns the number of files that were not already cached."""
+        if nworkers is None:
+            nworkers = os.cpu_count() or 1
+        files = sorted(glob.glob(join(folder, pattern)))
+        args = [(fname, self.folder) for fname in files]
+        nnew = sum(batch_map(_prewarm_file, args, nworkers=nworkers))
+        self._nbytes = None
+        if self.maxbytes is not None:
+            self.evict()
+        return nnew
+
+def _prewarm_file(args):
+    """read one feff.dat file into the cache in folder, returning
+    1 if it was not already cached, 0 otherwise"""
+    from .feffdat import FeffDatFile
+    filename, folder = args
+    cache = FeffDatCache(folder=folder, maxbytes=None)
+    FeffDatFile(filename, cache=cache)
+    return cache.misses
+
+_feffdat_cache = [None]
+
+def get_feffdat_cache():
+    """return the process-wide FeffDatCache, or None if disabled [default]"""
+    return _feffdat_cache[0]
+
+def set_feffdat_cache(cache):
+    """set the process-wide FeffDatCache: a FeffDatCache, a folder name,
+    or None to disable caching of feff.dat files"""
+    if isinstance(cache, str):
+        cache = FeffDatCache(folder=cache)
+    _feffdat_cache.clear()
+    _feffdat_cache.append(cache)
+    return cache
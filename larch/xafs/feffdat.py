@@ -11,10 +11,16 @@ the path represented by the feffNNNN.dat
   group  = ff2chi(paths)
 
 creates a group that contains the chi(k) for the sum of paths.
+
+  stack = FeffPathStack(paths, k)
+
+packs the Feff data for a list of paths into 2D arrays so that chi(k)
+for all paths can be calculated in a single, vectorized calculation.
 """
 import numpy as np
 from copy import deepcopy
-from scipy.interpolate import UnivariateSpline
+from collections import OrderedDict
+from scipy.interpolate import splrep, BSpline
 from lmfit import Parameters, Parameter
 from lmfit.printfuncs import gformat
 
@@ -22,19 +28,34 @@ from xraydb import atomic_mass, atomic_symbol
 
 from larch import Group, isNamedClass
 from larch.utils.strutils import fix_varname, b32hash
+from larch.utils.lrucache import LRUCache
 from larch.fitting import group2params, isParameter, param_value
 
 from .xafsutils import ETOK, set_xafsGroup
 from .sigma2_models import add_sigma2funcs
+from .feffcache import (file_hashkey, get_feffdat_cache, SPLINE_TABLES)
 
 SMALL_ENERGY = 1.e-6
 
+FEFFDAT_HEADER = ('title', 'version', 'potentials', 'gam_ch', 'exch', 'mu',
+                  'kf', 'vint', 'rs_int', 'degen', 'rnorman', 'edge')
+FEFFDAT_COLUMNS = ('k', 'real_phc', 'mag_feff', 'pha_feff', 'red_fact',
+                   'lam', 'rep')
+
 class FeffDatFile(Group):
-    def __init__(self, filename,  **kws):
+    """parsed feffNNNN.dat file.
+
+    cache sets the FeffDatCache used to avoid re-parsing files: True for
+    the process-wide cache from get_feffdat_cache(), which is off unless
+    set with set_feffdat_cache(), None or False for no cache, or a
+    FeffDatCache instance.
+    """
+    def __init__(self, filename, cache=True, **kws):
         kwargs = dict(name='feff.dat: %s' % filename)
         kwargs.update(kws)
         Group.__init__(self,  **kwargs)
-        self._read(filename)
+        self.spline_tck = None
+        self._read(filename, cache=cache)
 
     def __repr__(self):
         if self.filename is not None:
@@ -72,14 +93,54 @@ class FeffDatFile(Group):
     @rmass.setter
     def rmass(self, val):     pass
 
-    def _read(self, filename):
+    def _read(self, filename, cache=True):
         try:
-            with open(filename, 'r') as fh:
-                lines = fh.readlines()
+            with open(filename, 'rb') as fh:
+                text = fh.read()
         except:
             print( 'Error reading file %s ' % filename)
             return
         self.filename = filename
+        if cache is True:
+            cache = get_feffdat_cache()
+        key = None
+        if cache:
+            try:
+                key = file_hashkey(filename, text=text)
+            except OSError:
+                cache = None
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                self._set_parsed(*cached)
+                return
+        self._parse(text.decode('utf-8', errors='replace').splitlines(True))
+        if cache:
+            self.spline_tck = {name: splrep(self.k, getattr(self, name), s=0)
+                               for name in SPLINE_TABLES}
+            header = {attr: getattr(self, attr) for attr in FEFFDAT_HEADER
+                      if hasattr(self, attr)}
+            header.update(nleg=self.__nleg__, reff=self.__reff__, geom=self.geom)
+            data = np.array([getattr(self, attr) for attr in FEFFDAT_COLUMNS])
+            cache.put(key, header, data, self.spline_tck)
+
+    def _set_parsed(self, header, data, spline_tck):
+        """set attributes from cached header, data, and spline coefficients"""
+        for attr in FEFFDAT_HEADER:
+            if attr in header:
+                setattr(self, attr, header[attr])
+        self.potentials = [tuple(p) for p in self.potentials]
+        self.geom = [tuple(g) for g in header['geom']]
+        self.__nleg__ = header['nleg']
+        self.__reff__ = header['reff']
+        for attr, arr in zip(FEFFDAT_COLUMNS, data):
+            setattr(self, attr, arr)
+        self.pha = self.real_phc + self.pha_feff
+        self.amp = self.mag_feff * self.red_fact
+        self.spline_tck = spline_tck
+        self.__rmass = None
+
+    def _parse(self, lines):
         mode = 'header'
         self.potentials, self.geom = [], []
         data = []
@@ -158,6 +219,7 @@ class FeffDatFile(Group):
 
 
 PATH_PARS = ('degen', 's02', 'e0', 'ei', 'deltar', 'sigma2', 'third', 'fourth')
+FEFF_TABLES = ('pha', 'amp', 'rep', 'lam')
 
 class FeffPathGroup(Group):
     def __init__(self, filename, label=None, s02=None, degen=None,
@@ -190,6 +252,7 @@ class FeffPathGroup(Group):
 
         self.k = None
         self.chi = None
+        self._tablecache = LRUCache(maxsize=8)
         if self._feffdat is not None:
             self.create_spline_coefs()
 
@@ -269,11 +332,14 @@ class FeffPathGroup(Group):
     def create_spline_coefs(self):
         """pre-calculate spline coefficients for feff data"""
         self.spline_coefs = {}
+        self._tablecache.clear()
         fdat = self._feffdat
-        self.spline_coefs['pha'] = UnivariateSpline(fdat.k, fdat.pha, s=0)
-        self.spline_coefs['amp'] = UnivariateSpline(fdat.k, fdat.amp, s=0)
-        self.spline_coefs['rep'] = UnivariateSpline(fdat.k, fdat.rep, s=0)
-        self.spline_coefs['lam'] = UnivariateSpline(fdat.k, fdat.lam, s=0)
+        for name in FEFF_TABLES:
+            if fdat.spline_tck is not None:
+                tck = fdat.spline_tck[name]
+            else:
+                tck = splrep(fdat.k, getattr(fdat, name), s=0)
+            self.spline_coefs[name] = BSpline(*tck)
 
     def store_feffdat(self):
         """stores data about this Feff path in the Parameters
@@ -301,6 +367,11 @@ class FeffPathGroup(Group):
             out.append(val)
         return out
 
+    def path_paramlist(self, **kws):
+        """evaluate path parameter values, returning a list in the
+        order of PATH_PARS"""
+        return self.__path_params(**kws)
+
     def path_paramvals(self, **kws):
         (deg, s02, e0, ei, delr, ss2, c3, c4) = self.__path_params()
         return dict(degen=deg, s02=s02, e0=e0, ei=ei, deltar=delr,
@@ -408,17 +479,18 @@ class FeffPathGroup(Group):
         # q is the e0-shifted wavenumber
         q = np.sign(en)*np.sqrt(abs(en))
 
-        # lookup Feff.dat values (pha, amp, rep, lam)
-        if interp.startswith('lin'):
-            pha = np.interp(q, fdat.k, fdat.pha)
-            amp = np.interp(q, fdat.k, fdat.amp)
-            rep = np.interp(q, fdat.k, fdat.rep)
-            lam = np.interp(q, fdat.k, fdat.lam)
-        else:
-            pha = self.spline_coefs['pha'](q)
-            amp = self.spline_coefs['amp'](q)
-            rep = self.spline_coefs['rep'](q)
-            lam = self.spline_coefs['lam'](q)
+        # lookup Feff.dat values (pha, amp, rep, lam), which depend
+        # only on e0 and k, and so are cached
+        tabkey = (e0, interp, len(k), hash(k.tobytes()))
+        tables = self._tablecache.get(tabkey)
+        if tables is None:
+            if interp.startswith('lin'):
+                tables = [np.interp(q, fdat.k, getattr(fdat, name))
+                          for name in FEFF_TABLES]
+            else:
+                tables = [self.spline_coefs[name](q) for name in FEFF_TABLES]
+            self._tablecache.put(tabkey, tables)
+        pha, amp, rep, lam = tables
 
         if debug:
             self.debug_k   = q
@@ -444,6 +516,468 @@ class FeffPathGroup(Group):
         self.chi = cchi.imag
         self.chi_imag = -cchi.real
 
+
+class FeffPathStack(object):
+    """Packed Feff data for a list of FeffPathGroups on a common k grid.
+
+    At creation, reff and the spline coefficients for pha, amp, rep and lam
+    of all paths are packed into arrays, so that chi(k) for every path can
+    be calculated with a single, vectorized pass of the XAFS equation:
+
+       stack = FeffPathStack(paths, k)
+       chi = stack.calc_chi(params)     # sum of chi(k) for all paths
+
+    As with ff2chi(), the arrays k, chi, chi_imag, and p are written to
+    each of the paths.  Paths should not be added or removed from the list
+    after the stack is created: make a new stack instead.
+
+    The complex chi(k) for each path is memoized, keyed by the values of
+    its 8 path parameters, keeping up to `cache_size` results per path.
+    As chi(k) for a path depends only on these values and on the k grid
+    of the stack, paths with unchanged path parameters (most paths, for
+    each finite-difference step of a fit) are not recalculated.  The
+    counts of reused and recalculated paths are kept in `cache_hits` and
+    `cache_misses`.  Use `cache_size=0` to turn off memoization.
+
+    The interpolated Feff tables (pha, amp, rep, lam) are also cached, in
+    `table_cache`, keyed by e0 value and shared by all paths with that e0
+    value.  As e0 changes less often than other path parameters in a fit,
+    changes to sigma2 or deltar do not need new spline evaluations.  See
+    precompute_e0_grid() for Monte Carlo or grid-search calculations.
+    """
+    def __init__(self, paths, k, cache_size=4, table_cache_size=16):
+        if isinstance(paths, dict):
+            paths = list(paths.values())
+        self.paths = list(paths)
+        self.k = np.asarray(k, dtype='float64')
+        self.npaths = len(self.paths)
+        self.params = None
+
+        reff = np.array([path._feffdat.reff for path in self.paths])
+        self.valid = reff >= 0.05
+        reff[~self.valid] = 1.0
+        self.reff = reff[:, np.newaxis]
+
+        # group paths sharing the same spline knots (normally all paths
+        # from one Feff calculation) so that the spline coefficients for
+        # each group can be evaluated together as one vector-valued BSpline
+        groups = {}
+        for ipath, path in enumerate(self.paths):
+            if path.spline_coefs is None:
+                path.create_spline_coefs()
+            tabs = [path.spline_coefs[name].tck for name in FEFF_TABLES]
+            knots, _, order = tabs[0]
+            key = (order, knots.tobytes())
+            if key not in groups:
+                groups[key] = (knots, order, [], [])
+            groups[key][2].append(ipath)
+            groups[key][3].append([c for t, c, o in tabs])
+
+        self.splines = []
+        for knots, order, index, coefs in groups.values():
+            # coefs have shape (ncoefs, npaths_in_group, 4)
+            coefs = np.array(coefs).transpose(2, 0, 1).copy()
+            self.splines.append((knots, order, np.array(index), coefs))
+
+        self.cache_size = cache_size
+        self.table_cache = LRUCache(maxsize=table_cache_size)
+        self.e0_grid = self.e0_tables = self.e0_qgrid = None
+        self.clear_cache()
+
+    def __repr__(self):
+        return '<FeffPathStack: %d paths, %d k points>' % (self.npaths, len(self.k))
+
+    def __getstate__(self):
+        """state for pickling: the packed arrays only, without the paths,
+        Parameters, or cached results, so that a stack can be sent to a
+        worker process and used with calc_chi(pathpars=...)"""
+        state = {key: val for key, val in self.__dict__.items()
+                 if key not in ('paths', 'params', '_deps', '_cache',
+                                'table_cache')}
+        state['paths'] = []
+        state['params'] = None
+        state['table_cache'] = self.table_cache.maxsize
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.table_cache = LRUCache(maxsize=state['table_cache'])
+        self._cache = [OrderedDict() for i in range(self.npaths)]
+
+    def clear_cache(self):
+        """clear memoized chi(k) for all paths, and reset cache counters"""
+        self._cache = [OrderedDict() for i in range(self.npaths)]
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def set_params(self, params):
+        """set the lmfit Parameters used for evaluating path parameters"""
+        if params is not self.params:
+            for path in self.paths:
+                path.create_path_params(params=params)
+            self.params = params
+
+    def path_paramvals(self):
+        """evaluate path parameters for all paths,
+        returning an array of shape (npaths, 8) in the order of PATH_PARS
+        """
+        return np.array([path.path_paramlist() for path in self.paths],
+                        dtype='float64')
+
+    def e0_shifted_k(self, e0):
+        """e0-shifted wavenumber q on the k grid of the stack"""
+        # careful to look for |e0| ~= 0.
+        en = self.k*self.k - e0*ETOK
+        en[np.where(abs(en) < 1.5*SMALL_ENERGY)] = SMALL_ENERGY
+        return np.sign(en)*np.sqrt(abs(en))
+
+    def precompute_e0_grid(self, e0min=-10.0, e0max=10.0, e0step=0.25):
+        """precompute Feff tables for all paths on a dense grid of e0 values,
+        for Monte Carlo or grid-search calculations that sample many e0 values.
+
+        Parameters:
+          e0min:   minimum e0 value [-10]
+          e0max:   maximum e0 value [10]
+          e0step:  e0 grid step [0.25]
+
+        Tables for e0 values on the grid are used exactly, and tables for
+        other values of e0 within the grid are interpolated linearly in q
+        between grid points (with spline evaluation kept for q < 1), giving
+        relative errors in chi(k) of about 1.e-4 for e0step=0.25.  The
+        memory needed is 32*npaths*nk bytes per grid point.
+        Use e0step=None to remove the grid.
+        """
+        self.e0_grid = self.e0_tables = self.e0_qgrid = None
+        self.table_cache.clear()
+        if e0step is None:
+            return
+        npts = 1 + int(round((e0max - e0min)/e0step))
+        self.e0_grid = e0min + e0step*np.arange(npts)
+        self.e0_tables = np.zeros((npts, len(FEFF_TABLES), self.npaths,
+                                   len(self.k)))
+        self.e0_qgrid = np.zeros((npts, len(self.k)))
+        for ie0, e0 in enumerate(self.e0_grid):
+            q = self.e0_qgrid[ie0] = self.e0_shifted_k(e0)
+            for knots, order, gindex, coefs in self.splines:
+                spl = BSpline.construct_fast(knots, coefs, order)
+                self.e0_tables[ie0][:, gindex, :] = spl(q).transpose(2, 1, 0)
+
+    def group_tables(self, igroup, e0, members):
+        """return Feff tables at e0 for paths in one spline group
+
+        Parameters:
+          igroup:   index of spline group
+          e0:       e0 value
+          members:  1D array of indices (within spline group) of paths
+
+        Returns: 3D array (4, nmembers, nk) of pha, amp, rep, lam
+
+        Results are kept in `table_cache`, keyed by (igroup, e0, members).
+        """
+        key = (igroup, e0, tuple(members))
+        tables = self.table_cache.get(key)
+        if tables is not None:
+            return tables
+        knots, order, gindex, coefs = self.splines[igroup]
+        paths = gindex[members]
+        grid = self.e0_grid
+        if grid is not None and grid[0] <= e0 <= grid[-1]:
+            x = (e0 - grid[0])/(grid[1] - grid[0])
+            ie0 = min(int(x), len(grid) - 2)
+            tables = self.e0_tables[ie0][:, paths, :]
+            if x - ie0 > 1.e-9:
+                # interpolate linearly in q, which is not linear in e0,
+                # except at very low q, where the tables vary rapidly
+                q = self.e0_shifted_k(e0)
+                q0, q1 = self.e0_qgrid[ie0], self.e0_qgrid[ie0+1]
+                dq = q1 - q0
+                dq[np.where(dq == 0)] = 1.0
+                frac = (q - q0)/dq
+                tables = (1-frac)*tables + frac*self.e0_tables[ie0+1][:, paths, :]
+                lowq = np.where(np.minimum(abs(q0), abs(q1)) < 1.0)[0]
+                if len(lowq) > 0:
+                    spl = BSpline.construct_fast(knots, coefs[:, members, :], order)
+                    tables[:, :, lowq] = spl(q[lowq]).transpose(2, 1, 0)
+        else:
+            spl = BSpline.construct_fast(knots, coefs[:, members, :], order)
+            # spl(q) has shape (nk, nmembers, 4)
+            tables = spl(self.e0_shifted_k(e0)).transpose(2, 1, 0)
+        return self.table_cache.put(key, tables)
+
+    def interp_tables(self, e0, index):
+        """interpolate Feff tables onto e0-shifted wavenumbers.
+
+        Parameters:
+          e0:     1D array (npaths) of e0 values for all paths
+          index:  1D array (nsel) of indices of the selected paths
+
+        Returns: 3D array (4, nsel, nk) of pha, amp, rep, lam
+
+        All paths in a spline group that have the same e0 (typically,
+        that use the same e0 expression) share q, and have their tables
+        evaluated and cached together.
+        """
+        out = np.zeros((len(FEFF_TABLES), len(index), len(self.k)))
+        rows = np.zeros(self.npaths, dtype=int) - 1
+        rows[index] = np.arange(len(index))
+        for igroup, (knots, order, gindex, coefs) in enumerate(self.splines):
+            grows = rows[gindex]
+            if grows.max() < 0:
+                continue
+            ge0 = e0[gindex]
+            for e0val in np.unique(ge0[grows >= 0]):
+                members = np.where(ge0 == e0val)[0]
+                tables = self.group_tables(igroup, e0val, members)
+                use = grows[members] >= 0
+                out[:, grows[members[use]], :] = tables[:, use, :]
+        return out
+
+    def xafs_equation(self, pars, index, e0_all):
+        """calculate complex chi(k) for selected paths
+
+        Parameters:
+          pars:    2D array (nsel, 8) of path parameter values
+          index:   1D array (nsel) of indices of the selected paths
+          e0_all:  1D array (npaths) of e0 values for all paths
+
+        Returns: tuple of 2D arrays (nsel, nk) of complex chi(k) and p
+        """
+        (degen, s02, e0, ei, deltar, sigma2, third, fourth) = \
+                pars.T[:, :, np.newaxis]
+        reff = self.reff[index]
+
+        # q is the e0-shifted wavenumber
+        q = np.array([self.e0_shifted_k(e0val) for e0val in e0[:, 0]])
+        pha, amp, rep, lam = self.interp_tables(e0_all, index)
+
+        # p = complex wavenumber, and its square:
+        pp   = (rep + 1j/lam)**2 + 1j * ei * ETOK
+        p    = np.sqrt(pp)
+
+        # the xafs equation:
+        cchi = np.exp(-2*reff*p.imag - 2*pp*(sigma2 - pp*fourth/3) +
+                      1j*(2*q*reff + pha +
+                          2*p*(deltar - 2*sigma2/reff - 2*pp*third/3) ))
+
+        cchi = degen * s02 * amp * cchi / (q*(reff + deltar)**2)
+        cchi[:, 0] = 2*cchi[:, 1] - cchi[:, 2]
+        cchi[~self.valid[index], :] = 0.0
+        return cchi, p
+
+    def interp_table_derivs(self, e0, index):
+        """derivatives with respect to q of the Feff tables at e0-shifted
+        wavenumbers, with arguments and outputs as for interp_tables()
+        """
+        out = np.zeros((len(FEFF_TABLES), len(index), len(self.k)))
+        rows = np.zeros(self.npaths, dtype=int) - 1
+        rows[index] = np.arange(len(index))
+        for igroup, (knots, order, gindex, coefs) in enumerate(self.splines):
+            grows = rows[gindex]
+            if grows.max() < 0:
+                continue
+            ge0 = e0[gindex]
+            for e0val in np.unique(ge0[grows >= 0]):
+                members = np.where((ge0 == e0val) & (grows >= 0))[0]
+                spl = BSpline.construct_fast(knots, coefs[:, members, :], order)
+                dtab = spl.derivative()(self.e0_shifted_k(e0val))
+                out[:, grows[members], :] = dtab.transpose(2, 1, 0)
+        return out
+
+    def chi_derivs(self, pars=None):
+        """calculate derivatives of complex chi(k) for all paths with
+        respect to each of the 8 path parameters.
+
+        Parameters:
+          pars:  2D array (npaths, 8) of path parameter values
+                 [None, evaluate current values]
+
+        Returns: 3D complex array (npaths, 8, nk), in the order of PATH_PARS
+        """
+        if pars is None:
+            pars = self.path_paramvals()
+        index = np.arange(self.npaths)
+        (degen, s02, e0, ei, deltar, sigma2, third, fourth) = \
+                pars.T[:, :, np.newaxis]
+        reff = self.reff
+
+        q = np.array([self.e0_shifted_k(e0val) for e0val in e0[:, 0]])
+        pha, amp, rep, lam = self.interp_tables(pars[:, 2], index)
+        dpha, damp, drep, dlam = self.interp_table_derivs(pars[:, 2], index)
+        # dq/de0, and derivatives of the Feff tables with respect to e0
+        dq = -ETOK/(2*abs(q))
+        dpha, damp, drep, dlam = dpha*dq, damp*dq, drep*dq, dlam*dq
+
+        rlam = rep + 1j/lam
+        pp   = rlam**2 + 1j * ei * ETOK
+        p    = np.sqrt(pp)
+        rnorm = reff + deltar
+        xphase = deltar - 2*sigma2/reff - 2*pp*third/3
+        expx = np.exp(-2*reff*p.imag - 2*pp*(sigma2 - pp*fourth/3) +
+                      1j*(2*q*reff + pha + 2*p*xphase))
+        scale = expx/(q*rnorm**2)
+        cchi = degen * s02 * amp * scale
+
+        def dexp_dpp(dpp):
+            "derivative of the exponent in the XAFS equation for a change in pp"
+            dp = dpp/(2*p)
+            return (-2*reff*dp.imag - 2*dpp*(sigma2 - pp*fourth/3) +
+                    2*pp*dpp*fourth/3 + 2j*(dp*xphase - 2*p*dpp*third/3))
+
+        dpp_e0 = 2*rlam*(drep - 1j*dlam/lam**2)
+        dexp_e0 = dexp_dpp(dpp_e0) + 1j*(2*reff*dq + dpha)
+
+        out = np.zeros((self.npaths, len(PATH_PARS), len(self.k)),
+                       dtype='complex128')
+        out[:, 0, :] = s02 * amp * scale
+        out[:, 1, :] = degen * amp * scale
+        out[:, 2, :] = cchi*dexp_e0 + degen*s02*(damp - amp*dq/q)*scale
+        out[:, 3, :] = cchi*dexp_dpp(1j*ETOK*np.ones_like(pp))
+        out[:, 4, :] = cchi*(2j*p - 2/rnorm)
+        out[:, 5, :] = cchi*(-2*pp - 4j*p/reff)
+        out[:, 6, :] = cchi*(-4j*p*pp/3)
+        out[:, 7, :] = cchi*(2*pp*pp/3)
+        out[:, :, 0] = 2*out[:, :, 1] - out[:, :, 2]
+        out[~self.valid, :, :] = 0.0
+        return out
+
+    def _expr_dependencies(self):
+        """map variable Parameters to the constrained (non-path) Parameters
+        and paths that depend on them, sorting constrained Parameters so
+        that they can be evaluated in order."""
+        params = self.params
+        def deps(name, seen):
+            for dep in getattr(params[name], '_expr_deps', []):
+                if dep in params and dep not in seen:
+                    seen.add(dep)
+                    if params[dep].expr is not None:
+                        deps(dep, seen)
+            return seen
+
+        exprs = []  # constrained params, ordered so dependencies come first
+        def add_expr(name):
+            if name in exprs:
+                return
+            for dep in getattr(params[name], '_expr_deps', []):
+                if dep in params and params[dep].expr is not None:
+                    add_expr(dep)
+            exprs.append(name)
+
+        for name, par in params.items():
+            if par.expr is not None and not getattr(par, 'is_pathparam', False):
+                add_expr(name)
+
+        expr_deps = {name: deps(name, set()) for name in exprs}
+        path_deps = []
+        for path in self.paths:
+            pdeps = set()
+            for pname in PATH_PARS:
+                parname = path.pathpar_name(pname)
+                if params[parname].expr is not None:
+                    pdeps.update(deps(parname, set()))
+            path_deps.append(pdeps)
+        self._deps = (params, exprs, expr_deps, path_deps)
+
+    def pathpar_derivs(self, var_names):
+        """calculate derivatives of the path parameters for all paths with
+        respect to the variables in var_names.
+
+        Returns: 3D array (nvars, npaths, 8), in the order of PATH_PARS
+
+        Only the constraint expressions are evaluated, using a one-sided
+        finite difference, and only for the paths that depend on each
+        variable.  No chi(k) calculations are needed.
+        """
+        params = self.params
+        if getattr(self, '_deps', (None,))[0] is not params:
+            self._expr_dependencies()
+        _, exprs, expr_deps, path_deps = self._deps
+
+        base = self.path_paramvals()
+        out = np.zeros((len(var_names), self.npaths, len(PATH_PARS)))
+        for ivar, vname in enumerate(var_names):
+            par = params[vname]
+            val0 = par.value
+            step = 1.e-8*max(1.0, abs(val0))
+            if val0 + step > par.max:
+                step = -step
+            uexprs = [name for name in exprs if vname in expr_deps[name]]
+            paths = [i for i, pdeps in enumerate(path_deps) if vname in pdeps]
+            par.value = val0 + step
+            for name in uexprs:
+                params[name]._getval()
+            for ipath in paths:
+                vals = self.paths[ipath].path_paramlist()
+                out[ivar, ipath, :] = (np.array(vals) - base[ipath])/step
+            par.value = val0
+            for name in uexprs:
+                params[name]._getval()
+        # restore path parameter values
+        self.path_paramvals()
+        return out
+
+    def calc_chi_jacobian(self, var_names):
+        """calculate derivatives of the sum of chi(k) for all paths with
+        respect to the variables in var_names.
+
+        Returns: 2D array (nvars, nk)
+        """
+        pars = self.path_paramvals()
+        dchi = self.chi_derivs(pars).imag
+        dpars = self.pathpar_derivs(var_names)
+        return np.einsum('vpj,pjk->vk', dpars, dchi)
+
+    def calc_chi(self, params=None, pathpars=None):
+        """calculate chi(k) for all paths, returning the sum of chi(k).
+
+        Parameters:
+          params:    lmfit Parameters for path parameters [None, use current]
+          pathpars:  2D array (npaths, 8) of path parameter values, as from
+                     path_paramvals() [None, evaluate from params]
+
+        Only paths with path parameter values not found in the cache
+        are recalculated.  With `pathpars` given, no Parameters are used,
+        so that the calculation can be run in a worker thread or process.
+        """
+        if pathpars is not None:
+            pars = np.asarray(pathpars, dtype='float64')
+        else:
+            if params is not None:
+                self.set_params(params)
+            pars = self.path_paramvals()
+        keys = [tuple(row) for row in pars]
+
+        cchi = np.zeros((self.npaths, len(self.k)), dtype='complex128')
+        p = np.zeros((self.npaths, len(self.k)), dtype='complex128')
+        needed = []
+        for ipath, key in enumerate(keys):
+            cached = self._cache[ipath].get(key, None)
+            if cached is None:
+                needed.append(ipath)
+            else:
+                self._cache[ipath].move_to_end(key)
+                cchi[ipath], p[ipath] = cached
+        self.cache_hits += self.npaths - len(needed)
+        self.cache_misses += len(needed)
+
+        if len(needed) > 0:
+            index = np.array(needed)
+            cchi[index], p[index] = self.xafs_equation(pars[index], index,
+                                                       pars[:, 2])
+            if self.cache_size > 0:
+                for ipath in needed:
+                    cache = self._cache[ipath]
+                    cache[keys[ipath]] = (cchi[ipath].copy(), p[ipath].copy())
+                    while len(cache) > self.cache_size:
+                        cache.popitem(last=False)
+
+        chi = cchi.imag
+        for ipath, path in enumerate(self.paths):
+            path.k = self.k
+            path.p = p[ipath]
+            path.chi = chi[ipath]
+            path.chi_imag = -cchi.real[ipath]
+        return chi.sum(axis=0)
+
 def path2chi(path, paramgroup=None, **kws):
     """calculate chi(k) for a Feff Path,
     optionally setting path parameter values
@@ -469,7 +1003,7 @@ def path2chi(path, paramgroup=None, **kws):
 
 
 def ff2chi(paths, group=None, paramgroup=None, k=None, kmax=None,
-            kstep=0.05, _larch=None, **kws):
+            kstep=0.05, pathstack=False, _larch=None, **kws):
     """sum chi(k) for a list of FeffPath Groups.
 
     Parameters:
@@ -479,13 +1013,17 @@ def ff2chi(paths, group=None, paramgroup=None, k=None, kmax=None,
       kmax:        maximum k value for chi calculation [20].
       kstep:       step in k value for chi calculation [0.05].
       k:           explicit array of k values to calculate chi.
+      pathstack:   whether to calculate all paths together with a
+                   FeffPathStack [False]
     Returns:
     ---------
        group contain arrays for k and chi
 
     This essentially calls path2chi() for each of the paths in the
     `paths` and writes the resulting arrays to group.k and group.chi.
-
+    With `pathstack=True`, chi(k) for all paths is calculated in a
+    single, vectorized calculation: this gives the same result and is
+    much faster for long lists of paths.
     """
     params = group2params(paramgroup)
 
@@ -494,18 +1032,27 @@ def ff2chi(paths, group=None, paramgroup=None, k=None, kmax=None,
     elif isinstance(paths, dict):
         pathlist = list(paths.values())
     else:
-        raise ValueErrror('paths must be list, tuple, or dict')
+        raise ValueError('paths must be list, tuple, or dict')
 
     for path in pathlist:
         if not isNamedClass(path, FeffPathGroup):
             print('%s is not a valid Feff Path' % path)
             return
-        path.create_path_params(params=params)
-        path._calc_chi(k=k, kstep=kstep, kmax=kmax)
-    k = pathlist[0].k[:]
-    out = np.zeros_like(k)
-    for path in pathlist:
-        out += path.chi
+
+    if pathstack:
+        if k is None:
+            kmax = 30.0 if kmax is None else kmax
+            kmax = min([max(p._feffdat.k) for p in pathlist] + [kmax])
+            k = kstep * np.arange(int(1.01 + kmax/kstep), dtype='float64')
+        out = FeffPathStack(pathlist, k).calc_chi(params)
+    else:
+        for path in pathlist:
+            path.create_path_params(params=params)
+            path._calc_chi(k=k, kstep=kstep, kmax=kmax)
+        k = pathlist[0].k[:]
+        out = np.zeros_like(k)
+        for path in pathlist:
+            out += path.chi
 
     if group is None:
         group = Group()
@@ -6,10 +6,14 @@ try:
     from collections.abc import Iterable
 except ImportError:
     from collections import Iterable
+import os
 from copy import copy, deepcopy
 from functools import partial
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                as_completed)
 import numpy as np
 from numpy import array, arange, interp, pi, zeros, sqrt, concatenate
+from scipy.fft import rfft
 
 from scipy.optimize import leastsq as scipy_leastsq
 
@@ -20,12 +24,15 @@ from larch import Group, isNamedClass
 from larch.utils.strutils import fix_varname
 from ..math import index_of, realimag, complex_phase
 from ..fitting import (correlated_values, eval_stderr, ParameterGroup,
-                       group2params, params2group, isParameter)
+                       group2params, params2group, isParameter,
+                       chi2_map_points, chi2_map_waves)
 
 from .xafsutils import set_xafsGroup
-from .xafsft import xftf_fast, xftr_fast, ftwindow
+from .xafsft import (xftf_fast, xftr_fast, ftwindow_uniform,
+                     ftwindow_kweight, kweight_array)
+from .cauchy_wavelet import cauchy_filters, cauchy_transform
 from .sigma2_models import sigma2_correldebye, sigma2_debye
-from .feffdat import FeffPathGroup, ff2chi
+from .feffdat import FeffPathGroup, FeffPathStack, ff2chi, PATH_PARS
 
 
 class TransformGroup(Group):
@@ -42,7 +49,8 @@ class TransformGroup(Group):
     def __init__(self, kmin=0, kmax=20, kweight=2, dk=4, dk2=None,
                  window='kaiser', nfft=2048, kstep=0.05,
                  rmin = 0, rmax=10, dr=0, dr2=None, rwindow='hanning',
-                 fitspace='r', wavelet_mask=None, _larch=None, **kws):
+                 fitspace='r', wavelet_mask=None, wavelet_float32=False,
+                 _larch=None, **kws):
         Group.__init__(self, **kws)
         self.kmin = kmin
         self.kmax = kmax
@@ -67,12 +75,17 @@ class TransformGroup(Group):
 
         self.fitspace = fitspace
         self.wavelet_mask = wavelet_mask
+        self.wavelet_float32 = wavelet_float32
         self._cauchymask = None
+        self._cauchyfilters = None
 
         self._larch = _larch
 
         self.kwin = None
         self.rwin = None
+        self._kwin_ref = None
+        self._kwin_shared = False
+        self._kwin_kweight = {}
         self.make_karrays()
 
     def __repr__(self):
@@ -87,6 +100,7 @@ class TransformGroup(Group):
                               rwindow=self.rwindow, nfft=self.nfft,
                               fitspace=self.fitspace,
                               wavelet_mask=self.wavelet_mask,
+                              wavelet_float32=self.wavelet_float32,
                               _larch=self._larch)
 
     def __deepcopy__(self, memo):
@@ -98,8 +112,16 @@ class TransformGroup(Group):
                               rwindow=self.rwindow, nfft=self.nfft,
                               fitspace=self.fitspace,
                               wavelet_mask=self.wavelet_mask,
+                              wavelet_float32=self.wavelet_float32,
                               _larch=self._larch)
 
+    def __getstate__(self):
+        """state for pickling, as for a worker process: the larch
+        session cannot be pickled, and is not kept"""
+        state = self.__dict__.copy()
+        state['_larch'] = None
+        return state
+
     def make_karrays(self, k=None, chi=None):
         "this should be run in kstep or nfft changes"
         if self.kstep == self.__kstep and self.nfft == self.__nfft:
@@ -110,6 +132,7 @@ class TransformGroup(Group):
         self.rstep = pi/(self.kstep*self.nfft)
         self.k_ = self.kstep * arange(self.nfft, dtype='float64')
         self.r_ = self.rstep * arange(self.nfft, dtype='float64')
+        self._kwin_ref = None
 
     def _xafsft(self, chi, group=None, rmax_out=10, **kws):
         "returns "
@@ -126,7 +149,7 @@ class TransformGroup(Group):
         group = set_xafsGroup(group, _larch=self._larch)
         r   = self.rstep * arange(irmax)
         mag = sqrt(out.real**2 + out.imag**2)
-        group.kwin  =  self.kwin[:len(chi)]
+        group.kwin  =  self.kwin[:len(chi)].copy()
         group.r    =  r[:irmax]
         group.chir =  out[:irmax]
         group.chir_mag =  mag[:irmax]
@@ -140,51 +163,107 @@ class TransformGroup(Group):
             return self.kweight[0]
         return self.kweight
 
-    def fftf(self, chi, kweight=None):
-        """ forward FT -- meant to be used internally.
-        chi must be on self.k_ grid"""
+    def _kwindow(self):
+        """k-window on the k_ grid, from the process-wide window cache"""
+        return ftwindow_uniform(self.kstep, self.nfft, xmin=self.kmin,
+                                xmax=self.kmax, dx=self.dk, dx2=self.dk2,
+                                window=self.window)
+
+    def kwin_kweight(self, kweight, npts):
+        """return the k-window times k**kweight for the first npts
+        points of the k_ grid.  kweight can be a list of k-weights,
+        giving a 2-d array with one row per k-weight.
+
+        These are cached for each kweight, and recalculated only
+        when kwin is reset to None or kstep or nfft change.  Unless
+        kwin has been set by hand, the window and these products
+        come from the process-wide window cache (see ftwindow_kweight),
+        and are shared, read-only, by all copies of a TransformGroup."""
         if self.kstep != self.__kstep or self.nfft != self.__nfft:
             self.make_karrays()
         if self.kwin is None:
-            self.kwin = ftwindow(self.k_, xmin=self.kmin, xmax=self.kmax,
-                                 dx=self.dk, dx2=self.dk2, window=self.window)
+            self.kwin = self._kwindow()
+        if self._kwin_ref is not self.kwin:
+            self._kwin_ref = self.kwin
+            self._kwin_kweight = {}
+            self._kwin_shared = self.kwin is self._kwindow()
+        if isinstance(kweight, Iterable):
+            kweight = tuple(kweight)
+        key = (kweight, npts)
+        if key not in self._kwin_kweight:
+            if self._kwin_shared:
+                kwin = ftwindow_kweight(kweight, npts, kstep=self.kstep,
+                                        kmin=self.kmin, kmax=self.kmax,
+                                        dk=self.dk, dk2=self.dk2,
+                                        window=self.window, nwin=self.nfft)
+            else:
+                kwin = self.kwin[:npts] * kweight_array(self.kstep, npts, kweight)
+            self._kwin_kweight[key] = kwin
+        return self._kwin_kweight[key]
+
+    def fftf(self, chi, kweight=None, workers=None):
+        """ forward FT -- meant to be used internally.
+        chi must be on self.k_ grid, and can be a 2-d array
+        of many chi arrays, one per row.
+
+        If kweight is a list of k-weights, chi(R) for all k-weights are
+        calculated together, with a new next-to-last axis for k-weight."""
         if kweight is None:
             kweight = self.get_kweight()
-        cx = chi * self.kwin[:len(chi)] * self.k_[:len(chi)]**kweight
-        return xftf_fast(cx, kstep=self.kstep, nfft=self.nfft)
-
-    def fftr(self, chir):
-        " reverse FT -- meant to be used internally"
+        chi = np.asarray(chi)
+        win = self.kwin_kweight(kweight, chi.shape[-1])
+        if win.ndim > 1:
+            chi = chi[..., np.newaxis, :]
+        return xftf_fast(chi*win, kstep=self.kstep, nfft=self.nfft,
+                         workers=workers)
+
+    def fftr(self, chir, workers=None):
+        """ reverse FT -- meant to be used internally.
+        chir can be a 2-d array of many chi(R) arrays, one per row"""
         if self.kstep != self.__kstep or self.nfft != self.__nfft:
             self.make_karrays()
         if self.rwin is None:
-            self.rwin = ftwindow(self.r_, xmin=self.rmin, xmax=self.rmax,
-                                 dx=self.dr, dx2=self.dr2, window=self.rwindow)
+            self.rwin = ftwindow_uniform(self.rstep, self.nfft, xmin=self.rmin,
+                                         xmax=self.rmax, dx=self.dr,
+                                         dx2=self.dr2, window=self.rwindow)
 
-        cx = chir * self.rwin[:len(chir)]
-        return xftr_fast(cx, kstep=self.kstep, nfft=self.nfft)
+        cx = chir * self.rwin[:chir.shape[-1]]
+        return xftr_fast(cx, kstep=self.kstep, nfft=self.nfft, workers=workers)
 
 
     def make_cwt_arrays(self, nkpts, nrpts):
         if self.kstep != self.__kstep or self.nfft != self.__nfft:
             self.make_karrays()
         if self.kwin is None:
-            self.kwin = ftwindow(self.k_, xmin=self.kmin, xmax=self.kmax,
-                                 dx=self.dk, dx2=self.dk2, window=self.window)
+            self.kwin = self._kwindow()
 
         if self._cauchymask is None:
+            ikmin = int(max(0, 0.01 + self.kmin/self.kstep))
+            ikmax = int(min(self.nfft/2,  0.01 + self.kmax/self.kstep))
+            irmin = int(max(0, 0.01 + self.rmin/self.rstep))
+            irmax = int(min(self.nfft/2,  0.01 + self.rmax/self.rstep))
             if self.wavelet_mask is not None:
                 self._cauchymask = self.wavelet_mask
+                self._cauchyslice = (slice(0, nrpts), slice(0, nkpts))
             else:
-                ikmin = int(max(0, 0.01 + self.kmin/self.kstep))
-                ikmax = int(min(self.nfft/2,  0.01 + self.kmax/self.kstep))
-                irmin = int(max(0, 0.01 + self.rmin/self.rstep))
-                irmax = int(min(self.nfft/2,  0.01 + self.rmax/self.rstep))
                 cm = np.zeros(nrpts*nkpts, dtype='int').reshape(nrpts, nkpts)
                 cm[irmin:irmax, ikmin:ikmax] = 1
                 self._cauchymask = cm
                 self._cauchyslice =(slice(irmin, irmax), slice(ikmin, ikmax))
 
+    def cauchy_filters(self, nrpts):
+        """Cauchy wavelet filter bank for nrpts R values, cached
+        for each (kstep, nfft, rmax, float32) combination."""
+        dtype = 'float32' if self.wavelet_float32 else 'float64'
+        key = (self.kstep, self.nfft, self.rmax, nrpts, dtype)
+        if self._cauchyfilters is None or self._cauchyfilters[0] != key:
+            omega = pi*np.arange(self.nfft)/(self.kstep*self.nfft)
+            r   = self.rstep * arange(nrpts)
+            r[0] = 1.e-19
+            alpha = nrpts/(2*r)
+            self._cauchyfilters = (key, cauchy_filters(omega, alpha, dtype=dtype))
+        return self._cauchyfilters[1]
+
     def cwt(self, chi, rmax=None, kweight=None):
         """cauchy wavelet transform -- meant to be used internally"""
         if self.kstep != self.__kstep or self.nfft != self.__nfft:
@@ -194,12 +273,10 @@ class TransformGroup(Group):
         if self.kwin is None:
             self.make_cwt_arrays(nkpts, nrpts)
 
-        omega = pi*np.arange(self.nfft)/(self.kstep*self.nfft)
-
         if kweight is None:
             kweight = self.get_kweight()
         if kweight != 0:
-            chi = chi * self.kwin[:len(chi)] * self.k_[:len(chi)]**kweight
+            chi = chi * self.kwin_kweight(kweight, nkpts)
 
         if rmax is not None:
             self.rmax = rmax
@@ -207,29 +284,84 @@ class TransformGroup(Group):
         chix   = np.zeros(int(self.nfft/2)) * self.kstep
         chix[:nkpts] = chi
         chix   = chix[:int(self.nfft/2)]
-        _ffchi = np.fft.fft(chix, n=2*self.nfft)[:self.nfft]
+        _ffchi = rfft(chix, n=2*self.nfft)
 
         nrpts = int(np.round(self.rmax/self.rstep))
-        r   = self.rstep * arange(nrpts)
-        r[0] = 1.e-19
-        alpha = nrpts/(2*r)
-
         self.make_cwt_arrays(nkpts, nrpts)
 
-        cauchy_sum = np.log(2*pi) - np.log(1.0+np.arange(nrpts)).sum()
+        # only the rows within the mask are transformed
+        rslice, kslice = self._cauchyslice
+        filters = self.cauchy_filters(nrpts)[rslice]
+        out = cauchy_transform(_ffchi, filters, nkpts)
+        return (out*self._cauchymask[rslice])[:, kslice]
+
+def _realimag(arr):
+    "real array of real/imag pairs along the last axis of a complex array"
+    return np.stack((arr.real, arr.imag), axis=-1).reshape(arr.shape[:-1] + (-1,))
 
-        out = np.zeros(nrpts*nkpts, dtype='complex128').reshape(nrpts, nkpts)
+def transform_residual(diff, trans, epsilon_k, epsilon_r):
+    """apply a feffit transform, k-weights and uncertainties to an array
+    of chi(k), such as data_chi - model_chi, giving the fit residual.
 
-        for i in range(nrpts):
-            aom = alpha[i]*omega
-            filt = cauchy_sum + nrpts*np.log(aom) - aom
-            out[i, :] = np.fft.ifft(np.exp(filt)*_ffchi, 2*self.nfft)[:nkpts]
+    diff can also be a 2-d array of many chi(k) arrays, one per row, all
+    of which are transformed together, giving one residual per row.
+    For r- and q-space fits, all k-weights are transformed together.
+    """
+    eps_k = epsilon_k
+    if isinstance(eps_k, np.ndarray):
+        eps_k[np.where(eps_k<1.e-12)[0]] = 1.e-12
+
+    nkpts = diff.shape[-1]
+
+    all_kweights = isinstance(trans.kweight, Iterable)
+    if trans.fitspace == 'k':
+        iqmin = int(max(0, 0.01 + trans.kmin/trans.kstep))
+        iqmax = int(min(trans.nfft/2,  0.01 + trans.kmax/trans.kstep))
+        if all_kweights:
+            out = []
+            for i, kw in enumerate(trans.kweight):
+                kwt = kweight_array(trans.kstep, nkpts, kw)
+                out.append(((diff/eps_k[i])*kwt)[..., iqmin:iqmax])
+            return np.concatenate(out, axis=-1)
+        else:
+            kwt = kweight_array(trans.kstep, nkpts, trans.kweight)
+            return ((diff/eps_k) * kwt)[..., iqmin:iqmax]
+    elif trans.fitspace == 'w':
+        if diff.ndim > 1:
+            return np.array([transform_residual(d, trans, epsilon_k, epsilon_r)
+                             for d in diff])
+        if all_kweights:
+            out = []
+            for i, kw in enumerate(trans.kweight):
+                cwt = trans.cwt(diff/eps_k, kweight=kw)
+                out.append(realimag(cwt).ravel())
+            return np.concatenate(out)
+        else:
+            cwt = trans.cwt(diff/eps_k, kweight=trans.kweight)
+            return realimag(cwt).ravel()
+    else: # 'r' space
+        # chir has shape (..., nkweights, nfft/2)
+        if all_kweights:
+            chir = trans.fftf(diff, kweight=trans.kweight)
+            eps_r = np.array(epsilon_r)[:, np.newaxis]
+        else:
+            chir = trans.fftf(diff)[..., np.newaxis, :]
+            eps_r = epsilon_r
+        if trans.fitspace == 'r':
+            irmin = int(max(0, 0.01 + trans.rmin/trans.rstep))
+            irmax = int(min(trans.nfft/2,  0.01 + trans.rmax/trans.rstep))
+            out = _realimag(chir[..., irmin:irmax] / eps_r)
+        else:
+            iqmin = int(max(0, 0.01 + trans.kmin/trans.kstep))
+            iqmax = int(min(trans.nfft/2,  0.01 + trans.kmax/trans.kstep))
+            out = (trans.fftr(chir)/eps_r)[..., iqmin:iqmax].real
+        return out.reshape(out.shape[:-2] + (-1,))
 
-        return (out*self._cauchymask)[self._cauchyslice]
 
 class FeffitDataSet(Group):
     def __init__(self, data=None, paths=None, transform=None,
-                 epsilon_k=None, _larch=None, pathlist=None, **kws):
+                 epsilon_k=None, pathstack=True, _larch=None,
+                 pathlist=None, **kws):
         self._larch = _larch
         Group.__init__(self, **kws)
 
@@ -254,6 +386,8 @@ class FeffitDataSet(Group):
 
         self.model = Group()
         self.model.k = None
+        self.pathstack = pathstack
+        self._pathstack = None
         self.__chi = None
         self.__prepared = False
 
@@ -264,12 +398,14 @@ class FeffitDataSet(Group):
         return FeffitDataSet(data=copy(self.data),
                              paths=self.paths,
                              transform=self.transform,
+                             pathstack=self.pathstack,
                              _larch=self._larch)
 
     def __deepcopy__(self, memo):
         return FeffitDataSet(data=deepcopy(self.data),
                              paths=self.paths,
                              transform=self.transform,
+                             pathstack=self.pathstack,
                              _larch=self._larch)
 
     def prepare_fit(self, params):
@@ -308,6 +444,12 @@ class FeffitDataSet(Group):
             if path.spline_coefs is None:
                 path.create_spline_coefs()
 
+        # pack all paths into a FeffPathStack for vectorized chi(k)
+        self._pathstack = None
+        if self.pathstack and len(self.paths) > 0:
+            self._pathstack = FeffPathStack(self.paths, self.model.k)
+            self._pathstack.params = params
+
         self.__prepared = True
 
 
@@ -321,7 +463,7 @@ class FeffitDataSet(Group):
 
         all_kweights = all_kweights and isinstance(trans.kweight, Iterable)
         if all_kweights:
-            chir = [trans.fftf(chi, kweight=kw) for kw in trans.kweight]
+            chir = trans.fftf(chi, kweight=trans.kweight)
         else:
             chir = [trans.fftf(chi)]
         irmin = int(0.01 + rmin/trans.rstep)
@@ -388,61 +530,66 @@ class FeffitDataSet(Group):
         if not self.__prepared:
             self.prepare_fit()
 
-        ff2chi(self.paths, paramgroup=paramgroup, k=self.model.k,
-                _larch=self._larch, group=self.model)
-
-        eps_k = self.epsilon_k
-        if isinstance(eps_k, np.ndarray):
-            eps_k[np.where(eps_k<1.e-12)[0]] = 1.e-12
+        if self._pathstack is not None:
+            params = group2params(paramgroup)
+            self.model.chi = self._pathstack.calc_chi(params)
+        else:
+            ff2chi(self.paths, paramgroup=paramgroup, k=self.model.k,
+                   _larch=self._larch, group=self.model)
 
         diff  = (self.__chi - self.model.chi)
         if data_only:  # for extracting transformed data separately from residual
             diff  = self.__chi
-        trans = self.transform
-        k     = trans.k_[:len(diff)]
+        return self._transform_diff(diff)
 
-        all_kweights = isinstance(trans.kweight, Iterable)
-        if trans.fitspace == 'k':
-            iqmin = int(max(0, 0.01 + trans.kmin/trans.kstep))
-            iqmax = int(min(trans.nfft/2,  0.01 + trans.kmax/trans.kstep))
-            if all_kweights:
-                out = []
-                for i, kw in enumerate(trans.kweight):
-                    out.append(((diff/eps_k[i])*k**kw)[iqmin:iqmax])
-                return np.concatenate(out)
-            else:
-                return ((diff/eps_k) * k**trans.kweight)[iqmin:iqmax]
-        elif trans.fitspace == 'w':
-            if all_kweights:
-                out = []
-                for i, kw in enumerate(trans.kweight):
-                    cwt = trans.cwt(diff/eps_k, kweight=kw)
-                    out.append(realimag(cwt).ravel())
-                return np.concatenate(out)
-            else:
-                cwt = trans.cwt(diff/eps_k, kweight=trans.kweight)
-                return realimag(cwt).ravel()
-        else: # 'r' space
-            out = []
-            if all_kweights:
-                chir = [trans.fftf(diff, kweight=kw) for kw in trans.kweight]
-                eps_r = self.epsilon_r
-            else:
-                chir = [trans.fftf(diff)]
-                eps_r = [self.epsilon_r]
-            if trans.fitspace == 'r':
-                irmin = int(max(0, 0.01 + trans.rmin/trans.rstep))
-                irmax = int(min(trans.nfft/2,  0.01 + trans.rmax/trans.rstep))
-                for i, chir_ in enumerate(chir):
-                    chir_ = chir_ / (eps_r[i])
-                    out.append(realimag(chir_[irmin:irmax]))
-            else:
-                chiq = [trans.fftr(c)/eps for c, eps in zip(chir, eps_r)]
-                iqmin = int(max(0, 0.01 + trans.kmin/trans.kstep))
-                iqmax = int(min(trans.nfft/2,  0.01 + trans.kmax/trans.kstep))
-                for chiq_ in chiq:
-                    out.append( realimag(chiq_[iqmin:iqmax])[::2])
-            return np.concatenate(out)
+    def _jacobian(self, paramgroup, var_names):
+        """return the Jacobian of the residual for this data set with
+        respect to the variables in var_names, as an array of shape
+        (len(residual), len(var_names)).
+
+        The derivatives of the model chi(k) are calculated analytically by
+        the FeffPathStack, and, as the transform is linear, the derivatives
+        of the residual are the transforms of these.
+        """
+        if self._pathstack is None:
+            raise ValueError('analytic Jacobian needs a dataset with pathstack=True')
+        self._pathstack.set_params(group2params(paramgroup))
+        dchi = self._pathstack.calc_chi_jacobian(var_names)
+        return self._transform_diff(-dchi).T
+
+    def _transform_diff(self, diff):
+        """apply the transform, k-weights and uncertainties to an array of
+        chi(k), such as data_chi - model_chi, giving the residual"""
+        return transform_residual(diff, self.transform, self.epsilon_k,
+                                  self.epsilon_r)
+
+    def _residual_pathpars(self, pathpars):
+        """return the residual for this data set from an array of path
+        parameter values for the path stack, as from path_paramvals().
+        No Parameters are evaluated, so this can be run in a worker thread.
+        """
+        self.model.chi = self._pathstack.calc_chi(pathpars=pathpars)
+        return self._transform_diff(self.__chi - self.model.chi)
+
+    def _worker_state(self):
+        """return the picklable parts of the prepared dataset needed to
+        calculate the residual from path parameter values in a worker
+        process: (path stack, transform, data chi, epsilon_k, epsilon_r)"""
+        return (self._pathstack, self.transform, self.__chi,
+                self.epsilon_k, self.epsilon_r)
+
+    def _refit_state(self):
+        """return the picklable parts of the prepared dataset needed to
+        rebuild its paths and refit it in a worker process, as a dict"""
+        paths = []
+        for label, path in self.paths.items():
+            pdef = dict(filename=path.filename, label=label)
+            for pname in PATH_PARS:
+                pdef[pname] = getattr(path, pname)
+            paths.append(pdef)
+        return dict(paths=paths, k=self.model.k, chi=self.__chi,
+                    transform=self.transform, epsilon_k=self.epsilon_k,
+                    epsilon_r=self.epsilon_r)
 
     def save_ffts(self, rmax_out=10, path_outputs=True):
         "save fft outputs"
@@ -454,7 +601,7 @@ class FeffitDataSet(Group):
                 xft(p.chi, group=p, rmax_out=rmax_out)
 
 def feffit_dataset(data=None, paths=None, transform=None,
-                   epsilon_k=None, pathlist=None, _larch=None):
+                   epsilon_k=None, pathlist=None, pathstack=True, _larch=None):
     """create a Feffit Dataset group.
 
      Parameters:
@@ -466,6 +613,8 @@ def feffit_dataset(data=None, paths=None, transform=None,
 
       epsilon_k: Uncertainty in data (either single value or array of
                  same length as data.k)
+      pathstack: whether to calculate chi(k) for all paths together in
+                 a single vectorized calculation [True]
 
      Returns:
      ----------
@@ -474,7 +623,8 @@ def feffit_dataset(data=None, paths=None, transform=None,
 
     """
     return FeffitDataSet(data=data, paths=paths, transform=transform,
-                         pathlist=pathlist, _larch=_larch)
+                         pathlist=pathlist, pathstack=pathstack,
+                         _larch=_larch)
 
 def feffit_transform(_larch=None, **kws):
     """create a feffit transform group
@@ -494,6 +644,8 @@ def feffit_transform(_larch=None, **kws):
        rmax:     ending *R* for Fit Range and/or reverse FT Window (10).
        dr:       tapering parameter for reverse FT Window 0.
        rwindow:  name of window type for reverse FT Window ('kaiser').
+       wavelet_float32: use single precision for the wavelet filter bank
+                 in wavelet-space fits, to save memory (False).
 
      Returns:
      ----------
@@ -502,7 +654,81 @@ def feffit_transform(_larch=None, **kws):
     """
     return TransformGroup(_larch=_larch, **kws)
 
-def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True, _larch=None, **kws):
+_WORKER_STATES = None
+
+def _init_residual_worker(states):
+    "initialize worker process for FeffitResidualPool"
+    global _WORKER_STATES
+    _WORKER_STATES = states
+
+def _worker_residual(index, pathpars):
+    "calculate residual for a dataset in a worker process"
+    stack, trans, chi, eps_k, eps_r = _WORKER_STATES[index]
+    diff = chi - stack.calc_chi(pathpars=pathpars)
+    return transform_residual(diff, trans, eps_k, eps_r)
+
+class FeffitResidualPool(object):
+    """Evaluate the residuals of several prepared FeffitDataSets concurrently.
+
+    The path parameters are evaluated in the calling thread, as the
+    constraint expressions share one symbol table.  The path sums and
+    Fourier transforms for each dataset, which are independent, are then
+    sent to a pool of workers, and the residuals are concatenated in the
+    order of the datasets.  Datasets without a path stack are evaluated
+    in the calling thread.
+
+    Arguments
+    ---------
+      datasets   list of FeffitDataSets, already prepared with prepare_fit()
+      nworkers   number of workers [4]
+      executor   'thread' or 'process' ['thread']
+      mp_context multiprocessing context for 'process' [None, the default]
+
+    Threads work well as most of the work is in numpy and FFTs, which release
+    the GIL.  With 'process', each worker process holds a copy of the path
+    stacks, transforms and data, and only the path parameter values and
+    residuals are passed between processes.
+    """
+    def __init__(self, datasets, nworkers=4, executor='thread', mp_context=None):
+        self.datasets = datasets
+        self.use_processes = executor.lower().startswith('proc')
+        for ds in datasets:
+            # make sure FT windows exist before they are used by workers
+            if ds._pathstack is not None:
+                ds._transform_diff(np.zeros(len(ds.model.k)))
+        if self.use_processes:
+            states = [ds._worker_state() for ds in datasets]
+            self.pool = ProcessPoolExecutor(max_workers=nworkers,
+                                            mp_context=mp_context,
+                                            initializer=_init_residual_worker,
+                                            initargs=(states,))
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=nworkers)
+
+    def residual(self, paramgroup):
+        """return concatenated residual for all datasets"""
+        params = group2params(paramgroup)
+        out = []
+        for index, ds in enumerate(self.datasets):
+            if ds._pathstack is None:
+                out.append(ds._residual(paramgroup))
+                continue
+            ds._pathstack.set_params(params)
+            pathpars = ds._pathstack.path_paramvals()
+            if self.use_processes:
+                out.append(self.pool.submit(_worker_residual, index, pathpars))
+            else:
+                out.append(self.pool.submit(ds._residual_pathpars, pathpars))
+        return concatenate([r if isinstance(r, np.ndarray) else r.result()
+                            for r in out])
+
+    def close(self):
+        """shut down worker pool"""
+        self.pool.shutdown()
+
+def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True,
+           analytic_jacobian=False, nworkers=1, executor='thread',
+           _larch=None, **kws):
     """execute a Feffit fit: a fit of feff paths to a list of datasets
 
     Parameters:
@@ -511,6 +737,13 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True, _larch=None, **
       datasets:     Feffit Dataset group or list of Feffit Dataset group.
       rmax_out:     maximum R value to calculate output arrays.
       path_output:  Flag to set whether all Path outputs should be written.
+      analytic_jacobian: Flag to use analytic derivatives of the path sums
+                    for the Jacobian, instead of finite differences [False].
+                    This needs datasets using pathstack=True.
+      nworkers:     number of workers to evaluate datasets concurrently [1].
+                    With more than 1 worker and more than 1 dataset, the
+                    datasets are evaluated with a FeffitResidualPool.
+      executor:     type of worker pool, 'thread' or 'process' ['thread'].
 
     Returns:
     ---------
@@ -520,6 +753,9 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True, _larch=None, **
         params:   This will be identical to the input parameter group.
         fit:      an object which points to the low-level fit.
 
+     The counts of path chi(k) calculations that were reused from the
+     path cache or recalculated are in path_cache_hits and path_cache_misses.
+
      Statistical parameters will be put into the params group.  Each
      dataset will have a 'data' and 'model' subgroup, each with arrays:
         k            wavenumber array of k
@@ -539,8 +775,16 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True, _larch=None, **
     def _resid(params, datasets=None, pargroup=None, **kwargs):
         """ this is the residual function"""
         params2group(params, pargroup)
+        if pool is not None:
+            return pool.residual(pargroup)
         return concatenate([d._residual(pargroup) for d in datasets])
 
+    def _jacobian(params, datasets=None, pargroup=None, **kwargs):
+        """ this is the analytic Jacobian function"""
+        params2group(params, pargroup)
+        var_names = fit.result.var_names
+        return concatenate([d._jacobian(pargroup, var_names) for d in datasets])
+
     if isNamedClass(datasets, FeffitDataSet):
         datasets = [datasets]
 
@@ -554,7 +798,18 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True, _larch=None, **
                     fcn_kws=dict(datasets=datasets, pargroup=work_paramgroup),
                     scale_covar=True, **kws)
 
-    result = fit.leastsq()
+    pool = None
+    if nworkers > 1 and len(datasets) > 1:
+        pool = FeffitResidualPool(datasets, nworkers=nworkers,
+                                  executor=executor)
+    try:
+        if analytic_jacobian:
+            result = fit.leastsq(Dfun=_jacobian, col_deriv=False)
+        else:
+            result = fit.leastsq()
+    finally:
+        if pool is not None:
+            pool.close()
     params2group(result.params, work_paramgroup)
 
     dat = concatenate([d._residual(work_paramgroup, data_only=True) for d in datasets])
@@ -629,11 +884,19 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True, _larch=None, **
     for ds in datasets:
         ds.save_ffts(rmax_out=rmax_out, path_outputs=path_outputs)
 
+    # counts of reused and recalculated path chi(k) from the path stacks
+    cache_hits, cache_misses = 0, 0
+    for ds in datasets:
+        if ds._pathstack is not None:
+            cache_hits += ds._pathstack.cache_hits
+            cache_misses += ds._pathstack.cache_misses
+
     out = Group(name='feffit results', datasets=datasets,
                 paramgroup=work_paramgroup,
                 fitter=fit, fit_details=result, chi_square=chi_square,
                 n_independent=n_idp, chi2_reduced=chi2_reduced,
-                rfactor=rfactor, aic=aic, bic=bic, covar=covar)
+                rfactor=rfactor, aic=aic, bic=bic, covar=covar,
+                path_cache_hits=cache_hits, path_cache_misses=cache_misses)
 
     for attr in ('params', 'nvarys', 'nfree', 'ndata', 'var_names', 'nfev',
                  'success', 'errorbars', 'message', 'lmdif_message'):
@@ -641,6 +904,388 @@ def feffit(paramgroup, datasets, rmax_out=10, path_outputs=True, _larch=None, **
     return out
 
 
+def _refit_state(result, **kws):
+    """return a picklable state for a _FeffitRefitter from a feffit result:
+    the names, values and expressions of the (non-path) parameters, other
+    numeric symbols in the parameter group, and the datasets"""
+    var_names = list(result.var_names)
+    pathpars = set()
+    for ds in result.datasets:
+        for path in ds.paths.values():
+            pathpars.update([path.pathpar_name(p) for p in PATH_PARS])
+    pars = [(name, par.value, par.vary, par.min, par.max, par.expr)
+            for name, par in result.params.items() if name not in pathpars]
+    names = var_names + [p[0] for p in pars if p[0] not in var_names]
+    symbols = {}
+    for name in dir(result.paramgroup):
+        val = getattr(result.paramgroup, name)
+        if not isParameter(val) and isinstance(val, (int, float, np.ndarray)):
+            symbols[name] = val
+    state = dict(names=names, var_names=var_names, params=pars,
+                 symbols=symbols,
+                 datasets=[ds._refit_state() for ds in result.datasets])
+    state.update(kws)
+    return state
+
+class _FeffitRefitter(object):
+    """refits the datasets of a feffit, for feffit_bootstrap() and
+    feffit_chi2_map().  The Parameters, paths, spline coefficients and
+    path stacks are built once from the state made by _refit_state(),
+    possibly in a worker process, and reused for all refits."""
+    def __init__(self, state):
+        self.method = state.get('method', None)
+        self.seed = state.get('seed', 0)
+        self.names = state['names']
+        self.var_names = state['var_names']
+        self.params = params = Parameters()
+        for name, val in state['symbols'].items():
+            params._asteval.symtable[name] = val
+        for name, value, vary, vmin, vmax, expr in state['params']:
+            params.add(name, value=value, vary=vary, min=vmin, max=vmax)
+        for name, value, vary, vmin, vmax, expr in state['params']:
+            if expr is not None:
+                params[name].expr = expr
+
+        self.datasets = []
+        for dstate in state['datasets']:
+            paths = [FeffPathGroup(**pdef) for pdef in dstate['paths']]
+            for path in paths:
+                path.create_path_params(params=params)
+                if path.spline_coefs is None:
+                    path.create_spline_coefs()
+            stack = FeffPathStack(paths, dstate['k'])
+            stack.params = params
+            trans = dstate['transform']
+            k = dstate['k']
+            eps_k = dstate['epsilon_k']
+            if isinstance(eps_k, (list, tuple)):
+                eps_k = np.mean(np.array(eps_k, dtype='float64'), axis=0)
+            self.datasets.append(Group(stack=stack, transform=trans,
+                                       chi=dstate['chi'], fit_chi=dstate['chi'],
+                                       noise=eps_k, epsilon_k=dstate['epsilon_k'],
+                                       epsilon_r=dstate['epsilon_r'],
+                                       kfit=np.where((k >= trans.kmin) &
+                                                     (k <= trans.kmax))[0],
+                                       kwin=np.where(trans.kwin_kweight(0, len(k)) > 0)[0]))
+        # best-fit model, used as the base of all synthetic data sets
+        for ds in self.datasets:
+            ds.model_chi = ds.stack.calc_chi(params).copy()
+
+    def _residual(self, params):
+        out = []
+        for ds in self.datasets:
+            diff = ds.fit_chi - ds.stack.calc_chi(params)
+            out.append(transform_residual(diff, ds.transform, ds.epsilon_k,
+                                          ds.epsilon_r))
+        return concatenate(out)
+
+    def make_sample(self, index):
+        """set synthetic chi(k) for all datasets for a sample index.
+        Each sample index has its own random generator, so that the
+        samples do not depend on the order in which they are run."""
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed,
+                                                           spawn_key=(index,)))
+        for ds in self.datasets:
+            chi = ds.chi.copy()
+            if self.method == 'noise':
+                noise = ds.noise*rng.standard_normal(len(chi))
+                chi[ds.kwin] = ds.model_chi[ds.kwin] + noise[ds.kwin]
+            else:
+                resid = (ds.chi - ds.model_chi)[ds.kfit]
+                chi[ds.kfit] = (ds.model_chi[ds.kfit] +
+                                rng.choice(resid, size=len(resid)))
+            ds.fit_chi = chi
+
+    def fit_sample(self, index):
+        """fit one synthetic data set, starting from the best-fit values.
+        Returns (index, parameter values, chi-square, nfev, success)"""
+        self.make_sample(index)
+        fit = Minimizer(self._residual, self.params)
+        result = fit.leastsq()
+        values = np.array([result.params[name].value for name in self.names])
+        return (index, values, result.chisqr, result.nfev, result.success)
+
+    def fit_point(self, index, xname, xval, yname, yval, start, refit=True):
+        """fit the data with the variables xname and yname fixed at xval
+        and yval, starting from the values in start (for the names in
+        self.names).  With refit=False, the residual is only evaluated.
+        Returns (index, parameter values, chi-square, nfev)"""
+        params = self.params
+        for ds in self.datasets:
+            ds.fit_chi = ds.chi
+        for name, val in zip(self.names, start):
+            if params[name].expr is None:
+                params[name].value = val
+        params[xname].value = xval
+        params[yname].value = yval
+        nfev = 1
+        if refit and len(self.var_names) > 2:
+            params[xname].vary = params[yname].vary = False
+            try:
+                result = Minimizer(self._residual, params).leastsq()
+            finally:
+                params[xname].vary = params[yname].vary = True
+            out = result.params
+            chisqr, nfev = result.chisqr, result.nfev
+        else:
+            resid = self._residual(params)
+            out = params
+            chisqr = (resid*resid).sum()
+        values = np.array([out[name].value for name in self.names])
+        return (index, values, chisqr, nfev)
+
+_FEFFIT_REFITTER = None
+
+def _init_refit_worker(state):
+    "initialize worker process for feffit_bootstrap and feffit_chi2_map"
+    global _FEFFIT_REFITTER
+    _FEFFIT_REFITTER = _FeffitRefitter(state)
+
+def _bootstrap_samples(indices):
+    "fit synthetic data for a list of sample indices in a worker process"
+    return [_FEFFIT_REFITTER.fit_sample(i) for i in indices]
+
+def _chi2_map_points(points):
+    "fit or evaluate a list of chi2 map points in a worker process"
+    return [_FEFFIT_REFITTER.fit_point(*args) for args in points]
+
+def _read_bootstrap_checkpoint(fname, meta):
+    """read bootstrap results from a checkpoint file, checking that it
+    was written for the same fit, method, seed and number of samples"""
+    with np.load(fname, allow_pickle=False) as npz:
+        saved = {key: npz[key] for key in npz.files}
+    for key, val in meta.items():
+        if not np.array_equal(saved[key], val):
+            raise ValueError("checkpoint file '%s' does not match this bootstrap (%s)"
+                             % (fname, key))
+    return saved
+
+def _write_bootstrap_checkpoint(fname, meta, arrays):
+    """write bootstrap results to a checkpoint file, replacing it atomically"""
+    tmpname = '%s.%d.tmp' % (fname, os.getpid())
+    with open(tmpname, 'wb') as fh:
+        np.savez(fh, **meta, **arrays)
+    os.replace(tmpname, fname)
+
+def feffit_bootstrap(result, nsamples=200, method='bootstrap', seed=0,
+                     nworkers=1, checkpoint=None, checkpoint_every=20,
+                     mp_context=None, _larch=None):
+    """estimate the distributions of fitted parameters from a feffit by
+    refitting many synthetic data sets, made from the best-fit model.
+
+    Parameters:
+    ------------
+      result:      Feffit result, output group from feffit()
+      nsamples:    number of synthetic data sets to fit [200]
+      method:      how to make synthetic data sets, one of
+                   'bootstrap': best-fit model + k-space residuals within
+                                [kmin, kmax], resampled with replacement
+                   'noise':     best-fit model + Gaussian noise of epsilon_k,
+                                over the full k-window
+                   ['bootstrap']
+      seed:        seed for random numbers [0].  Each sample has its own
+                   random generator, made from seed and its index.
+      nworkers:    number of worker processes [1]
+      checkpoint:  name of file for saving results while running, and for
+                   resuming an interrupted run [None, no checkpoint file]
+      checkpoint_every: number of samples between writes of checkpoint [20]
+      mp_context:  multiprocessing context for the worker processes
+                   [None, the default context]
+
+    Returns:
+    ---------
+      a group with
+        names:      names of the parameters, variables first.
+        var_names:  names of the variables.
+        best:       best-fit values from the feffit.
+        samples:    2D array (nsamples, len(names)) of fitted values.
+        mean, std:  mean and standard deviation of samples for each name.
+        correl:     correlation matrix of the variables.
+        chisqr, nfev, success: chi-square, number of function evaluations
+                    and success flag for each sample.
+
+    Each sample is fit starting from the best-fit values.  The prepared
+    paths, spline coefficients and path stacks are built once for each
+    worker process and shared by all the samples it fits.  The results do
+    not depend on nworkers, or on whether a run was resumed from a
+    checkpoint file.
+    """
+    method = method.lower()
+    if method not in ('bootstrap', 'noise'):
+        raise ValueError("method must be 'bootstrap' or 'noise'")
+
+    state = _refit_state(result, method=method, seed=seed)
+    names, var_names = state['names'], state['var_names']
+
+    nnames = len(names)
+    arrays = dict(samples=np.zeros((nsamples, nnames)),
+                  chisqr=np.zeros(nsamples), nfev=np.zeros(nsamples, dtype='int64'),
+                  success=np.zeros(nsamples, dtype=bool),
+                  done=np.zeros(nsamples, dtype=bool))
+    meta = dict(method=np.array(method), seed=np.array(seed),
+                nsamples=np.array(nsamples), names=np.array(names))
+    if checkpoint is not None and os.path.exists(checkpoint):
+        saved = _read_bootstrap_checkpoint(checkpoint, meta)
+        for key in arrays:
+            arrays[key] = saved[key]
+
+    todo = np.where(~arrays['done'])[0]
+    chunksize = max(1, min(checkpoint_every, len(todo)//(4*nworkers)))
+    chunks = [todo[i:i+chunksize] for i in range(0, len(todo), chunksize)]
+
+    def store(out):
+        for index, values, chisqr, nfev, success in out:
+            arrays['samples'][index] = values
+            arrays['chisqr'][index] = chisqr
+            arrays['nfev'][index] = nfev
+            arrays['success'][index] = success
+            arrays['done'][index] = True
+
+    ndone = 0
+    if nworkers > 1 and len(chunks) > 1:
+        pool = ProcessPoolExecutor(max_workers=nworkers, mp_context=mp_context,
+                                   initializer=_init_refit_worker,
+                                   initargs=(state,))
+        with pool:
+            futures = [pool.submit(_bootstrap_samples, c) for c in chunks]
+            for future in as_completed(futures):
+                out = future.result()
+                store(out)
+                ndone += len(out)
+                if checkpoint is not None and ndone >= checkpoint_every:
+                    _write_bootstrap_checkpoint(checkpoint, meta, arrays)
+                    ndone = 0
+    else:
+        fitter = _FeffitRefitter(state)
+        for chunk in chunks:
+            store([fitter.fit_sample(i) for i in chunk])
+            ndone += len(chunk)
+            if checkpoint is not None and ndone >= checkpoint_every:
+                _write_bootstrap_checkpoint(checkpoint, meta, arrays)
+                ndone = 0
+    if checkpoint is not None:
+        _write_bootstrap_checkpoint(checkpoint, meta, arrays)
+
+    samples = arrays['samples']
+    nvars = len(var_names)
+    correl = np.ones((nvars, nvars))
+    if nsamples > 1 and nvars > 1:
+        correl = np.corrcoef(samples[:, :nvars], rowvar=False)
+    return Group(name='feffit bootstrap', method=method, seed=seed,
+                 nsamples=nsamples, names=names, var_names=var_names,
+                 best=np.array([result.params[name].value for name in names]),
+                 samples=samples, mean=samples.mean(axis=0),
+                 std=samples.std(axis=0, ddof=1) if nsamples > 1 else np.zeros(nnames),
+                 correl=correl, chisqr=arrays['chisqr'], nfev=arrays['nfev'],
+                 success=arrays['success'])
+
+
+def iter_feffit_chi2_map(result, xname, yname, xpts, ypts, refit=True,
+                         nworkers=1, mp_context=None):
+    """generator for feffit_chi2_map(): fits (or, with refit=False,
+    evaluates the residual for) the datasets of a feffit at each point of
+    a grid of values for the variables xname and yname, yielding
+
+        (ix, iy, chi_square, values)
+
+    as each point is done, where values is a dict of parameter values.
+
+    With refit=True, points are done in waves moving out from the best-fit
+    values, and each fit starts from the solution at the nearest neighbor
+    in the previous wave.  The points of each wave are sent to a pool of
+    nworkers processes, each of which builds the paths and path stacks
+    once.  With refit=False, all points are sent to the pool at once.
+    mp_context sets the multiprocessing context for the pool [None].
+    """
+    for name in (xname, yname):
+        if name not in result.var_names:
+            raise ValueError("'%s' is not a variable of this fit" % name)
+    state = _refit_state(result)
+    names = state['names']
+    c2_scale = result.chi_square / result.fit_details.chisqr
+    best = np.array([result.params[name].value for name in names])
+    waves = chi2_map_waves(xpts, ypts, result.params[xname].value,
+                           result.params[yname].value)
+    if not refit:
+        waves = [[pt for wave in waves for pt in wave]]
+
+    def make_args(wave):
+        return [(iy*len(xpts)+ix, xname, xpts[ix], yname, ypts[iy],
+                 solved.get((sx, sy), best), refit)
+                for ix, iy, sx, sy in wave]
+
+    def output(out):
+        index, values, chisqr, nfev = out
+        iy, ix = divmod(index, len(xpts))
+        solved[(ix, iy)] = values
+        return (ix, iy, chisqr*c2_scale, dict(zip(names, values)))
+
+    solved = {}
+    if nworkers > 1:
+        pool = ProcessPoolExecutor(max_workers=nworkers, mp_context=mp_context,
+                                   initializer=_init_refit_worker,
+                                   initargs=(state,))
+        with pool:
+            for wave in waves:
+                chunks = np.array_split(np.arange(len(wave)),
+                                        min(len(wave), 4*nworkers))
+                args = make_args(wave)
+                futures = [pool.submit(_chi2_map_points, [args[i] for i in c])
+                           for c in chunks]
+                for future in as_completed(futures):
+                    for out in future.result():
+                        yield output(out)
+    else:
+        fitter = _FeffitRefitter(state)
+        for wave in waves:
+            for args in make_args(wave):
+                yield output(fitter.fit_point(*args))
+
+def feffit_chi2_map(result, xname, yname, nx=11, ny=11, sigma=3, xrange=None,
+                    yrange=None, refit=True, nworkers=1, callback=None,
+                    mp_context=None, _larch=None):
+    """generate a chi-square map for two variables of a feffit, refitting
+    the other variables at each point.
+
+    Parameters:
+    ------------
+      result:    Feffit result, output group from feffit()
+      xname:     name of variable for x-axis
+      yname:     name of variable for y-axis
+      nx, ny:    number of steps in x and y [11]
+      sigma:     scale for range of values: value +/- sigma*stderr [3]
+      xrange:    (min, max) range of x values [None, use sigma]
+      yrange:    (min, max) range of y values [None, use sigma]
+      refit:     whether to refit the other variables at each point [True].
+                 With False, only the residual is evaluated, which is much
+                 faster, for scanning the chi-square landscape.
+      nworkers:  number of worker processes [1]
+      callback:  function called as callback(ix, iy, chi_square, map) as
+                 each point is done, for progressive display [None]
+      mp_context: multiprocessing context for the worker processes
+                 [None, the default context]
+
+    Returns:
+    ---------
+      xpts, ypts, map, with map of shape (ny, nx) holding chi-square,
+      scaled as for result.chi_square.
+
+    See iter_feffit_chi2_map() for the order in which points are done.
+    """
+    x, y = result.params[xname], result.params[yname]
+    xpts, ypts = chi2_map_points(x, y, nx=nx, ny=ny, sigma=sigma,
+                                 xrange=xrange, yrange=yrange)
+    chi2 = np.nan*np.zeros((ny, nx))
+    for ix, iy, chi_square, values in iter_feffit_chi2_map(result, xname, yname,
+                                                           xpts, ypts, refit=refit,
+                                                           nworkers=nworkers,
+                                                           mp_context=mp_context):
+        chi2[iy, ix] = chi_square
+        if callback is not None:
+            callback(ix, iy, chi_square, chi2)
+    return xpts, ypts, chi2
+
+
 def feffit_report(result, min_correl=0.1, with_paths=True, _larch=None):
     """return a printable report of fit for feffit
 
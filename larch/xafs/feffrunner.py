@@ -2,15 +2,19 @@ import sys
 import os
 from os.path import realpath, isdir, isfile, join, basename, dirname, abspath
 import glob
-from shutil import copy, move
+from shutil import copy, move, rmtree
 import subprocess
+import tempfile
 import time
 import re
 from optparse import OptionParser
 from subprocess import Popen, PIPE
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from larch import Group, isNamedClass
 from larch.utils import isotime, bytes2str, uname, bindir
+from larch.utils.strutils import b32hash
+from larch.site_config import user_larchdir
 
 def find_exe(exename):
     if uname == 'win' and not exename.endswith('.exe'):
@@ -218,6 +222,219 @@ class FeffRunner(Group):
         os.chdir(here)
         return None
 
+
+FEFFJOB_LOG = 'feffrun.log'
+FEFFJOB_DONE = '.feffjob_done'
+
+def normalize_feffinp(text):
+    """normalized text of a feff.inp file, with comment lines, blank lines
+    and repeated white space removed"""
+    out = []
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) < 1 or line.startswith(('*', '#', '!', '%')):
+            continue
+        out.append(' '.join(line.split()))
+    return '\n'.join(out)
+
+def feffinp_hash(text, exe='feff6l'):
+    """hash key for a feff.inp text and the Feff version used to run it"""
+    return b32hash('%s\n%s' % (exe, normalize_feffinp(text)))[:26].lower()
+
+class FeffJob(Group):
+    """
+    A single Feff calculation in a FeffJobQueue
+
+    Attributes:
+        name     -- name of job
+        feffinp  -- text of feff.inp
+        hashkey  -- hash of normalized feff.inp and executable
+        status   -- 'queued', 'running', 'done', 'cached', or 'failed'
+        folder   -- folder with Feff results (or working folder if failed)
+        log      -- log file with Feff output
+        error    -- error message for failed jobs
+        elapsed  -- run time in seconds
+    """
+    def __init__(self, feffinp, name=None, exe='feff6l', **kws):
+        kwargs = dict(name='Feff job')
+        kwargs.update(kws)
+        Group.__init__(self, **kwargs)
+        self.feffinp = feffinp
+        self.hashkey = feffinp_hash(feffinp, exe=exe)
+        self.name = self.hashkey[:10] if name is None else name
+        self.status = 'queued'
+        self.folder = None
+        self.log = None
+        self.error = None
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return '<Feff Job %s: %s>' % (self.name, self.status)
+
+class FeffJobQueue(object):
+    """
+    run many Feff calculations concurrently, each in its own temporary
+    folder, caching results by the hash of the normalized feff.inp
+
+        queue = FeffJobQueue(exe='feff6l', nworkers=4)
+        for name, text in inputs:
+            queue.add(text, name=name)
+        for job in queue.iter_run():
+            print(job.name, job.status, job.folder)
+
+    Arguments:
+        exe          -- 'feff6l' or 'feff8l' ['feff6l']
+        nworkers     -- maximum number of Feff processes at a time [os.cpu_count()]
+        cache_folder -- folder for results [~/.larch/feff_results]
+        workdir      -- folder for temporary working folders [None, system default]
+        verbose      -- write progress messages if True [False]
+        message_writer -- callable for progress messages [None, sys.stdout.write]
+        line_writer  -- callable(job, line) for each line of Feff output [None]
+        _larch       -- larch interpreter, for the '_xafs._feff_executable'
+                        symbol, used when an executable is not found [None]
+
+    Results for a job are in a folder named by its hashkey in cache_folder.
+    Jobs with a complete result folder are not run again, unless run with
+    force=True.  Working folders for failed jobs are kept for inspection.
+    """
+    def __init__(self, exe='feff6l', nworkers=None, cache_folder=None,
+                 workdir=None, verbose=False, message_writer=None,
+                 line_writer=None, _larch=None):
+        if exe not in ('feff6l', 'feff8l'):
+            raise ValueError("exe must be 'feff6l' or 'feff8l'")
+        if nworkers is None:
+            nworkers = os.cpu_count() or 1
+        if cache_folder is None:
+            cache_folder = join(user_larchdir, 'feff_results')
+        self.exe = exe
+        self.nworkers = max(1, nworkers)
+        self.cache_folder = abspath(cache_folder)
+        self.workdir = workdir
+        self.verbose = verbose
+        self.message_writer = message_writer
+        self.line_writer = line_writer
+        self._larch = _larch
+        self.jobs = []
+
+    def __repr__(self):
+        return '<FeffJobQueue: %d jobs>' % len(self.jobs)
+
+    def add(self, feffinp, name=None):
+        """add a job, given the text of a feff.inp, the name of a feff.inp
+        file, or a folder containing feff.inp.  Returns the FeffJob"""
+        if '\n' not in feffinp and isdir(feffinp):
+            feffinp = join(feffinp, 'feff.inp')
+        if '\n' not in feffinp and isfile(feffinp):
+            if name is None:
+                name = feffinp
+            with open(feffinp, 'r') as fh:
+                feffinp = fh.read()
+        job = FeffJob(feffinp, name=name, exe=self.exe)
+        self.jobs.append(job)
+        return job
+
+    def programs(self):
+        """list of Feff executables to run for each job"""
+        if self.exe == 'feff8l':
+            names = ['feff8l_%s' % m for m in FeffRunner.Feff8l_modules]
+        else:
+            names = [self.exe]
+        programs = []
+        for name in names:
+            program = find_exe(name)
+            if program is None:
+                try:
+                    program = self._larch.symtable.get_symbol('_xafs._feff_executable')
+                except (NameError, AttributeError) as exc:
+                    program = None
+            if program is not None and not os.access(program, os.X_OK):
+                program = None
+            if program is None:
+                raise Exception("'%s' executable cannot be found" % name)
+            programs.append(program)
+        return programs
+
+    def _write(self, msg):
+        if callable(self.message_writer):
+            self.message_writer(msg)
+        else:
+            sys.stdout.write(msg)
+
+    def _run_job(self, job, programs, force=False):
+        t0 = time.time()
+        result = join(self.cache_folder, job.hashkey)
+        if not force and isfile(join(result, FEFFJOB_DONE)):
+            job.status, job.folder = 'cached', result
+            job.log = join(result, FEFFJOB_LOG)
+            return job
+
+        job.status = 'running'
+        tmpdir = tempfile.mkdtemp(prefix='feff_%s_' % job.hashkey[:8],
+                                  dir=self.workdir)
+        job.folder = tmpdir
+        job.log = join(tmpdir, FEFFJOB_LOG)
+        with open(join(tmpdir, 'feff.inp'), 'w') as fh:
+            fh.write(job.feffinp)
+        with open(job.log, 'w') as log:
+            log.write("#= Feff job %s %s\n" % (job.name, isotime()))
+            for program in programs:
+                log.write("#= running %s\n" % basename(program))
+                try:
+                    proc = Popen([program], cwd=tmpdir, stdout=PIPE,
+                                 stderr=subprocess.STDOUT)
+                except OSError as exc:
+                    job.error = '%s: %s' % (basename(program), exc)
+                    break
+                for line in proc.stdout:
+                    line = bytes2str(line)
+                    log.write(line)
+                    if callable(self.line_writer):
+                        self.line_writer(job, line)
+                proc.wait()
+                if proc.returncode != 0:
+                    job.error = '%s exited with code %d' % (basename(program),
+                                                            proc.returncode)
+                    break
+            log.write("#= Feff job done %s\n" % isotime())
+        job.elapsed = time.time() - t0
+        if job.error is not None:
+            job.status = 'failed'
+            return job
+
+        with open(join(tmpdir, FEFFJOB_DONE), 'w') as fh:
+            fh.write('%s %s\n' % (job.name, isotime()))
+        os.makedirs(self.cache_folder, exist_ok=True)
+        if force and isdir(result):
+            rmtree(result, ignore_errors=True)
+        try:
+            os.rename(tmpdir, result)
+        except OSError:   # finished by another job with the same input
+            rmtree(tmpdir, ignore_errors=True)
+        job.status, job.folder = 'done', result
+        job.log = join(result, FEFFJOB_LOG)
+        return job
+
+    def iter_run(self, force=False):
+        """run all queued jobs, yielding each FeffJob as it finishes"""
+        jobs = [job for job in self.jobs if job.status == 'queued']
+        programs = self.programs()
+        njobs = len(jobs)
+        with ThreadPoolExecutor(max_workers=self.nworkers) as pool:
+            futures = [pool.submit(self._run_job, job, programs, force)
+                       for job in jobs]
+            for ndone, future in enumerate(as_completed(futures)):
+                job = future.result()
+                if self.verbose:
+                    self._write("[%d/%d] %s: %s (%.1f s)\n" % (ndone+1, njobs,
+                                            job.name, job.status, job.elapsed))
+                yield job
+
+    def run(self, force=False):
+        """run all queued jobs, returning list of FeffJobs in the order added"""
+        for job in self.iter_run(force=force):
+            pass
+        return self.jobs
+
 ######################################################################
 def feffrunner(folder=None, feffinp=None, verbose=True, _larch=None, **kws):
     """
@@ -314,6 +531,34 @@ def feff8l(feffinp='feff.inp', folder='.', module=None, verbose=True, _larch=Non
     return feffrunner
 
 
+def feff_jobs(feffinps, exe='feff6l', nworkers=None, cache_folder=None,
+              force=False, verbose=True, _larch=None):
+    """
+    run many Feff calculations concurrently, reusing cached results
+
+    Arguments:
+    ----------
+      feffinps (list): texts of feff.inp files, names of feff.inp files,
+                       or folders containing feff.inp files
+      exe (str): 'feff6l' or 'feff8l' ['feff6l']
+      nworkers (int or None): maximum number of concurrent jobs [None -- all CPUs]
+      cache_folder (str or None): folder for results [None -- ~/.larch/feff_results]
+      force (bool): whether to rerun jobs with cached results [False]
+      verbose (bool): whether to print progress messages [True]
+
+    Returns:
+    --------
+      list of FeffJob, with status, result folder and log file for each job
+    """
+    writer = None
+    if _larch is not None:
+        writer = _larch.writer.write
+    queue = FeffJobQueue(exe=exe, nworkers=nworkers, cache_folder=cache_folder,
+                         verbose=verbose, message_writer=writer, _larch=_larch)
+    for feffinp in feffinps:
+        queue.add(feffinp)
+    return queue.run(force=force)
+
 def feff8l_cli():
     """run feff8l as  a command line program to run all or some of
      feff8l_rdinp
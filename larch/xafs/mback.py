@@ -2,28 +2,77 @@
 """
   XAFS MBACK normalization algorithms.
 """
+import time
+import hashlib
 import numpy as np
 from scipy.special import erfc
 
 from xraydb import (xray_edge, xray_line, xray_lines,
-                    f1_chantler, f2_chantler, guess_edge,
+                    f1_chantler, f2_chantler, mu_elam, guess_edge,
                     atomic_number, atomic_symbol)
 from lmfit import Parameter, Parameters, minimize
 
 from larch import Group, isgroup, parse_group_args
 
 from larch.math import index_of, index_nearest, remove_dups, remove_nans2
+from larch.utils.lrucache import LRUCache
 
 from .xafsutils import set_xafsGroup
-from .pre_edge import find_e0, preedge
+from .pre_edge import find_e0, preedge, pre_edge_batch, _pre_edge_chunk
 
 
 MAXORDER = 6
 
+# tabulated f1, f2, and mu curves, and edge and line energies, keyed by
+# (table, atomic number, edge or energy-grid fingerprint)
+_xraydb_cache = LRUCache(maxsize=256, maxbytes=64*2**20)
+XRAYDB_TABLES = {'f1': f1_chantler, 'f2': f2_chantler, 'mu': mu_elam}
+
+def energy_fingerprint(energy):
+    """hashable fingerprint for an energy array"""
+    energy = np.ascontiguousarray(energy, dtype='float64')
+    return (len(energy), hashlib.blake2b(energy.tobytes(),
+                                         digest_size=16).hexdigest())
+
+def xray_table(z, energy, table='f2'):
+    """cached, tabulated f1 or f2 (Chantler) or mu (Elam) for an element
+    on an energy array.  The returned array is shared and read-only."""
+    z = atomic_number(z) if isinstance(z, str) else int(z)
+    key = (table, z, energy_fingerprint(energy))
+    out = _xraydb_cache.get(key)
+    if out is None:
+        out = np.asarray(XRAYDB_TABLES[table](z, energy), dtype='float64')
+        out.flags.writeable = False
+        _xraydb_cache.put(key, out)
+    return out
+
+def _edge_energy(z, edge):
+    """cached x-ray edge energy"""
+    key = ('edge', z, edge.upper())
+    out = _xraydb_cache.get(key)
+    if out is None:
+        out = _xraydb_cache.put(key, xray_edge(z, edge).energy)
+    return out
+
+def xraydb_cache_stats():
+    """return dict of statistics for cached f1 / f2 / mu tables"""
+    return _xraydb_cache.stats()
+
+def clear_xraydb_cache():
+    """clear cached f1 / f2 / mu tables"""
+    _xraydb_cache.clear()
+
 def find_xray_line(z, edge):
     """
     Finds most intense X-ray emission line energy for a given element and edge.
     """
+    key = ('line', z, edge.upper())
+    out = _xraydb_cache.get(key)
+    if out is None:
+        out = _xraydb_cache.put(key, _find_xray_line(z, edge))
+    return out
+
+def _find_xray_line(z, edge):
     intensity = 0
     line      = ''
     for key, value in xray_lines(z).items() :
@@ -157,11 +206,10 @@ def mback(energy, mu=None, group=None, z=None, edge='K', e0=None, pre1=None, pre
     weight[n1:(n2+1)] = np.sqrt(np.sum(weight[n1:(n2+1)]))
 
     ## get the f'' function from CL or Chantler
-    f1 = f1_chantler(z, energy)
-    f2 = f2_chantler(z, energy)
-    group.f2 = f2
+    f2 = xray_table(z, energy, 'f2')
+    group.f2 = f2*1.0
     if return_f1:
-        group.f1 = f1
+        group.f1 = xray_table(z, energy, 'f1')*1.0
 
     em = find_xray_line(z, edge).energy # erfc centroid
 
@@ -204,6 +252,14 @@ def mback(energy, mu=None, group=None, z=None, edge='K', e0=None, pre1=None, pre
 
 
 
+def _avoid_next_edge(z, edge, e0, norm2):
+    """limit norm2 to avoid L2 and higher edges"""
+    if edge.lower() == 'l3':
+        norm2 = np.minimum(norm2, _edge_energy(z, 'L2')-e0)
+    elif edge.lower() == 'l2':
+        norm2 = np.minimum(norm2, _edge_energy(z, 'L1')-e0)
+    return norm2
+
 def f2norm(params, en=1, mu=1, f2=1, weights=1):
 
     """
@@ -257,8 +313,6 @@ def mback_norm(energy, mu=None, group=None, z=None, edge='K', e0=None,
         group = set_xafsGroup(group, _larch=_larch)
     group.norm_poly = group.norm*1.0
 
-    if z is not None:              # need to run find_e0:
-        e0_nominal = xray_edge(z, edge).energy
     if e0 is None:
         e0 = getattr(group, 'e0', None)
         if e0 is None:
@@ -277,7 +331,7 @@ def mback_norm(energy, mu=None, group=None, z=None, edge='K', e0=None,
                 norm1=norm1, norm2=norm2, e0=e0, nnorm=nnorm)
 
     mu_pre = mu - group.pre_edge
-    f2 = f2_chantler(z, energy)
+    f2 = xray_table(z, energy, 'f2')
 
     weights = np.ones(len(energy))*1.0
 
@@ -287,14 +341,7 @@ def mback_norm(energy, mu=None, group=None, z=None, edge='K', e0=None,
     if norm2 < 0:
         norm2 = max(energy) - e0  - norm2
 
-    # avoid l2 and higher edges
-    if edge.lower().startswith('l'):
-        if edge.lower() == 'l3':
-            e_l2 = xray_edge(z, 'L2').energy
-            norm2 = min(norm2,  e_l2-e0)
-        elif edge.lower() == 'l2':
-            e_l2 = xray_edge(z, 'L1').energy
-            norm2 = min(norm2,  e_l1-e0)
+    norm2 = _avoid_next_edge(z, edge, e0, norm2)
 
     ipre2 = index_of(energy, e0+pre2)
     inor1 = index_of(energy, e0+norm1)
@@ -331,7 +378,7 @@ def mback_norm(energy, mu=None, group=None, z=None, edge='K', e0=None,
 
     group.mback_params = Group(e0=e0, pre1=pre1, pre2=pre2, norm1=norm1,
                                norm2=norm2, nnorm=nnorm, fit_params=p,
-                               fit_weights=weights, model=model, f2=f2,
+                               fit_weights=weights, model=model, f2=f2*1.0,
                                pre_f2=pre_f2, atsym=atsym, edge=edge)
 
     if (abs(step_new - group.edge_step)/(1.e-13+group.edge_step)) > 0.75:
@@ -339,3 +386,132 @@ def mback_norm(energy, mu=None, group=None, z=None, edge='K', e0=None,
     else:
         group.edge_step = step_new
         group.norm       = group.norm_mback
+
+
+def mback_norm_batch(energy, mu=None, group=None, z=None, edge='K', e0=None,
+                     pre1=None, pre2=None, norm1=None, norm2=None, nnorm=None,
+                     nvict=1, _larch=None):
+    """MBACK normalization, as for mback_norm(), for many spectra measured
+    on the same energy array, such as from a time-resolved experiment.
+
+    Arguments
+    ----------
+    energy:  array of x-ray energies, in eV, or group
+    mu:      2-d array of mu(E), with one spectrum per row
+    group:   output group, which may hold the results of pre_edge_batch()
+    e0:      edge energy, in eV: a single value, an array with one value
+             per spectrum, or None to use group.e0 or determine e0.
+
+    All other arguments are as for mback_norm(), and are used for all
+    spectra.  If pre2, norm1, or norm2 are None, the values from
+    group.pre_edge_details are used.
+
+    Returns
+    -------
+      None: outputs are written to the output group, as for mback_norm(),
+      as arrays with one value or row per spectrum.  mback_params will
+      also have
+        failed            boolean array, True where the mback edge step failed
+        nspectra          number of spectra
+        elapsed_time      time for processing, in seconds
+        spectra_per_sec   throughput, in spectra per second
+
+    Notes
+    -----
+      1. The tabulated f2 is looked up once for all spectra.
+      2. The model (offset + slope*energy + f2)*scale is linear in
+         (scale, scale*offset, scale*slope), so that all spectra sharing
+         fit ranges are fit at once with weighted linear least-squares,
+         instead of the nonlinear fit of mback_norm(), which gives the
+         same results within the fit tolerance.
+    """
+    t0 = time.time()
+    energy, mu, group = parse_group_args(energy, members=('energy', 'mu'),
+                                         defaults=(mu,), group=group,
+                                         fcn_name='mback_norm_batch')
+    energy = remove_dups(energy.squeeze())
+    mu = np.atleast_2d(mu)
+    nspec, npts = mu.shape
+    group = set_xafsGroup(group, _larch=_larch)
+
+    pre_kws = dict(pre1=pre1, pre2=pre2, norm1=norm1, norm2=norm2,
+                   nnorm=nnorm, nvict=nvict)
+    if e0 is None:
+        e0 = getattr(group, 'e0', None)
+    details = getattr(group, 'pre_edge_details', None)
+    if (details is None or getattr(group, 'pre_edge', None) is None or
+        np.shape(group.pre_edge) != mu.shape):
+        pre_edge_batch(energy, mu, group=group, e0=e0, **pre_kws)
+        details = group.pre_edge_details
+    e0 = group.e0*np.ones(nspec)
+    group.norm_poly = group.norm*1.0
+
+    atsym = None
+    if z is None or z < 2:
+        atsym, edge = guess_edge(np.median(e0))
+        z = atomic_number(atsym)
+    if atsym is None:
+        atsym = atomic_symbol(z)
+
+    mu_pre = mu - group.pre_edge
+    f2 = xray_table(z, energy, 'f2')
+
+    pre2 = details.pre2*np.ones(nspec) if pre2 is None else pre2*np.ones(nspec)
+    norm1 = details.norm1*np.ones(nspec) if norm1 is None else norm1*np.ones(nspec)
+    if norm2 is None:
+        norm2 = max(energy) - e0
+    norm2 = norm2*np.ones(nspec)
+    norm2 = np.where(norm2 < 0, max(energy) - e0 - norm2, norm2)
+    norm2 = _avoid_next_edge(z, edge, e0, norm2)
+
+    ipre2 = np.array([index_of(energy, e+p) for e, p in zip(e0, pre2)])
+    inor1 = np.array([index_of(energy, e+n) for e, n in zip(e0, norm1)])
+    inor2 = np.array([index_of(energy, e+n) + 1 for e, n in zip(e0, norm2)])
+
+    # fit all spectra sharing the same weights together
+    weights = np.ones((nspec, npts))
+    coefs = np.zeros((nspec, 3))
+    basis = np.array([f2, np.ones(npts), energy - np.median(e0)]).T
+    irange = np.array([ipre2, inor1, inor2]).T
+    for i1, i2, i3 in np.unique(irange, axis=0):
+        rows = np.where((irange == (i1, i2, i3)).all(axis=1))[0]
+        wts = weights[rows[0]]
+        wts[i1:] = 0.0
+        wts[i2:i3] = np.linspace(0.1, 1.0, i3-i2)
+        weights[rows] = wts
+        coefs[rows] = np.linalg.lstsq(basis*wts[:, np.newaxis],
+                                      (mu_pre[rows]*wts).T, rcond=None)[0].T
+
+    model = coefs @ basis.T
+    scale = coefs[:, 0]
+    slope = coefs[:, 2]/scale
+    offset = coefs[:, 1]/scale - slope*np.median(e0)
+
+    group.mback_mu = model + group.pre_edge
+
+    pre_f2 = _pre_edge_chunk((energy, model, e0, None,
+                              dict(make_flat=False, **pre_kws)))
+    step_new = pre_f2['edge_step']
+
+    group.edge_step_poly  = group.edge_step*1.0
+    group.edge_step_mback = step_new
+    group.norm_mback = mu_pre / step_new[:, np.newaxis]
+
+    failed = abs(step_new - group.edge_step)/(1.e-13+group.edge_step) > 0.75
+    group.mback_params = Group(e0=e0, pre1=pre1, pre2=pre2, norm1=norm1,
+                               norm2=norm2, nnorm=nnorm, fit_weights=weights,
+                               fit_params={'slope': slope, 'offset': offset,
+                                           'scale': scale},
+                               model=model, f2=f2*1.0, pre_f2=pre_f2,
+                               atsym=atsym, edge=edge, failed=failed)
+    if failed.any():
+        print("Warning: mback edge step failed for %d of %d spectra" %
+              (failed.sum(), nspec))
+    ok = ~failed
+    group.edge_step[ok] = step_new[ok]
+    group.norm[ok] = group.norm_mback[ok]
+
+    details = group.mback_params
+    details.nspectra = nspec
+    details.elapsed_time = time.time() - t0
+    details.spectra_per_sec = nspec/max(details.elapsed_time, 1.e-9)
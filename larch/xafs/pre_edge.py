@@ -3,6 +3,7 @@
   XAFS pre-edge subtraction, normalization algorithms
 """
 
+import time
 import numpy as np
 from scipy.signal import find_peaks_cwt
 from scipy.integrate import simps
@@ -25,7 +26,7 @@ from larch import Group, Make_CallArgs, isgroup, parse_group_args
 
 from larch.math import (index_of, index_nearest,
                         remove_dups, remove_nans2)
-from .xafsutils import set_xafsGroup
+from .xafsutils import set_xafsGroup, batch_chunks, batch_map
 
 MODNAME = '_xafs'
 MAX_NNORM = 5
@@ -59,34 +60,109 @@ def find_e0(energy, mu=None, group=None, _larch=None):
         group.e0 = e0
     return e0
 
+def find_e0_batch(energy, mu=None, group=None, _larch=None):
+    """calculate :math:`E_0` as for find_e0(), for many spectra at once.
+
+    Arguments:
+        energy (ndarray or group): array of x-ray energies, in eV, or group.
+                                   This can be a 2-d array with the same
+                                   shape as mu, with one energy array per row.
+        mu     (ndarray or None):  2-d array of mu(E), with one spectrum per row
+        group  (group or None):    output group
+
+    Returns:
+        ndarray: e0 for each spectrum. If a group is provided, group.e0
+        will also be set.
+
+    Notes:
+        1. The derivatives and the selection of the point with maximum
+           derivative are done for all spectra together, without a loop
+           over spectra, and give the same results as find_e0().
+        2. Supports :ref:`First Argument Group` convention, requiring group members `energy` and `mu`
+    """
+    energy, mu, group = parse_group_args(energy, members=('energy', 'mu'),
+                                         defaults=(mu,), group=group,
+                                         fcn_name='find_e0_batch')
+    energy = np.asarray(energy)
+    mu = np.atleast_2d(mu)
+    ie0 = _finde0_index(energy, mu)
+    if energy.ndim > 1:
+        e0 = energy[np.arange(len(ie0)), ie0]
+    else:
+        e0 = energy[ie0]
+    if group is not None:
+        group = set_xafsGroup(group, _larch=_larch)
+        group.e0 = e0
+    return e0
+
+def _finde0_index(energy, mu):
+    """index of e0 for each row of a 2-d array of mu(E), as the point
+    of maximum derivative that has high-derivative neighbors, away
+    from the ends of the data.  energy can be 1-d, or 2-d with the
+    same shape as mu"""
+    npts = mu.shape[-1]
+    dmu = np.gradient(mu, axis=-1)/np.gradient(energy, axis=-1)
+    # find points of high derivative
+    dmu[np.where(~np.isfinite(dmu))] = -1.0
+    nmin = max(3, int(npts*0.05))
+    maxdmu = dmu[:, nmin:-nmin].max(axis=1)
+    high = dmu > 0.1*maxdmu[:, np.newaxis]
+
+    # candidates need high derivative neighbors on both sides, and
+    # to be away from the ends of the data
+    cand = np.zeros(dmu.shape, dtype=bool)
+    cand[:, 1:-1] = high[:, :-2] & high[:, 1:-1] & high[:, 2:]
+    cand[:, :nmin] = False
+    cand[:, npts-nmin+1:] = False
+    score = np.where(cand & (dmu > 0), dmu, -np.inf)
+    ie0 = score.argmax(axis=1)
+    ie0[~np.isfinite(score[np.arange(len(ie0)), ie0])] = 0
+    return ie0
+
 def _finde0(energy, mu):
     if len(energy.shape) > 1:
         energy = energy.squeeze()
     if len(mu.shape) > 1:
         mu = mu.squeeze()
+    return energy[_finde0_index(energy, mu[np.newaxis, :])[0]]
 
-    dmu = np.gradient(mu)/np.gradient(energy)
-    # find points of high derivative
-    dmu[np.where(~np.isfinite(dmu))] = -1.0
-    nmin = max(3, int(len(dmu)*0.05))
-    maxdmu = max(dmu[nmin:-nmin])
+def flat_resid(pars, en, mu):
+    return (pars['c0'] + en * (pars['c1'] + en * pars['c2']) - mu)
 
-    high_deriv_pts = np.where(dmu >  maxdmu*0.1)[0]
-    idmu_max, dmu_max = 0, 0
 
-    for i in high_deriv_pts:
-        if i < nmin or i > len(energy) - nmin:
-            continue
-        if (dmu[i] > dmu_max and
-            (i+1 in high_deriv_pts) and
-            (i-1 in high_deriv_pts)):
-            idmu_max, dmu_max = i, dmu[i]
+def _preedge_ranges(energy, e0, ie0, nnorm=None, pre1=None, pre2=None,
+                    norm1=None, norm2=None):
+    """fill in default pre-edge and normalization ranges and nnorm,
+    returning (pre1, pre2, norm1, norm2, nnorm)"""
+    if pre1 is None:
+        # skip first energy point, often bad
+        if ie0 > 20:
+            pre1  = 5.0*round((energy[1] - e0)/5.0)
+        else:
+            pre1  = 2.0*round((energy[1] - e0)/2.0)
 
-    return energy[idmu_max]
+    pre1 = max(pre1,  (min(energy) - e0))
+    if pre2 is None:
+        pre2 = 5.0*round(pre1/15.0)
+    if pre1 > pre2:
+        pre1, pre2 = pre2, pre1
 
-def flat_resid(pars, en, mu):
-    return (pars['c0'] + en * (pars['c1'] + en * pars['c2']) - mu)
+    if norm2 is None:
+        norm2 = 5.0*round((max(energy) - e0)/5.0)
+    if norm2 < 0:
+        norm2 = max(energy) - e0 - norm2
+    norm2 = min(norm2, (max(energy) - e0))
+    if norm1 is None:
+        norm1 = min(150, 5.0*round(norm2/15.0))
+    if norm1 > norm2:
+        norm1, norm2 = norm2, norm1
+    if nnorm is None:
+        nnorm = 2
+        if norm2-norm1 < 350: nnorm = 1
+        if norm2-norm1 <  50: nnorm = 0
+    nnorm = max(min(nnorm, MAX_NNORM), 0)
 
+    return pre1, pre2, norm1, norm2, nnorm
 
 def preedge(energy, mu, e0=None, step=None, nnorm=None, nvict=0, pre1=None,
             pre2=None, norm1=None, norm2=None):
@@ -142,34 +218,10 @@ def preedge(energy, mu, e0=None, step=None, nnorm=None, nvict=0, pre1=None,
     ie0 = index_nearest(energy, e0)
     e0 = energy[ie0]
 
-    if pre1 is None:
-        # skip first energy point, often bad
-        if ie0 > 20:
-            pre1  = 5.0*round((energy[1] - e0)/5.0)
-        else:
-            pre1  = 2.0*round((energy[1] - e0)/2.0)
-
-    pre1 = max(pre1,  (min(energy) - e0))
-    if pre2 is None:
-        pre2 = 5.0*round(pre1/15.0)
-    if pre1 > pre2:
-        pre1, pre2 = pre2, pre1
-
-    if norm2 is None:
-        norm2 = 5.0*round((max(energy) - e0)/5.0)
-    if norm2 < 0:
-        norm2 = max(energy) - e0 - norm2
-    norm2 = min(norm2, (max(energy) - e0))
-    if norm1 is None:
-        norm1 = min(150, 5.0*round(norm2/15.0))
-    if norm1 > norm2:
-        norm1, norm2 = norm2, norm1
-    if nnorm is None:
-        nnorm = 2
-        if norm2-norm1 < 350: nnorm = 1
-        if norm2-norm1 <  50: nnorm = 0
-    nnorm = max(min(nnorm, MAX_NNORM), 0)
-
+    pre1, pre2, norm1, norm2, nnorm = _preedge_ranges(energy, e0, ie0,
+                                                      nnorm=nnorm,
+                                                      pre1=pre1, pre2=pre2,
+                                                      norm1=norm1, norm2=norm2)
     # preedge
     p1 = index_of(energy, pre1+e0)
     p2 = index_nearest(energy, pre2+e0)
@@ -352,6 +404,186 @@ def pre_edge(energy, mu=None, group=None, e0=None, step=None, nnorm=None,
     return
 
 
+def _preedge_stack(energy, mu, e0, step=None, nnorm=None, nvict=0,
+                   pre1=None, pre2=None, norm1=None, norm2=None,
+                   make_flat=True):
+    """pre-edge subtraction and normalization as for preedge() and
+    pre_edge(), for a 2-d array of mu(E), one spectrum per row, all on
+    the same energy array and with the same e0.  The fit ranges and
+    polynomial fits are shared, with all spectra fit together.
+    step can be None, a single value, or an array of values per spectrum.
+
+    Returns a dictionary with 1-d arrays for single values and 2-d arrays
+    for the arrays from preedge(), with one row per spectrum.
+    """
+    nrows = mu.shape[0]
+    ie0 = index_nearest(energy, e0)
+    e0 = energy[ie0]
+    pre1, pre2, norm1, norm2, nnorm = _preedge_ranges(energy, e0, ie0,
+                                                      nnorm=nnorm,
+                                                      pre1=pre1, pre2=pre2,
+                                                      norm1=norm1, norm2=norm2)
+    # preedge
+    p1 = index_of(energy, pre1+e0)
+    p2 = index_nearest(energy, pre2+e0)
+    if p2-p1 < 2:
+        p2 = min(len(energy), p1 + 2)
+
+    omu  = mu*energy**nvict
+    precoefs = np.polyfit(energy[p1:p2], omu[:, p1:p2].T, 1)
+    pre_edge = (np.outer(precoefs[0], energy) +
+                precoefs[1][:, np.newaxis]) * energy**(-nvict)
+
+    # normalization
+    p1 = index_of(energy, norm1+e0)
+    p2 = index_nearest(energy, norm2+e0)
+    if p2-p1 < 2:
+        p2 = min(len(energy), p1 + 2)
+
+    presub = (mu-pre_edge)[:, p1:p2]
+    norm_coefs = np.polyfit(energy[p1:p2], presub.T, nnorm)[::-1]
+    post_edge = pre_edge + norm_coefs.T @ np.array([energy**n for n in range(nnorm+1)])
+
+    edge_step = step
+    if edge_step is None:
+        edge_step = post_edge[:, ie0] - pre_edge[:, ie0]
+    edge_step = abs(edge_step*np.ones(nrows))
+    norm = (mu - pre_edge)/edge_step[:, np.newaxis]
+
+    # generate flattened spectra, by fitting a quadratic to .norm
+    # and removing that.
+    flat = norm
+    if make_flat and p2-p1 > 4:
+        ncoefs = min(nnorm, 2) + 1
+        fcoefs = np.polyfit(energy[p1:p2], norm[:, p1:p2].T, ncoefs-1)
+        flat_diff = fcoefs.T @ np.array([energy**n for n in range(ncoefs-1, -1, -1)])
+        flat = norm - (flat_diff - flat_diff[:, ie0:ie0+1])
+        flat[:, :ie0] = norm[:, :ie0]
+
+    ones = np.ones(nrows)
+    return {'e0': e0*ones, 'edge_step': edge_step, 'norm': norm,
+            'flat': flat, 'pre_edge': pre_edge, 'post_edge': post_edge,
+            'norm_coefs': norm_coefs, 'nvict': nvict*ones,
+            'nnorm': nnorm*ones, 'norm1': norm1*ones, 'norm2': norm2*ones,
+            'pre1': pre1*ones, 'pre2': pre2*ones, 'precoefs': precoefs}
+
+def _pre_edge_chunk(args):
+    """pre_edge_batch() worker: find e0 as needed for a chunk of spectra,
+    and run _preedge_stack() for each set of spectra with the same e0"""
+    energy, mu, e0, step, kws = args
+    nrows, npts = mu.shape
+    e0 = np.array(e0, dtype='float64')
+    rows = np.where(~np.isfinite(e0) | (e0 < energy[1]) | (e0 > energy[-2]))[0]
+    if len(rows) > 0:
+        e0[rows] = energy[_finde0_index(energy, mu[rows])]
+    ie0 = np.array([index_nearest(energy, e) for e in e0])
+
+    out = {}
+    for iedge in np.unique(ie0):
+        rows = np.where(ie0 == iedge)[0]
+        _step = None if step is None else step[rows]
+        dat = _preedge_stack(energy, mu[rows], energy[iedge], step=_step, **kws)
+        for key, val in dat.items():
+            if key == 'norm_coefs':
+                val = np.concatenate((val, np.zeros((MAX_NNORM+1-len(val), len(rows)))))
+            if key in ('norm_coefs', 'precoefs'):
+                val = val.T
+            if key not in out:
+                out[key] = np.zeros((nrows,) + val.shape[1:], dtype=val.dtype)
+            out[key][rows] = val
+    return out
+
+@Make_CallArgs(["energy","mu"])
+def pre_edge_batch(energy, mu=None, group=None, e0=None, step=None, nnorm=None,
+                   nvict=0, pre1=None, pre2=None, norm1=None, norm2=None,
+                   make_flat=True, nworkers=1, _larch=None):
+    """pre edge subtraction and normalization, as for pre_edge(), for
+    many spectra measured on the same energy array, such as from a
+    time-resolved experiment.
+
+    Arguments
+    ----------
+    energy:  array of x-ray energies, in eV, or group (see note 1)
+    mu:      2-d array of mu(E), with one spectrum per row
+    group:   output group
+    e0:      edge energy, in eV: a single value, an array with one value
+             per spectrum, or None to determine e0 for each spectrum.
+    step:    edge jump: a single value, an array of values, or None to
+             determine the edge jump for each spectrum.
+    nworkers: number of processes to use [1]
+
+    All other arguments are as for pre_edge(), and are used for all spectra.
+
+    Returns
+    -------
+      None: outputs are written to the output group, as for pre_edge(),
+      as arrays with one value or row per spectrum.  In addition,
+      pre_edge_details will have
+        nspectra          number of spectra
+        nworkers          number of processes used
+        elapsed_time      time for processing, in seconds
+        spectra_per_sec   throughput, in spectra per second
+
+    Notes
+    -----
+      1. Supports `First Argument Group` convention, requiring group members `energy` and `mu`.
+      2. Spectra with the same e0 value (after moving e0 to the nearest
+         energy point) share the fit ranges, and are fit all at once.
+      3. The flattened spectra use a linear least-squares polynomial fit,
+         rather than the nonlinear fit of pre_edge(), which gives the
+         same results within the fit tolerance.
+    """
+    t0 = time.time()
+    energy, mu, group = parse_group_args(energy, members=('energy', 'mu'),
+                                         defaults=(mu,), group=group,
+                                         fcn_name='pre_edge_batch')
+    energy = remove_dups(energy.squeeze())
+    mu = np.atleast_2d(mu)
+    nspec = mu.shape[0]
+    e0 = np.nan*np.ones(nspec) if e0 is None else e0*np.ones(nspec)
+    if step is not None:
+        step = step*np.ones(nspec)
+
+    kws = dict(nnorm=nnorm, nvict=nvict, pre1=pre1, pre2=pre2,
+               norm1=norm1, norm2=norm2, make_flat=make_flat)
+    chunks = batch_chunks(nspec, nworkers)
+    args = [(energy, mu[c], e0[c], None if step is None else step[c], kws)
+            for c in chunks]
+    outs = batch_map(_pre_edge_chunk, args, nworkers=nworkers)
+    dat = {key: np.concatenate([o[key] for o in outs]) for key in outs[0]}
+
+    group = set_xafsGroup(group, _larch=_larch)
+    group.e0 = dat['e0']
+    group.norm = dat['norm']
+    group.norm_poly = 1.0*dat['norm']
+    group.flat = dat['flat']
+    group.dmude = np.gradient(mu, axis=1)/np.gradient(energy)
+    group.d2mude = np.gradient(group.dmude, axis=1)/np.gradient(energy)
+    group.edge_step  = dat['edge_step']
+    group.edge_step_poly = dat['edge_step']
+    group.pre_edge   = dat['pre_edge']
+    group.post_edge  = dat['post_edge']
+
+    details = group.pre_edge_details = Group()
+    for attr in ('pre1', 'pre2', 'norm1', 'norm2', 'nnorm', 'nvict'):
+        setattr(details, attr, dat[attr])
+    details.pre_slope  = dat['precoefs'][:, 0]
+    details.pre_offset = dat['precoefs'][:, 1]
+    for i in range(int(dat['nnorm'].max())+1):
+        setattr(details, 'norm_c%i' % i, dat['norm_coefs'][:, i])
+
+    if getattr(group, 'atsym', None) is None or getattr(group, 'edge', None) is None:
+        _atsym, _edge = guess_edge(np.median(group.e0))
+        group.atsym = getattr(group, 'atsym', None) or _atsym
+        group.edge = getattr(group, 'edge', None) or _edge
+
+    details.nspectra = nspec
+    details.nworkers = nworkers
+    details.elapsed_time = time.time() - t0
+    details.spectra_per_sec = nspec/max(details.elapsed_time, 1.e-9)
+    return
+
+
 @Make_CallArgs(["energy", "norm"])
 def prepeaks_setup(energy, norm=None, group=None, emin=None, emax=None,
                    elo=None, ehi=None, _larch=None):
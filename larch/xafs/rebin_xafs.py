@@ -1,7 +1,7 @@
 import numpy as np
 
 from larch import Group, Make_CallArgs, parse_group_args
-from larch.math import index_of, interp1d, remove_dups
+from larch.math import remove_dups
 from .xafsutils import ktoe, etok
 
 @Make_CallArgs(["energy", "mu"])
@@ -45,6 +45,79 @@ def sort_xafs(energy, mu=None, group=None, fix_repeats=True, overwrite=True):
     return
 
 
+def rebin_segments(energy, mu, en, method='centroid'):
+    """rebin mu(energy) onto new energy values, as for rebin_xafs()
+
+    Arguments
+    ---------
+    energy       input energy array, increasing
+    mu           input mu array, or 2-d array of mu arrays [nspectra, npts]
+    en           new energy array, increasing
+    method       one of 'boxcar', 'centroid' ['centroid']
+
+    Returns
+    -------
+      mu_out, delta_mu, counts
+
+    Each input energy is assigned to one bin, splitting the input array
+    halfway between the points at or below each new energy, so that all
+    bins are found in one pass with np.searchsorted and np.add.reduceat.
+    Bins with fewer than 3 points use linear interpolation.
+    """
+    npts, nbins = len(energy), len(en)
+    mu2d = np.atleast_2d(mu)
+
+    # index of energy at or below each new energy (as index_of()),
+    # and the segment [j0, j1) of input points for each bin
+    bounds = np.maximum(np.searchsorted(energy, en, side='right') - 1, 0)
+    j1 = (bounds[:-1] + bounds[1:] + 1)//2
+    j1 = np.append(j1, npts-1)
+    j0 = np.append(0, j1[:-1])
+    counts = j1 - j0
+
+    # sums over segments: the last segment stops at npts-1, so the
+    # last point is replaced with 0 to use it as padding.
+    def segment_sums(arr):
+        arr = arr.copy()
+        arr[..., -1] = 0.0
+        out = np.add.reduceat(arr, j0, axis=-1)
+        out[..., counts == 0] = 0.0
+        return out
+
+    ncount = np.maximum(counts, 1)
+    mean = segment_sums(mu2d)/ncount
+    if method.startswith('box'):
+        mu_out = mean
+    else:
+        esums = segment_sums(energy[None, :])
+        esums[:, counts == 0] = 1.0
+        mu_out = segment_sums(mu2d*energy)/esums
+
+    ibin = np.append(np.repeat(np.arange(nbins), counts), nbins-1)
+    err_out = np.sqrt(segment_sums((mu2d - mean[:, ibin])**2)/ncount)
+    err_out[:, counts == 0] = np.nan
+
+    # bins with fewer than 3 points: linear interpolation over
+    # energy[j0:jx], as interp1d, giving NaN outside that range.
+    interp = np.where(counts < 3)[0]
+    if len(interp) > 0:
+        j0i = j0[interp]
+        jx = j1[interp] + 1
+        jx[(jx - j0i) < 2] += 1
+        jx = np.minimum(jx, npts)
+        lo = np.clip(bounds[interp], j0i, jx-2)
+        enew = en[interp]
+        frac = (enew - energy[lo])/(energy[lo+1] - energy[lo])
+        vals = mu2d[:, lo] + frac*(mu2d[:, lo+1] - mu2d[:, lo])
+        outside = (enew < energy[j0i]) | (enew > energy[jx-1])
+        vals[:, outside] = np.nan
+        mu_out[:, interp] = vals
+
+    if mu2d.ndim != np.ndim(mu):
+        mu_out, err_out = mu_out[0], err_out[0]
+    return mu_out, err_out, counts
+
+
 @Make_CallArgs(["energy", "mu"])
 def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
                pre_step=2, xanes_step=None, exafs1=15, exafs2=None,
@@ -53,8 +126,8 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
 
     Arguments
     ---------
-    energy       input energy array
-    mu           input mu array
+    energy       input energy array, increasing
+    mu           input mu array, or 2-d array of mu arrays [nspectra, npts]
     group        output group
     e0           energy reference -- all energy values are relative to this
     pre1         start of pre-edge region [1st energy point]
@@ -72,9 +145,13 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
 
     A group named 'rebinned' will be created in the output group, with the
     following  attributes:
-        energy  new energy array
-        mu      mu for energy array
-        e0      e0 copied from current group
+        energy    new energy array
+        mu        mu for energy array
+        delta_mu  standard deviation of mu within each bin
+        counts    number of input points in each bin
+        e0        e0 copied from current group
+
+    For 2-d mu, mu and delta_mu will be 2-d, with one row per spectrum.
 
     (if the output group is None, _sys.xafsGroup will be written to)
 
@@ -86,7 +163,9 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
      2 If xanes_step is None, it will be found from the data.  If it is
        given, it may be increased to better fit the input energy array.
 
-     3 The EXAFS region will be spaced in k-space
+     3 The EXAFS region will be spaced in k-space.  If pre1 >= pre2, as
+       for data starting less than 30 eV below e0 with the default pre2,
+       there is no pre-edge region, and the XANES region starts at pre1.
 
      4 The rebinned data is found by determining which segments of the
        input energy correspond to each bin in the new energy array. That
@@ -101,6 +180,8 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
     energy, mu, group = parse_group_args(energy, members=('energy', 'mu'),
                                          defaults=(mu,), group=group,
                                         fcn_name='rebin_xafs')
+    energy = np.asarray(energy, dtype=np.float64)
+    mu = np.asarray(mu, dtype=np.float64)
 
     if e0 is None:
         e0 = getattr(group, 'e0', None)
@@ -114,6 +195,9 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
     if exafs2 is None:
         exafs2 = max(energy) - e0
 
+    if pre1 >= pre2:
+        pre2 = pre1
+
     # determine xanes step size:
     #  find mean of energy difference, ignoring first/last 1% of energies
     npts = len(energy)
@@ -138,34 +222,13 @@ def rebin_xafs(energy, mu=None, group=None, e0=None, pre1=None, pre2=-30,
             reg = ktoe(reg)
         en.extend(e0 + reg)
 
-    # find the segment boundaries of the old energy array
-    bounds = [index_of(energy, e) for e in en]
-    mu_out = []
-    err_out = []
-    j0 = 0
-    for i in range(len(en)):
-        if i == len(en) - 1:
-            j1 = len(energy) - 1
-        else:
-            j1 = int((bounds[i] + bounds[i+1] + 1)/2.0)
-        # if not enough points in segment, do interpolation
-        if (j1 - j0) < 3:
-            jx = j1 + 1
-            if (jx - j0) < 2:
-                jx += 1
-            val = interp1d(energy[j0:jx], mu[j0:jx], en[i])
-            err = mu[j0:j1].std()
-        else:
-            if method.startswith('box'):
-                val =  mu[j0:j1].mean()
-            else:
-                val = (mu[j0:j1]*energy[j0:j1]).mean()/energy[j0:j1].mean()
-        mu_out.append(val)
-        err_out.append(mu[j0:j1].std())
-        j0 = j1
+    # keep only strictly increasing energies, for overlapping regions
+    en = np.array(en)
+    if len(en) > 1:
+        en = en[np.append(True, en[1:] > np.maximum.accumulate(en)[:-1])]
+    mu_out, err_out, counts = rebin_segments(energy, mu, en, method=method)
 
     newname = group.__name__ + '_rebinned'
-    group.rebinned = Group(energy=np.array(en), mu=np.array(mu_out),
-                           delta_mu=np.array(err_out), e0=e0,
-                           __name__=newname)
+    group.rebinned = Group(energy=en, mu=mu_out, delta_mu=err_out,
+                           counts=counts, e0=e0, __name__=newname)
     return
@@ -4,6 +4,7 @@
 import ctypes
 import numpy as np
 from larch.larchlib import get_dll
+from larch.utils.lrucache import LRUCache
 
 import scipy.constants as consts
 from scipy.special import gamma
@@ -100,23 +101,57 @@ def sigma2_debye(t, theta, path):
       t        sample temperature (in K)
       theta    Debye temperature (in K)
       path     FeffPath to calculate sigma2 for
+
+    Notes:
+       results are cached by path geometry, t, and theta.
+       see sigma2_debye_paths() to calculate sigma2 for a list of paths.
     """
-    feffpath = path._feffdat
-    if feffpath is None:
+    return _sigma2_debye_feffdat(path._feffdat, t, theta)
+
+def sigma2_debye_paths(t, theta, paths):
+    """calculate sigma2 for a list of Feff Paths wih the correlated Debye model
+
+    sigma2 = sigma2_debye_paths(t, theta, paths)
+
+    Parameters:
+    -----------
+      t        sample temperature (in K)
+      theta    Debye temperature (in K)
+      paths    list of FeffPaths to calculate sigma2 for
+
+    Returns:
+    --------
+      array of sigma2, one per path
+    """
+    thetad = max(float(theta), 1.e-5)
+    tempk  = max(float(t), 1.e-5)
+    vecs = np.array([_debye_geomvec(path._feffdat) for path in paths])
+    return vecs.dot(debye_tfactor(thetad/tempk))/thetad
+
+def _sigma2_debye_feffdat(feffdat, t, theta):
+    """correlated Debye sigma2 for a FeffDatFile, with results cached
+    by path geometry, t, and theta"""
+    if feffdat is None:
         return 0.
     thetad = max(float(theta), 1.e-5)
     tempk  = max(float(t), 1.e-5)
-    natoms = len(feffpath.geom)
-    rnorm  = feffpath.rnorman
-    atomx, atomy, atomz, atomm = [], [], [], []
-    for sym, iz, ipot, am, x, y, z in feffpath.geom:
-        atomx.append(x)
-        atomy.append(y)
-        atomz.append(z)
-        atomm.append(am)
-
-    return sigma2_correldebye(natoms, tempk, thetad, rnorm,
-                              atomx, atomy, atomz, atomm)
+    key = (feffdat.rnorman, tuple(feffdat.geom), tempk, thetad)
+    sig2 = _sigma2_debye_cache.get(key)
+    if sig2 is None:
+        sig2 = _debye_geomvec(feffdat).dot(debye_tfactor(thetad/tempk))/thetad
+        _sigma2_debye_cache.put(key, sig2)
+    return sig2
+
+def _debye_geomvec(feffdat):
+    """cached geometry part of correlated Debye sigma2 for a FeffDatFile"""
+    key = (feffdat.rnorman, tuple(feffdat.geom))
+    vec = _debye_geomcache.get(key)
+    if vec is None:
+        atoms = np.array([g[3:] for g in feffdat.geom], dtype=np.float64)
+        vec = debye_geomvec(feffdat.rnorman, atoms[:, 1], atoms[:, 2],
+                            atoms[:, 3], atoms[:, 0])
+        _debye_geomcache.put(key, vec)
+    return vec
 
 def sigma2_correldebye(natoms, tk, theta, rnorm, x, y, z, atwt):
     """
@@ -232,6 +267,85 @@ def dist(x0, y0, z0, x1, y1, z1):
     """
     return np.sqrt( (x0-x1)**2 + (y0-y1)**2 + (z0-z1)**2 )
 
+# correlated Debye model, vectorized over all atom pairs of a path.
+#
+# The Debye integral debint(rx, tx) = int_0^1 dw sin(w*rx)/rx * coth(w*tx/2)
+# is done with a fixed composite Gauss-Legendre rule, with panels refined
+# geometrically towards w=0 to follow coth() at low temperature.  The
+# integrand then factors into a part depending only on reduced distance
+# (the path geometry) and a part depending only on reduced temperature,
+# so that for any path:
+#     sigma2 = debye_geomvec(geometry) . debye_tfactor(theta/t) / theta
+# with both factors cached.
+DEBYE_CONH = 72.7630804732553
+DEBYE_CONR = 4.5693349700844
+
+def _debye_quadrature(npanels=8, norder=24):
+    """nodes and weights for int_0^1, with panel edges at 4**-n"""
+    edges = np.concatenate(([0], 4.0**-np.arange(npanels)[::-1]))
+    x, w = np.polynomial.legendre.leggauss(norder)
+    nodes = [a + (b-a)*(x+1)/2 for a, b in zip(edges[:-1], edges[1:])]
+    weights = [w*(b-a)/2 for a, b in zip(edges[:-1], edges[1:])]
+    return np.concatenate(nodes), np.concatenate(weights)
+
+DEBYE_NODES, DEBYE_WEIGHTS = _debye_quadrature()
+
+_debye_geomcache = LRUCache(maxsize=4096)
+_debye_tcache = LRUCache(maxsize=256)
+_sigma2_debye_cache = LRUCache(maxsize=16384)
+
+def debye_tfactor(tx):
+    """reduced-temperature part of the Debye integral at the quadrature
+    nodes: coth(w*tx/2), for tx = theta/t.  cached by tx"""
+    out = _debye_tcache.get(tx)
+    if out is None:
+        wtx = np.minimum(DEBYE_NODES*tx, 50.0)
+        out = (1 + np.exp(-wtx))/(-np.expm1(-wtx))
+        _debye_tcache.put(tx, out)
+    return out
+
+def debye_geomvec(rnorm, x, y, z, atwt):
+    """reduced-distance part of the correlated Debye sigma2 for a path:
+    a vector over the quadrature nodes, summed over all atom pairs, so that
+       sigma2 = debye_geomvec(...).dot(debye_tfactor(theta/t)) / theta
+
+    Arguments:
+      rnorm   Norman radius (Ang)
+      x       array of x coord (Ang)
+      y       array of y coord (Ang)
+      z       array of z coord (Ang)
+      atwt    array of atomic_weight (amu)
+    """
+    xyz = np.array([x, y, z], dtype=np.float64).T
+    atwt = np.asarray(atwt, dtype=np.float64)
+    natoms = len(atwt)
+    i0, j0 = np.triu_indices(natoms)
+    i1, j1 = (i0 + 1) % natoms, (j0 + 1) % natoms
+
+    def dist_ij(a, b):
+        return np.sqrt(((xyz[a] - xyz[b])**2).sum(axis=1))
+
+    ridotj = ((xyz[i0] - xyz[i1])*(xyz[j0] - xyz[j1])).sum(axis=1)
+    weight = ridotj/(dist_ij(i0, i1)*dist_ij(j0, j1))
+    weight[i0 == j0] /= 2.0
+
+    rx, coef = [], []
+    for a, b, sign in ((i0, j0, 1), (i1, j1, 1), (i0, j1, -1), (i1, j0, -1)):
+        rx.append(DEBYE_CONR*dist_ij(a, b)/rnorm)
+        coef.append(sign*weight*DEBYE_CONH/(2*np.sqrt(atwt[a]*atwt[b])))
+    rx, coef = np.concatenate(rx), np.concatenate(coef)
+    wrx = np.outer(rx, DEBYE_NODES)
+    rxsafe = np.where(rx > 0, rx, 1.0)[:, None]
+    sinw = np.where(rx[:, None] > 0, np.sin(wrx)/rxsafe, DEBYE_NODES)
+    return coef.dot(sinw)*DEBYE_WEIGHTS
+
+def sigma2_correldebye_np(natoms, tk, theta, rnorm, x, y, z, atwt):
+    """numpy version of sigma2_correldebye(), with the same arguments,
+    vectorized over all atom pairs of the path
+    """
+    vec = debye_geomvec(rnorm, x[:natoms], y[:natoms], z[:natoms], atwt[:natoms])
+    return vec.dot(debye_tfactor(theta/tk))/theta
+
 def corrfn(rij, theta, tk, am1, am2, rs):
     """calculate correlation function
     c(ri, rj) = <xi xj> in the debye approximation
@@ -361,21 +475,7 @@ def sigma2_eins(t, theta):
     return EINS_FACTOR/(theta * rmass * tanh(theta/(2.0*t)))
 
 def sigma2_debye(t, theta):
-    if feffpath is None:
-         return 0.
-    thetad = max(float(theta), 1.e-5)
-    tempk  = max(float(t), 1.e-5)
-    natoms = len(feffpath.geom)
-    rnorm  = feffpath.rnorman
-    atomx, atomy, atomz, atomm = [], [], [], []
-    for sym, iz, ipot, am, x, y, z in feffpath.geom:
-        atomx.append(x)
-        atomy.append(y)
-        atomz.append(z)
-        atomm.append(am)
-
-    return sigma2_correldebye(natoms, tempk, thetad, rnorm,
-                              atomx, atomy, atomz, atomm)
+    return _sigma2_debye_feffdat(feffpath, t, theta)
 
 
 def gnxas(r0, sigma, beta):
@@ -401,6 +501,7 @@ def add_sigma2funcs(params):
     f_eval = params._asteval
     f_eval.symtable['EINS_FACTOR'] = EINS_FACTOR
     f_eval.symtable['sigma2_correldebye'] = sigma2_correldebye
+    f_eval.symtable['_sigma2_debye_feffdat'] = _sigma2_debye_feffdat
     f_eval.symtable['feffpath'] = None
     f_eval.symtable['gamma'] = gamma
     f_eval(_sigma2_funcs)
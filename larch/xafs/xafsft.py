@@ -5,13 +5,13 @@
 import numpy as np
 from numpy import (pi, arange, zeros, ones, sin, cos,
                    exp, log, sqrt, where, interp, linspace)
-# from numpy.fft import fft, ifft
-from scipy.fftpack import fft, ifft
+from scipy.fft import fft, ifft, rfft
 from scipy.special import i0 as bessel_i0
 
 from larch import (Group, Make_CallArgs, parse_group_args)
 
 from larch.math import complex_phase
+from larch.utils.lrucache import LRUCache
 from .xafsutils import set_xafsGroup
 
 
@@ -117,11 +117,88 @@ def ftwindow(x, xmin=None, xmax=None, dx=1, dx2=None,
         fwin =  exp(-(((x - cen)**2)/(2*dx1*dx1)))
     return fwin
 
+# process-wide cache of FT windows and k-weighted windows on uniform grids
+_ftwindow_cache = LRUCache(maxsize=256, maxbytes=64*2**20)
+
+def _readonly(arr):
+    arr.setflags(write=False)
+    return arr
+
+def ftwindow_uniform(xstep, npts, xmin=None, xmax=None, dx=1, dx2=None,
+                     window='hanning'):
+    """
+    FT window on the uniform grid xstep*arange(npts), as from ftwindow(),
+    from a process-wide cache keyed by the window parameters and grid.
+
+    The returned array is shared and read-only: copy it before modifying.
+    """
+    if dx2 is None: dx2 = dx
+    if window is None: window = VALID_WINDOWS[0]
+    key = ('win', window.strip().lower()[:3], xmin, xmax, dx, dx2, xstep, npts)
+    win = _ftwindow_cache.get(key)
+    if win is None:
+        x = xstep * arange(npts, dtype='float64')
+        win = _ftwindow_cache.put(key, _readonly(ftwindow(x, xmin=xmin, xmax=xmax,
+                                                          dx=dx, dx2=dx2,
+                                                          window=window)))
+    return win
+
+def kweight_array(kstep, npts, kweight):
+    """k**kweight on the uniform grid kstep*arange(npts), cached.  kweight
+    can be a list of k-weights, giving a 2-d array with one row per k-weight.
+    The returned array is shared and read-only."""
+    if not np.isscalar(kweight):
+        kweight = tuple(kweight)
+    key = ('kw', kstep, npts, kweight)
+    out = _ftwindow_cache.get(key)
+    if out is None:
+        k = kstep * arange(npts, dtype='float64')
+        if np.isscalar(kweight):
+            out = k**kweight
+        else:
+            out = np.array([k**kw for kw in kweight])
+        out = _ftwindow_cache.put(key, _readonly(out))
+    return out
+
+def ftwindow_kweight(kweight, npts, kstep=0.05, kmin=None, kmax=None, dk=1,
+                     dk2=None, window='kaiser', nwin=None):
+    """
+    FT window times k**kweight for the first npts points of the uniform grid
+    kstep*arange(nwin), with the window as from ftwindow_uniform(kstep, nwin,
+    ...).  nwin defaults to npts.  kweight can be a list of k-weights, giving
+    a 2-d array with one row per k-weight.
+
+    These are held in the same process-wide cache as the windows, and the
+    returned array is shared and read-only.
+    """
+    if nwin is None: nwin = npts
+    if dk2 is None: dk2 = dk
+    if window is None: window = VALID_WINDOWS[0]
+    if not np.isscalar(kweight):
+        kweight = tuple(kweight)
+    key = ('kwin', window.strip().lower()[:3], kmin, kmax, dk, dk2, kstep,
+           nwin, npts, kweight)
+    out = _ftwindow_cache.get(key)
+    if out is None:
+        win = ftwindow_uniform(kstep, nwin, xmin=kmin, xmax=kmax, dx=dk,
+                               dx2=dk2, window=window)
+        out = _ftwindow_cache.put(key, _readonly(win[:npts] *
+                                                 kweight_array(kstep, npts, kweight)))
+    return out
+
+def ftwindow_cache_stats():
+    """return dict of statistics for the cache of FT windows"""
+    return _ftwindow_cache.stats()
+
+def clear_ftwindow_cache():
+    """remove all FT windows from the cache"""
+    _ftwindow_cache.clear()
+
 
 @Make_CallArgs(["r", "chir"])
 def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
             dr=1, dr2=None, rw=0, window='kaiser', qmax_out=None,
-            nfft=2048, kstep=0.05, _larch=None, **kws):
+            nfft=2048, kstep=0.05, workers=None, _larch=None, **kws):
     """
     reverse XAFS Fourier transform, from chi(R) to chi(q).
 
@@ -132,7 +209,7 @@ def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
     Parameters:
     ------------
       r:        1-d array of distance, or group.
-      chir:     1-d array of chi(R)
+      chir:     1-d array of chi(R), or 2-d array with one chi(R) per row
       group:    output Group
       qmax_out: highest *k* for output data (30 Ang^-1)
       rweight:  exponent for weighting spectra by r^rweight (0)
@@ -144,6 +221,7 @@ def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
       nfft:     value to use for N_fft (2048).
       kstep:    value to use for delta_k (0.05).
       with_phase: output the phase as well as magnitude, real, imag  [False]
+      workers:  number of threads to use for the FFT [None, 1 thread]
 
     Returns:
     ---------
@@ -172,16 +250,15 @@ def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
     rstep = r[1] - r[0]
     kstep = pi/(rstep*nfft)
     scale = 1.0
-
-    cchir = zeros(nfft, dtype='complex128')
-    r_    = rstep * arange(nfft, dtype='float64')
-
-    cchir[0:len(chir)] = chir
-    if chir.dtype == np.dtype('complex128'):
+    if np.iscomplexobj(chir):
         scale = 0.5
 
-    win = ftwindow(r_, xmin=rmin, xmax=rmax, dx=dr, dx2=dr2, window=window)
-    out = scale * xftr_fast( cchir*win * r_**rw, kstep=kstep, nfft=nfft)
+    nrpts = chir.shape[-1]
+    win = ftwindow_uniform(rstep, nfft, xmin=rmin, xmax=rmax, dx=dr, dx2=dr2,
+                           window=window)
+    rwin = ftwindow_kweight(rw, nrpts, kstep=rstep, kmin=rmin, kmax=rmax,
+                            dk=dr, dk2=dr2, window=window, nwin=nfft)
+    out = scale * xftr_fast(chir*rwin, kstep=kstep, nfft=nfft, workers=workers)
     if qmax_out is None: qmax_out = 30.0
     q = linspace(0, qmax_out, int(1.05 + qmax_out/kstep))
     nkpts = len(q)
@@ -189,20 +266,20 @@ def xftr(r, chir=None, group=None, rmin=0, rmax=20, with_phase=False,
     group = set_xafsGroup(group, _larch=_larch)
     group.q = q
     mag = sqrt(out.real**2 + out.imag**2)
-    group.rwin =  win[:len(chir)]
-    group.chiq     =  out[:nkpts]
-    group.chiq_mag =  mag[:nkpts]
-    group.chiq_re  =  out.real[:nkpts]
-    group.chiq_im  =  out.imag[:nkpts]
+    group.rwin =  win[:nrpts].copy()
+    group.chiq     =  out[..., :nkpts]
+    group.chiq_mag =  mag[..., :nkpts]
+    group.chiq_re  =  out.real[..., :nkpts]
+    group.chiq_im  =  out.imag[..., :nkpts]
     if with_phase:
-        group.chiq_pha =  complex_phase(out[:nkpts])
+        group.chiq_pha =  complex_phase(out[..., :nkpts])
 
 
 
 @Make_CallArgs(["k", "chi"])
 def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=0,
          dk=1, dk2=None, with_phase=False, window='kaiser', rmax_out=10,
-         nfft=2048, kstep=0.05, _larch=None, **kws):
+         nfft=2048, kstep=0.05, workers=None, _larch=None, **kws):
     """
     forward XAFS Fourier transform, from chi(k) to chi(R), using
     common XAFS conventions.
@@ -210,7 +287,7 @@ def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=0,
     Parameters:
     -----------
       k:        1-d array of photo-electron wavenumber in Ang^-1 or group
-      chi:      1-d array of chi
+      chi:      1-d array of chi, or 2-d array with one chi per row
       group:    output Group
       rmax_out: highest R for output data (10 Ang)
       kweight:  exponent for weighting spectra by k**kweight
@@ -222,6 +299,7 @@ def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=0,
       nfft:     value to use for N_fft (2048).
       kstep:    value to use for delta_k (0.05 Ang^-1).
       with_phase: output the phase as well as magnitude, real, imag  [False]
+      workers:  number of threads to use for the FFT [None, 1 thread]
 
     Returns:
     ---------
@@ -239,6 +317,9 @@ def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=0,
         chir_pha           phase of chi(R) if with_phase=True
                            (a noticable performance hit)
 
+    If chi is a 2-d array of many spectra on the same k grid, all spectra
+    are transformed together, and the chi(R) arrays have one row per spectrum.
+
     Supports First Argument Group convention (with group member names 'k' and 'chi')
     """
     # allow kweight keyword == kw
@@ -253,7 +334,7 @@ def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=0,
                                dk=dk, dk2=dk2, nfft=nfft, kstep=kstep,
                                window=window, _larch=_larch)
 
-    out = xftf_fast(cchi*win, kstep=kstep, nfft=nfft)
+    out = xftf_fast(cchi*win, kstep=kstep, nfft=nfft, workers=workers)
     rstep = pi/(kstep*nfft)
 
     irmax = int(min(nfft/2, 1.01 + rmax_out/rstep))
@@ -261,14 +342,14 @@ def xftf(k, chi=None, group=None, kmin=0, kmax=20, kweight=0,
     group = set_xafsGroup(group, _larch=_larch)
     r   = rstep * arange(irmax)
     mag = sqrt(out.real**2 + out.imag**2)
-    group.kwin =  win[:len(chi)]
+    group.kwin =  win[:chi.shape[-1]].copy()
     group.r    =  r[:irmax]
-    group.chir =  out[:irmax]
-    group.chir_mag =  mag[:irmax]
-    group.chir_re  =  out.real[:irmax]
-    group.chir_im  =  out.imag[:irmax]
+    group.chir =  out[..., :irmax]
+    group.chir_mag =  mag[..., :irmax]
+    group.chir_re  =  out.real[..., :irmax]
+    group.chir_im  =  out.imag[..., :irmax]
     if with_phase:
-        group.chir_pha =  complex_phase(out[:irmax])
+        group.chir_pha =  complex_phase(out[..., :irmax])
 
 
 
@@ -279,18 +360,23 @@ def xftf_prep(k, chi, kmin=0, kmax=20, kweight=2, dk=1, dk2=None,
     ft window.
 
     Returns weighted chi, window function which can easily be multiplied
-    and used in xftf_fast.
+    and used in xftf_fast.  chi can be a 2-d array of many chi arrays
+    on the same k array, one per row.
     """
     if dk2 is None: dk2 = dk
     npts = int(1.01 + max(k)/kstep)
     k_max = max(max(k), kmax+dk2)
     k_   = kstep * np.arange(int(1.01+k_max/kstep), dtype='float64')
-    chi_ = interp(k_, k, chi)
-    win  = ftwindow(k_, xmin=kmin, xmax=kmax, dx=dk, dx2=dk2, window=window)
-    return ((chi_[:npts] *k_[:npts]**kweight), win[:npts])
+    if np.ndim(chi) > 1:
+        chi_ = np.array([interp(k_, k, c) for c in chi])
+    else:
+        chi_ = interp(k_, k, chi)
+    win  = ftwindow_uniform(kstep, len(k_), xmin=kmin, xmax=kmax, dx=dk,
+                            dx2=dk2, window=window)
+    return ((chi_[..., :npts] * kweight_array(kstep, npts, kweight)), win[:npts])
 
 
-def xftf_fast(chi, nfft=2048, kstep=0.05, _larch=None, **kws):
+def xftf_fast(chi, nfft=2048, kstep=0.05, workers=None, _larch=None, **kws):
     """
     calculate forward XAFS Fourier transform.  Unlike xftf(),
     this assumes that:
@@ -302,20 +388,29 @@ def xftf_fast(chi, nfft=2048, kstep=0.05, _larch=None, **kws):
 
     Parameters:
     ------------
-      chi:      1-d array of chi to be transformed
+      chi:      1-d array of chi to be transformed, or 2-d array of
+                many chi arrays (one per row) to be transformed together.
       nfft:     value to use for N_fft (2048).
       kstep:    value to use for delta_k (0.05).
+      workers:  number of threads to use for the FFT [None, 1 thread]
 
     Returns:
     --------
-      complex 1-d array chi(R)
+      complex array chi(R), with the last axis of length nfft/2
 
+    Notes:
+    ------
+      real input uses a real-input FFT, which gives the same chi(R) at
+      about half the cost.  Data is zero-padded to nfft by the FFT itself.
     """
-    cchi = zeros(nfft, dtype='complex128')
-    cchi[0:len(chi)] = chi
-    return (kstep / sqrtpi) * fft(cchi)[:int(nfft/2)]
-
-def xftr_fast(chir, nfft=2048, kstep=0.05, _larch=None, **kws):
+    chi = np.asarray(chi)
+    if np.iscomplexobj(chi):
+        out = fft(chi, n=nfft, axis=-1, workers=workers)
+    else:
+        out = rfft(chi, n=nfft, axis=-1, workers=workers)
+    return (kstep / sqrtpi) * out[..., :int(nfft/2)]
+
+def xftr_fast(chir, nfft=2048, kstep=0.05, workers=None, _larch=None, **kws):
     """
     calculate reverse XAFS Fourier transform, from chi(R) to
     chi(q), using common XAFS conventions.  This version demands
@@ -326,16 +421,17 @@ def xftr_fast(chir, nfft=2048, kstep=0.05, _larch=None, **kws):
 
     Parameters:
     -------------
-      chir:     1-d array of chi(R) to be transformed
+      chir:     1-d array of chi(R) to be transformed, or 2-d array of
+                many chi(R) arrays (one per row) to be transformed together.
       nfft:     value to use for N_fft (2048).
       kstep:    value to use for delta_k (0.05).
+      workers:  number of threads to use for the FFT [None, 1 thread]
 
     Returns:
     ----------
-      complex 1-d array for chi(q).
+      complex array for chi(q), with the last axis of length nfft/2
 
     This is useful for repeated FTs, as inside loops.
     """
-    cchi = zeros(nfft, dtype='complex128')
-    cchi[0:len(chir)] = chir
-    return  (4*sqrtpi/kstep) * ifft(cchi)[:int(nfft/2)]
+    out = ifft(chir, n=nfft, axis=-1, workers=workers)
+    return (4*sqrtpi/kstep) * out[..., :int(nfft/2)]
@@ -1,6 +1,7 @@
 """
 Utility functions used for xafs analysis
 """
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from larch import Group
 
@@ -62,3 +63,17 @@ def set_xafsGroup(group, _larch=None):
     if _larch is not None:
         _larch.symtable._sys.xafsGroup = group
     return group
+
+def batch_chunks(nrows, nworkers=1):
+    """split range(nrows) into contiguous chunks of row indices,
+    one chunk per worker"""
+    nchunks = max(1, min(nrows, nworkers))
+    return [c for c in np.array_split(np.arange(nrows), nchunks) if len(c) > 0]
+
+def batch_map(func, args, nworkers=1):
+    """return [func(a) for a in args], running in a pool of nworkers
+    processes if nworkers > 1.  func must be a module-level function."""
+    if nworkers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=nworkers) as pool:
+            return list(pool.map(func, args))
+    return [func(a) for a in args]
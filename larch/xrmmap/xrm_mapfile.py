@@ -8,10 +8,13 @@ import numpy as np
 import scipy.stats as stats
 import json
 import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
 
 import larch
 from larch.utils import debugtime, isotime
+from larch.utils.lrucache import LRUCache
 from larch.utils.strutils import fix_filename, bytes2str, version_ge
 
 from larch.io import (nativepath, new_filename, read_xrf_netcdf,
@@ -41,6 +44,14 @@ EXTRA_DETGROUPS =  ('scalars', 'work', 'xrd1d', 'xrd2d')
 NOT_OWNER = "Not Owner of HDF5 file %s"
 QSTEPS = 2048
 
+# channel-cumulative "integral cube" of MCA counts, stored per detector
+INTEGRAL_NAME = 'counts_integral'
+INTEGRAL_CHUNK = 32
+
+# in-memory cache of ROI maps from get_roimap(), per map file
+ROIMAP_CACHE_SIZE = 256
+ROIMAP_CACHE_BYTES = 256*2**20
+
 H5ATTRS = {'Type': 'XRM 2D Map',
            'Version': '2.1.0',
            # 'Version': '2.0.0',
@@ -179,6 +190,37 @@ def toppath(pname, n=4):
     return '/'.join(words)
 
 
+def channel_integral(counts, step=1):
+    """cumulative sum of counts over the last (channel) axis, starting
+    at 0 and sampled every step channels, so that
+    out[..., j] = counts[..., :j*step].sum(axis=-1)
+    for j = 0, ..., nchan//step.  Integer counts give uint64 sums."""
+    csum = np.cumsum(counts, axis=-1)
+    csum = np.concatenate((np.zeros(csum.shape[:-1]+(1,), dtype=csum.dtype),
+                           csum), axis=-1)
+    return csum[..., ::step]
+
+def roi_sums(counts, slices):
+    """sums of counts over channel ranges for many ROIs at once, from
+    one cumulative sum over the last (channel) axis of counts.
+
+    Arguments
+    ---------
+      counts    array of MCA counts, with channels as the last axis
+      slices    list of slice objects for channel ranges, one per ROI
+
+    Returns array of ROI sums of shape counts.shape[:-1] + (len(slices),),
+    equal to [counts[..., s].sum(axis=-1) for s in slices].
+    """
+    nchan = counts.shape[-1]
+    lo, hi = [], []
+    for sl in slices:
+        start, stop, _ = sl.indices(nchan)
+        lo.append(start)
+        hi.append(max(start, stop))
+    csum = channel_integral(counts)
+    return csum[..., hi] - csum[..., lo]
+
 def remove_zigzag(map, zigzag=0):
     if zigzag == 0:
         return map
@@ -196,6 +238,105 @@ def remove_zigzag(map, zigzag=0):
     return tmp
 
 
+class GSEXRM_RowSchema(object):
+    '''
+    HDF5 datasets written for each row by GSEXRM_MapFile.add_rowdata(),
+    with their shapes, found once from the xrmmap group instead of
+    scanning the group and looking up datasets by name for every row.
+
+    Dataset handles stay valid when arrays are resized, so the schema
+    only needs to be rebuilt when detectors or ROIs are created or
+    deleted, as by build_schema().
+    '''
+    MCA_ARRAYS = ('counts', 'dtfactor', 'realtime', 'livetime',
+                  'inpcounts', 'outcounts')
+
+    def __init__(self, xrmmap, version):
+        self.version = version
+        self.mca_names = []
+        self.mcas = []
+        self.mca_integrals = []
+        self.mcasum_integral = None
+        self.scalars = {}
+        self.scalar_npts = 0
+        self._rowcheck = None
+        for gname in sorted(xrmmap.keys()):
+            grp = xrmmap[gname]
+            gtype = bytes2str(grp.attrs.get('type', ''))
+            if gtype.startswith('scalar detect'):
+                self.scalars = {aname: grp[aname] for aname in grp.keys()}
+                if len(self.scalars) > 0:
+                    self._rowcheck = grp[list(grp.keys())[0]]
+                    self.scalar_npts = self._rowcheck.shape[1]
+            elif gtype.startswith('mca detect'):
+                self.mca_names.append(gname)
+                self.mcas.append({aname: grp[aname] for aname in
+                                  self.MCA_ARRAYS if aname in grp})
+                self.mca_integrals.append(self._integral(grp))
+
+        self.pos = xrmmap.get('positions/pos', None)
+        self.mcasum = {}
+        self.mcasum_shape = None
+        if 'mcasum' in xrmmap:
+            grp = xrmmap['mcasum']
+            self.mcasum = {aname: grp[aname] for aname in
+                           self.MCA_ARRAYS if aname in grp}
+            if 'counts' in self.mcasum:
+                self.mcasum_shape = self.mcasum['counts'].shape[1:]
+            self.mcasum_integral = self._integral(grp)
+        self.detsum = xrmmap.get('detsum/counts', None)
+        self.mca_shape = None
+        if len(self.mcas) > 0 and 'counts' in self.mcas[0]:
+            self.mca_shape = self.mcas[0]['counts'].shape[1:]
+            if not version_ge(version, '2.0.0'):
+                self._rowcheck = self.mcas[-1]['counts']
+
+        roimap = xrmmap['roimap']
+        for aname in ('det_raw', 'det_cor', 'sum_raw', 'sum_cor'):
+            setattr(self, aname, roimap.get(aname, None))
+
+        # version 2.0: (slice, sum raw, sum cor, [(det raw, det cor)]) per ROI
+        self.rois = []
+        if (version_ge(version, '2.0.0') and not version_ge(version, '2.1.0')
+            and 'mcasum' in roimap):
+            en = xrmmap['mcasum']['energy'][:]
+            for roiname in roimap['mcasum'].keys():
+                en_lim = roimap['mcasum'][roiname]['limits'][:]
+                roi_slice = slice(np.abs(en-en_lim[0]).argmin(),
+                                  np.abs(en-en_lim[1]).argmin())
+                detrois = [(roimap[det][roiname]['raw'], roimap[det][roiname]['cor'])
+                           for det in self.mca_names]
+                self.rois.append((roi_slice, roimap['mcasum'][roiname]['raw'],
+                                  roimap['mcasum'][roiname]['cor'], detrois))
+
+        self.xrd1d_q = xrmmap.get('xrd1d/q', None)
+        self.xrd1d_counts = xrmmap.get('xrd1d/counts', None)
+        self.xrd2d_counts = xrmmap.get('xrd2d/counts', None)
+        self.xrd_wedges = []
+        if 'work/xrdwedge' in xrmmap:
+            self.xrd_wedges = list(xrmmap['work/xrdwedge'].values())
+
+    def _integral(self, grp):
+        "(dataset, step) for the integral cube of an MCA group, or None"
+        if INTEGRAL_NAME not in grp:
+            return None
+        dset = grp[INTEGRAL_NAME]
+        return dset, int(dset.attrs.get('step', 1))
+
+    def nrows(self):
+        "number of rows allocated in the row arrays"
+        if self._rowcheck is None:
+            return 0
+        return self._rowcheck.shape[0]
+
+def read_maprow(args):
+    """read one row of raw map data, returning a GSEXRM_MapRow.
+    args is (positional arguments, keyword arguments), as from
+    GSEXRM_MapFile.rowdata_args().  Used in the worker processes
+    of GSEXRM_MapFile.process()"""
+    rargs, kws = args
+    return GSEXRM_MapRow(*rargs, **kws)
+
 class GSEXRM_MapFile(object):
     '''
     Access to GSECARS X-ray Microprobe Map File:
@@ -241,7 +382,8 @@ class GSEXRM_MapFile(object):
                  bkgdscale=1., has_xrf=True, has_xrd1d=False, has_xrd2d=False,
                  compression=COMPRESSION, compression_opts=COMPRESSION_OPTS,
                  facility='APS', beamline='13-ID-E', run='', proposal='',
-                 user='', scandb=None, all_mcas=False, **kws):
+                 user='', scandb=None, all_mcas=False, integral_cube=False,
+                 **kws):
 
         self.filename      = filename
         self.folder        = folder
@@ -269,7 +411,10 @@ class GSEXRM_MapFile(object):
         self.masterfile    = None
         self.force_no_dtc  = False
         self.all_mcas      = all_mcas
+        self.integral_cube = integral_cube
         self.detector_list = None
+        self.row_schema    = None
+        self.roimap_cache  = LRUCache(ROIMAP_CACHE_SIZE, ROIMAP_CACHE_BYTES)
 
         self.compress_args = {'compression': compression}
         if compression != 'lzf':
@@ -509,6 +654,8 @@ class GSEXRM_MapFile(object):
         if self.h5root is None:
             self.h5root = h5py.File(self.filename, 'a')
         self.xrmmap = self.h5root[root]
+        self.row_schema = None
+        self.clear_roimap_cache(reset_stats=False)
         if self.folder is None:
             self.folder = bytes2str(self.xrmmap.attrs.get('Map_Folder',''))
         self.last_row = int(self.xrmmap.attrs.get('Last_Row',0))
@@ -537,6 +684,8 @@ class GSEXRM_MapFile(object):
             print(sys.exc_info())
 
         self.h5root = None
+        self.row_schema = None
+        self.clear_roimap_cache(reset_stats=False)
 
     def add_XRDfiles(self, flip=None, xrdcalfile=None, xrd2dmaskfile=None,
                      xrd2dbkgdfile=None, xrd1dbkgdfile=None):
@@ -715,15 +864,18 @@ class GSEXRM_MapFile(object):
         self.status = GSEXRM_FileStatus.hasdata
 
     def process_row(self, irow, flush=False, complete=False, offset=None,
-                    nrows_expected=None, callback=None):
-        row = self.read_rowdata(irow, offset=offset)
+                    nrows_expected=None, callback=None, row=None):
+        """add row irow to the HDF5 file, reading it from the raw folder
+        with read_rowdata() unless an already-read row is given"""
+        if row is None:
+            row = self.read_rowdata(irow, offset=offset)
         if irow == 0:
             nmca, nchan = 0, 2048
             if row.counts is not None:
                 nmca, xnpts, nchan = row.counts.shape
             xrd2d_shape = None
             if row.xrd2d is not None:
-                xrd2d_shape = rows.xrd2d.shape
+                xrd2d_shape = row.xrd2d.shape
             self.build_schema(row.npts, nmca=nmca, nchan=nchan,
                               scaler_names=row.scaler_names,
                               scaler_addrs=row.scaler_addrs,
@@ -744,8 +896,13 @@ class GSEXRM_MapFile(object):
 
 
     def process(self, maxrow=None, force=False, callback=None, offset=None,
-                force_no_dtc=False, all_mcas=None):
-        "look for more data from raw folder, process if needed"
+                force_no_dtc=False, all_mcas=None, nworkers=1, prefetch=None):
+        """look for more data from raw folder, process if needed
+
+        with nworkers > 1, raw rows are read and decoded by a pool of
+        nworkers processes while this process writes rows to the HDF5
+        file in order, with at most prefetch [2*nworkers] rows read ahead.
+        """
         self.force_no_dtc = force_no_dtc
         if all_mcas is not None:
             self.all_mcas = all_mcas
@@ -765,55 +922,172 @@ class GSEXRM_MapFile(object):
             nrows = min(nrows, maxrow)
 
         if force or self.folder_has_newdata():
-            irow = self.last_row + 1
-            while irow < nrows:
+            irows = range(self.last_row+1, nrows)
+            rows = self.iter_rowdata(irows, offset=offset, nworkers=nworkers,
+                                     prefetch=prefetch)
+            for irow, row in zip(irows, rows):
                 flush = irow < 2 or (irow % 64 == 0)
                 complete = irow >= nrows-1
                 self.process_row(irow, flush=flush, offset=offset,
-                                 complete=complete, callback=callback)
-                irow  = irow + 1
+                                 complete=complete, callback=callback, row=row)
             if callable(callback):
                 callback(filename=self.filename, status='complete')
 
 
-    def set_roidata(self, row_start=0, row_end=None):
+    def set_roidata(self, row_start=0, row_end=None, callback=None,
+                    blocksize=None):
+        '''recalculate the ROI maps from the MCA counts of each detector
+        for rows row_start through row_end [last_row].
+
+        The counts are read once, in blocks of rows aligned with the HDF5
+        chunks, of about blocksize bytes [64 MB].  All ROI sums for a block
+        are found from one cumulative sum over channels, and the raw and
+        dead-time corrected maps for all ROIs and detectors are written
+        with the same block.  callback, if given, is called after each
+        block as callback(row=, maxrow=, filename=).
+        '''
+        if not self.check_hostid():
+            raise GSEXRM_Exception(NOT_OWNER % self.filename)
         if row_end is None:
             row_end = self.last_row
+        self.clear_roimap_cache(reset_stats=False)
+        schema = self.get_row_schema()
+        mcas = schema.mcas
+        if len(mcas) < 1 or not all('counts' in d and 'dtfactor' in d for d in mcas):
+            raise GSEXRM_Exception("ROI maps need MCA counts for each detector")
+        nmca = len(mcas)
+        roimap = self.xrmmap['roimap']
+
+        # channel slices for each detector and ROI
+        if len(schema.rois) > 0:   # version 2.0: roimap/DET/ROINAME/raw
+            slices = [[r[0] for r in schema.rois]]*nmca
+        else:
+            lims = self.xrmmap['config/rois/limits'][()]
+            lims_names = [h5str(s) for s in self.xrmmap['config/rois/name']]
+            nrois = lims.shape[0]
+            slices = [[slice(lims[iroi, i, 0], lims[iroi, i, 1])
+                       for iroi in range(nrois)] for i in range(nmca)]
+            nscal = schema.det_raw.shape[2] - nrois*nmca
+
+        npts = mcas[0]['counts'].shape[1]
+        for rows in self._row_blocks(mcas[0]['counts'], row_start, row_end,
+                                     nmca=nmca, blocksize=blocksize):
+            raw = np.array([roi_sums(d['counts'][rows], sl)
+                            for d, sl in zip(mcas, slices)])
+            cor = np.array([raw[i]*d['dtfactor'][rows][..., np.newaxis]
+                            for i, d in enumerate(mcas)])
+            sumraw = raw.sum(axis=0)
+            sumcor = cor.sum(axis=0)
+            if len(schema.rois) > 0:
+                for iroi, (_sl, sraw, scor, detrois) in enumerate(schema.rois):
+                    for idet, (draw, dcor) in enumerate(detrois):
+                        draw[rows] = raw[idet, ..., iroi]
+                        dcor[rows] = cor[idet, ..., iroi]
+                    sraw[rows] = sumraw[..., iroi]
+                    scor[rows] = sumcor[..., iroi]
+            else:
+                nr = rows.stop - rows.start
+                # columns are scalers, then detectors for each ROI
+                schema.det_raw[rows, :, nscal:] = np.moveaxis(raw, 0, -1).reshape(nr, npts, -1)
+                schema.det_cor[rows, :, nscal:] = np.moveaxis(cor, 0, -1).reshape(nr, npts, -1)
+                schema.sum_raw[rows, :, nscal:] = sumraw
+                schema.sum_cor[rows, :, nscal:] = sumcor
+            if callable(callback):
+                callback(row=rows.stop, maxrow=row_end+1, filename=self.filename)
+
+        if len(schema.rois) == 0:
+            # get_roimap() keeps copies of ROI maps from det_raw / det_cor
+            # in roimap/DET/ROINAME: empty these so that they are refilled
+            for dgroup in roimap.values():
+                if not isinstance(dgroup, h5py.Group):
+                    continue
+                for rname in lims_names:
+                    for aname in ('raw', 'cor'):
+                        dset = dgroup.get('%s/%s' % (rname, aname), None)
+                        if dset is not None and dset.shape[0] > 0:
+                            dset.resize((0, dset.shape[1]))
+        self.h5root.flush()
 
-        # print("Process ROIs for rows %d to %d " % (row_start+1, row_end+1))
-        rows = slice(row_start, row_end+1)
-        roigrp = self.xrmmap['roimap']
-        conf = self.xrmmap['config']
-        roi_names = [h5str(s) for s in conf['rois/name']]
-        roi_limits = conf['rois/limits'][()]
-        # print("roi names ", roi_names, roi_limits)
-
-        for roiname, lims in zip(roi_names, roi_limits):
-            dt = debugtime()
-            roi_slice = lims[0]
-            # dt.add('get slice')
-            sumraw = roigrp['mcasum'][roiname]['raw'][rows,]
-            # dt.add('get sum raw')
-            sumcor = roigrp['mcasum'][roiname]['cor'][rows,]
-            # dt.add('get sum cor')
-
-            for detname in self.mca_dets:
-                mcaraw = self.xrmmap[detname]['counts'][rows,:,roi_slice].sum(axis=2)
-                # dt.add(" mcaraw %s " % detname)
-                mcacor = mcaraw*self.xrmmap[detname]['dtfactor'][rows,:]
-                # dt.add(" mcacor %s " % detname)
-                roigrp[detname][roiname]['raw'][rows,] = mcaraw
-                roigrp[detname][roiname]['cor'][rows,] = mcacor
-                # dt.add(" set roigrps for %s " % detname)
-                sumraw += mcaraw
-                sumcor += mcacor
-                # dt.add(" sum  %s " % detname)
-            #dt.show()
-
-            roigrp['mcasum'][roiname]['raw'][rows,] = sumraw
-            roigrp['mcasum'][roiname]['cor'][rows,] = sumcor
+    def _row_blocks(self, counts, row_start, row_end, nmca=1, blocksize=None):
+        '''yield slices for blocks of rows row_start through row_end of an
+        MCA counts dataset, aligned with its HDF5 chunks, so that nmca
+        such datasets take about blocksize bytes [64 MB] per block'''
+        _nr, npts, nchan = counts.shape
+        chunkrows = (counts.chunks or (1,))[0]
+        if blocksize is None:
+            blocksize = 64*2**20
+        rowbytes = max(1, nmca*npts*nchan*counts.dtype.itemsize)
+        nblock = chunkrows*max(1, int(blocksize/(rowbytes*chunkrows)))
+        r0 = row_start
+        while r0 <= row_end:
+            r1 = min(row_end+1, nblock*(1 + r0//nblock))
+            yield slice(r0, r1)
+            r0 = r1
+
+    def _create_integral(self, dgroup, step=1):
+        '''create (replacing) the integral cube dataset for an MCA group'''
+        counts = dgroup['counts']
+        nrows, npts, nchan = counts.shape
+        nbins = nchan//step + 1
+        dtype = np.float64 if counts.dtype.kind == 'f' else np.uint64
+        if INTEGRAL_NAME in dgroup:
+            del dgroup[INTEGRAL_NAME]
+        self.row_schema = None
+        dset = dgroup.create_dataset(INTEGRAL_NAME, (nrows, npts, nbins), dtype,
+                                     chunks=(1, npts, min(nbins, INTEGRAL_CHUNK)),
+                                     maxshape=(None, npts, nbins),
+                                     **self.compress_args)
+        dset.attrs['step'] = step
+        dset.attrs['desc'] = 'counts summed over channels 0 to step*index'
+        return dset
+
+    def build_integral_cube(self, step=1, callback=None, blocksize=None):
+        '''build the "integral cube" for each MCA detector and the sum of
+        detectors: the counts summed over channels, for every step
+        channels, stored as DET/counts_integral.  With this, the map for
+        any channel range is the difference of two channel slices of the
+        cube (see get_mca_erange()), instead of a sum over the full MCA
+        counts.  Rows added later by add_rowdata() are added to the cube.
+
+        The counts are read in blocks of rows as for set_roidata(), and
+        callback, if given, is called after each block as
+        callback(row=, maxrow=, filename=).  Needs version 2.0 or higher.
+        '''
+        if not self.check_hostid():
+            raise GSEXRM_Exception(NOT_OWNER % self.filename)
+        if not version_ge(self.version, '2.0.0'):
+            raise GSEXRM_Exception("integral cube needs map file version 2.0 or higher")
+        step = max(1, int(step))
+        schema = self.get_row_schema()
+        dnames = schema.mca_names + (['mcasum'] if 'mcasum' in self.xrmmap else [])
+        row_end = self.last_row
+        for dname in dnames:
+            dgroup = self.xrmmap[dname]
+            dset = self._create_integral(dgroup, step=step)
+            counts = dgroup['counts']
+            for rows in self._row_blocks(counts, 0, row_end, blocksize=blocksize):
+                dset[rows] = channel_integral(counts[rows], step)
+                if callable(callback):
+                    callback(row=rows.stop, maxrow=row_end+1, filename=self.filename)
+        self.integral_cube = True
         self.h5root.flush()
 
+    def _channel_sums(self, dgroup, imin, imax, exact=True):
+        '''map of counts summed over channels imin to imax for an MCA group,
+        from the integral cube if available and, if exact is True, if
+        imin and imax are multiples of its step.'''
+        imin, imax, _ = slice(imin, imax).indices(dgroup['counts'].shape[2])
+        imax = max(imin, imax)
+        if INTEGRAL_NAME in dgroup:
+            dset = dgroup[INTEGRAL_NAME]
+            step = int(dset.attrs.get('step', 1))
+            if not exact or (imin % step == 0 and imax % step == 0):
+                nbins = dset.shape[2]
+                j0 = min(nbins-1, int(round(imin/step)))
+                j1 = min(nbins-1, max(j0, int(round(imax/step))))
+                return dset[:, :, j1] - dset[:, :, j0]
+        return dgroup['counts'][:, :, imin:imax].sum(axis=2)
+
     def calc_pixeltime(self):
         scanconf = self.xrmmap['config/scan']
         rowtime = float(scanconf['time1'][()])
@@ -835,6 +1109,55 @@ class GSEXRM_MapFile(object):
         '''read a row worth of raw data from the Map Folder
         returns arrays of data
         '''
+        args = self.rowdata_args(irow, offset=offset)
+        if args is None:
+            return
+        return read_maprow(args)
+
+    def iter_rowdata(self, irows, offset=None, nworkers=1, prefetch=None):
+        '''iterate over rows of raw data, as from read_rowdata(), for
+        row indices irows, in order.
+
+        with nworkers > 1, rows are read by a pool of nworkers processes,
+        with at most prefetch [2*nworkers] rows read ahead of the row
+        being used, to bound memory use.  Row 0 is read first, on its
+        own, as the schema built when it is written (see process_row())
+        may change the settings used to read the other rows.
+        '''
+        if nworkers < 2:
+            for irow in irows:
+                yield self.read_rowdata(irow, offset=offset)
+            return
+        irows = list(irows)
+        if len(irows) > 0 and irows[0] == 0:
+            yield self.read_rowdata(0, offset=offset)
+            irows = irows[1:]
+        if prefetch is None:
+            prefetch = 2*nworkers
+        prefetch = max(1, prefetch)
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=nworkers) as pool:
+            try:
+                for irow in irows:
+                    args = self.rowdata_args(irow, offset=offset)
+                    if args is not None:
+                        args = pool.submit(read_maprow, args)
+                    pending.append(args)
+                    if len(pending) >= prefetch:
+                        row = pending.popleft()
+                        yield None if row is None else row.result()
+                while len(pending) > 0:
+                    row = pending.popleft()
+                    yield None if row is None else row.result()
+            finally:
+                for row in pending:
+                    if row is not None:
+                        row.cancel()
+
+    def rowdata_args(self, irow, offset=None):
+        '''arguments for read_maprow() to read a row worth of raw
+        data from the Map Folder, or None if the row is not available
+        '''
         if self.dimension is None or irow > len(self.rowdata):
             self.read_master()
 
@@ -890,21 +1213,29 @@ class GSEXRM_MapFile(object):
         if offset is not None:
             ioffset = offset
         self.has_xrf = self.has_xrf and xrff != '_unused_'
-        return GSEXRM_MapRow(yval, xrff, xrdf, xpsf, sisf, self.folder,
-                             irow=irow, nrows_expected=self.nrows_expected,
-                             ixaddr=0, dimension=self.dimension,
-                             npts=self.npts,
-                             reverse=reverse,
-                             ioffset=ioffset,
-                             force_no_dtc=self.force_no_dtc,
-                             masterfile=self.masterfile, flip=self.flip,
-                             xrdcal=self.xrdcalfile,
-                             xrd2dmask=self.mask_xrd2d,
-                             xrd2dbkgd=self.bkgd_xrd2d, wdg=self.azwdgs,
-                             steps=self.qstps, has_xrf=self.has_xrf,
-                             has_xrd2d=self.has_xrd2d,
-                             has_xrd1d=self.has_xrd1d)
-
+        return ((yval, xrff, xrdf, xpsf, sisf, self.folder),
+                dict(irow=irow, nrows_expected=self.nrows_expected,
+                     ixaddr=0, dimension=self.dimension,
+                     npts=self.npts,
+                     reverse=reverse,
+                     ioffset=ioffset,
+                     force_no_dtc=self.force_no_dtc,
+                     masterfile=self.masterfile, flip=self.flip,
+                     xrdcal=self.xrdcalfile,
+                     xrd2dmask=self.mask_xrd2d,
+                     xrd2dbkgd=self.bkgd_xrd2d, wdg=self.azwdgs,
+                     steps=self.qstps, has_xrf=self.has_xrf,
+                     has_xrd2d=self.has_xrd2d,
+                     has_xrd1d=self.has_xrd1d))
+
+
+    def get_row_schema(self, use_cache=True):
+        """get GSEXRM_RowSchema of datasets written by add_rowdata(),
+        building it if needed"""
+        if use_cache and self.row_schema is not None:
+            return self.row_schema
+        self.row_schema = GSEXRM_RowSchema(self.xrmmap, self.version)
+        return self.row_schema
 
     def add_rowdata(self, row, callback=None, flush=True):
         '''adds a row worth of real data'''
@@ -924,58 +1255,44 @@ class GSEXRM_MapFile(object):
         print(pform)
 
         dt.add(" ran callback, print, version  %s"  %self.version)
+        schema = self.get_row_schema()
+        dt.add(" got row schema")
 
         if version_ge(self.version, '2.0.0'):
 
-            mcasum_raw,mcasum_cor = [],[]
-            nrows = 0
-            map_items = sorted(self.xrmmap.keys())
-            dt.add(" get %d map items" % len(map_items))
-            for gname in map_items:
-                g = self.xrmmap[gname]
-                if bytes2str(g.attrs.get('type', '')).startswith('scalar detect'):
-                    first_det = list(g.keys())[0]
-                    nrows, npts =  g[first_det].shape
-
-            dt.add(" got %d map items" % len(map_items))
+            nrows = schema.nrows()
+            npts = schema.scalar_npts
             if thisrow >= nrows:
                 self.resize_arrays(NINIT*(1+nrows/NINIT), force_shrink=False)
 
             dt.add(" resized ")
-            sclrgrp = self.xrmmap['scalars']
             for ai, aname in enumerate(row.scaler_names):
-                sclrgrp[aname][thisrow,  :npts] = row.sisdata[:npts].transpose()[ai]
+                schema.scalars[aname][thisrow,  :npts] = row.sisdata[:npts].transpose()[ai]
             dt.add(" add scaler group")
             if self.has_xrf:
 
                 npts = min([len(p) for p in row.posvals])
-                pos    = self.xrmmap['positions/pos']
                 rowpos = np.array([p[:npts] for p in row.posvals])
 
                 tpos = rowpos.transpose()
-                pos[thisrow, :npts, :] = tpos[:npts, :]
+                schema.pos[thisrow, :npts, :] = tpos[:npts, :]
                 nmca, xnpts, nchan = row.counts.shape
-                mca_dets = []
                 dt.add(" map xrf 1")
-                for gname in map_items:
-                    g = self.xrmmap[gname]
-                    if bytes2str(g.attrs.get('type', '')).startswith('mca detect'):
-                        mca_dets.append(gname)
-                        nrows, npts, nchan =  g['counts'].shape
-                dt.add(" map xrf 2")
-                _nr, npts, nchan = self.xrmmap['mcasum']['counts'].shape
+                npts, nchan = schema.mcasum_shape
                 npts = min(npts, xnpts, self.npts)
                 dt.add(" map xrf 3")
-                # print("ADD ROW ", self.all_mcas, mca_dets, self.nmca)
                 if self.all_mcas:
-                    for idet, gname in enumerate(mca_dets):
-                        grp = self.xrmmap[gname]
-                        grp['counts'][thisrow, :npts, :] = row.counts[idet, :npts, :]
-                        grp['dtfactor'][thisrow,  :npts] = row.dtfactor[idet, :npts]
-                        grp['realtime'][thisrow,  :npts] = row.realtime[idet, :npts]
-                        grp['livetime'][thisrow,  :npts] = row.livetime[idet, :npts]
-                        grp['inpcounts'][thisrow, :npts] = row.inpcounts[idet, :npts]
-                        grp['outcounts'][thisrow, :npts] = row.outcounts[idet, :npts]
+                    for idet, dsets in enumerate(schema.mcas):
+                        dsets['counts'][thisrow, :npts, :] = row.counts[idet, :npts, :]
+                        dsets['dtfactor'][thisrow,  :npts] = row.dtfactor[idet, :npts]
+                        dsets['realtime'][thisrow,  :npts] = row.realtime[idet, :npts]
+                        dsets['livetime'][thisrow,  :npts] = row.livetime[idet, :npts]
+                        dsets['inpcounts'][thisrow, :npts] = row.inpcounts[idet, :npts]
+                        dsets['outcounts'][thisrow, :npts] = row.outcounts[idet, :npts]
+                    for idet, integral in enumerate(schema.mca_integrals):
+                        if integral is not None:
+                            dset, step = integral
+                            dset[thisrow, :npts, :] = channel_integral(row.counts[idet, :npts, :], step)
 
                 livetime = np.zeros(npts, dtype=np.float64)
                 realtime = np.zeros(npts, dtype=np.float64)
@@ -983,7 +1300,6 @@ class GSEXRM_MapFile(object):
                 inpcounts = np.zeros(npts, dtype=np.float32)
                 outcounts = np.zeros(npts, dtype=np.float32)
                 dt.add(" map xrf 4a: alloc ")
-                # print("ADD ", inpcounts.dtype, row.inpcounts.dtype)
                 for idet in range(self.nmca):
                     realtime += row.realtime[idet, :npts]
                     livetime += row.livetime[idet, :npts]
@@ -993,165 +1309,88 @@ class GSEXRM_MapFile(object):
                 realtime /= (1.0*self.nmca)
                 dt.add(" map xrf 4b: time sums")
 
-                sumgrp = self.xrmmap['mcasum']
-                sumgrp['counts'][thisrow, :npts, :nchan] = row.total[:npts, :nchan]
+                sumdsets = schema.mcasum
+                sumdsets['counts'][thisrow, :npts, :nchan] = row.total[:npts, :nchan]
+                if schema.mcasum_integral is not None:
+                    dset, step = schema.mcasum_integral
+                    dset[thisrow, :npts, :] = channel_integral(row.total[:npts, :nchan], step)
                 dt.add(" map xrf 4b: set counts")
-                # print("add realtime ", sumgrp['realtime'].shape, self.xrmmap['roimap/det_raw'].shape, thisrow)
-                sumgrp['realtime'][thisrow,  :npts] = realtime
-                sumgrp['livetime'][thisrow,  :npts] = livetime
-                sumgrp['dtfactor'][thisrow,  :npts] = row.total_dtfactor[:npts]
-                sumgrp['inpcounts'][thisrow,  :npts] = inpcounts
-                sumgrp['outcounts'][thisrow,  :npts] = outcounts
+                sumdsets['realtime'][thisrow,  :npts] = realtime
+                sumdsets['livetime'][thisrow,  :npts] = livetime
+                sumdsets['dtfactor'][thisrow,  :npts] = row.total_dtfactor[:npts]
+                sumdsets['inpcounts'][thisrow,  :npts] = inpcounts
+                sumdsets['outcounts'][thisrow,  :npts] = outcounts
                 dt.add(" map xrf 4c: set time data ")
 
                 if version_ge(self.version, '2.1.0'): # version 2.1
-                    det_raw = self.xrmmap['roimap/det_raw']
-                    det_cor = self.xrmmap['roimap/det_cor']
-                    sum_raw = self.xrmmap['roimap/sum_raw']
-                    sum_cor = self.xrmmap['roimap/sum_cor']
-
-                    detraw = list(row.sisdata[:npts].transpose())
-                    detcor = detraw[:]
-                    sumraw = detraw[:]
-                    sumcor = detraw[:]
-
-                    if self.roi_slices is None:
-                        lims = self.xrmmap['config/rois/limits'][()]
-                        nrois, nmca, nx = lims.shape
-
-                        self.roi_slices = []
-                        for iroi in range(nrois):
-                            x = [slice(lims[iroi, i, 0],
-                                       lims[iroi, i, 1]) for i in range(nmca)]
-                            self.roi_slices.append(x)
-
-                    for slices in self.roi_slices:
-                        iraw = [row.counts[i, :npts, slices[i]].sum(axis=1)
-                                for i in range(nmca)]
-                        icor = [row.counts[i, :npts, slices[i]].sum(axis=1)*row.dtfactor[i, :npts]
-                                for i in range(nmca)]
-                        detraw.extend(iraw)
-                        detcor.extend(icor)
-                        sumraw.append(np.array(iraw).sum(axis=0))
-                        sumcor.append(np.array(icor).sum(axis=0))
+                    self._add_roi_rowdata(row, thisrow, npts)
                     dt.add(" map xrf 5a: got simple  ROIS")
-                    det_raw[thisrow, :npts, :] = np.array(detraw).transpose()
-                    det_cor[thisrow, :npts, :] = np.array(detcor).transpose()
-                    sum_raw[thisrow, :npts, :] = np.array(sumraw).transpose()
-                    sum_cor[thisrow, :npts, :] = np.array(sumcor).transpose()
-
 
                 else: # version 2.0
-                    roigrp = self.xrmmap['roimap']
-                    en  = self.xrmmap['mcasum']['energy'][:]
-                    for roiname in roigrp['mcasum'].keys():
-                        en_lim = roigrp['mcasum'][roiname]['limits'][:]
-                        roi_slice = slice(np.abs(en-en_lim[0]).argmin(),
-                                          np.abs(en-en_lim[1]).argmin())
-                        sumraw = roigrp['mcasum'][roiname]['raw'][thisrow,]
-                        sumcor = roigrp['mcasum'][roiname]['cor'][thisrow,]
-                        for detname in mca_dets:
-                            mcaraw = self.xrmmap[detname]['counts'][thisrow,][:,roi_slice].sum(axis=1)
-                            mcacor = mcaraw*self.xrmmap[detname]['dtfactor'][thisrow,]
-                            roigrp[detname][roiname]['raw'][thisrow,] = mcaraw
-                            roigrp[detname][roiname]['cor'][thisrow,] = mcacor
-                            sumraw += mcaraw
-                            sumcor += mcacor
-                        roigrp['mcasum'][roiname]['raw'][thisrow,] = sumraw
-                        roigrp['mcasum'][roiname]['cor'][thisrow,] = sumcor
+                    slices = [r[0] for r in schema.rois]
+                    mcaraw = [roi_sums(dsets['counts'][thisrow,], slices)
+                              for dsets in schema.mcas]
+                    mcacor = [mraw*dsets['dtfactor'][thisrow,][:, np.newaxis]
+                              for mraw, dsets in zip(mcaraw, schema.mcas)]
+                    for iroi, (_sl, sumraw_dset, sumcor_dset, detrois) in enumerate(schema.rois):
+                        sumraw = sumraw_dset[thisrow,]
+                        sumcor = sumcor_dset[thisrow,]
+                        for idet, (raw_dset, cor_dset) in enumerate(detrois):
+                            raw_dset[thisrow,] = mcaraw[idet][:, iroi]
+                            cor_dset[thisrow,] = mcacor[idet][:, iroi]
+                            sumraw += mcaraw[idet][:, iroi]
+                            sumcor += mcacor[idet][:, iroi]
+                        sumraw_dset[thisrow,] = sumraw
+                        sumcor_dset[thisrow,] = sumcor
                 dt.add(" map xrf 6")
         else:  # version 1.0.1
             if self.has_xrf:
                 nmca, xnpts, nchan = row.counts.shape
-                xrm_dets = []
-
-                nrows = 0
-                map_items = sorted(self.xrmmap.keys())
-                for gname in map_items:
-                    g = self.xrmmap[gname]
-                    if bytes2str(g.attrs.get('type', '')).startswith('mca detect'):
-                        xrm_dets.append(g)
-                        nrows, npts, nchan =  g['counts'].shape
 
+                nrows = schema.nrows()
                 if thisrow >= nrows:
                     self.resize_arrays(NINIT*(1+nrows/NINIT), force_shrink=False)
 
-                _nr, npts, nchan = xrm_dets[0]['counts'].shape
+                npts, nchan = schema.mca_shape
                 npts = min(npts, xnpts, self.npts)
-                for idet, grp in enumerate(xrm_dets):
-                    grp['dtfactor'][thisrow,  :npts] = row.dtfactor[idet, :npts]
-                    grp['realtime'][thisrow,  :npts] = row.realtime[idet, :npts]
-                    grp['livetime'][thisrow,  :npts] = row.livetime[idet, :npts]
-                    grp['inpcounts'][thisrow, :npts] = row.inpcounts[idet, :npts]
-                    grp['outcounts'][thisrow, :npts] = row.outcounts[idet, :npts]
-                    grp['counts'][thisrow, :npts, :] = row.counts[idet, :npts, :]
+                for idet, dsets in enumerate(schema.mcas):
+                    dsets['dtfactor'][thisrow,  :npts] = row.dtfactor[idet, :npts]
+                    dsets['realtime'][thisrow,  :npts] = row.realtime[idet, :npts]
+                    dsets['livetime'][thisrow,  :npts] = row.livetime[idet, :npts]
+                    dsets['inpcounts'][thisrow, :npts] = row.inpcounts[idet, :npts]
+                    dsets['outcounts'][thisrow, :npts] = row.outcounts[idet, :npts]
+                    dsets['counts'][thisrow, :npts, :] = row.counts[idet, :npts, :]
 
                 # here, we add the total dead-time-corrected data to detsum.
-                self.xrmmap['detsum']['counts'][thisrow, :npts, :nchan] = row.total[:npts, :nchan]
+                schema.detsum[thisrow, :npts, :nchan] = row.total[:npts, :nchan]
 
-                pos    = self.xrmmap['positions/pos']
                 rowpos = np.array([p[:npts] for p in row.posvals])
 
                 tpos = rowpos.transpose()
 
-                pos[thisrow, :npts, :] = tpos[:npts, :]
+                schema.pos[thisrow, :npts, :] = tpos[:npts, :]
 
                 # now add roi map data
-                roimap = self.xrmmap['roimap']
-                det_raw = roimap['det_raw']
-                det_cor = roimap['det_cor']
-                sum_raw = roimap['sum_raw']
-                sum_cor = roimap['sum_cor']
-
-                detraw = list(row.sisdata[:npts].transpose())
-
-                detcor = detraw[:]
-                sumraw = detraw[:]
-                sumcor = detraw[:]
-
-                if self.roi_slices is None:
-                    lims = self.xrmmap['config/rois/limits'][()]
-                    nrois, nmca, nx = lims.shape
-
-                    self.roi_slices = []
-                    for iroi in range(nrois):
-                        x = [slice(lims[iroi, i, 0],
-                                   lims[iroi, i, 1]) for i in range(nmca)]
-                        self.roi_slices.append(x)
-
-                for slices in self.roi_slices:
-                    iraw = [row.counts[i, :npts, slices[i]].sum(axis=1)
-                            for i in range(nmca)]
-                    icor = [row.counts[i, :npts, slices[i]].sum(axis=1)*row.dtfactor[i, :npts]
-                            for i in range(nmca)]
-                    detraw.extend(iraw)
-                    detcor.extend(icor)
-                    sumraw.append(np.array(iraw).sum(axis=0))
-                    sumcor.append(np.array(icor).sum(axis=0))
-
-                det_raw[thisrow, :npts, :] = np.array(detraw).transpose()
-                det_cor[thisrow, :npts, :] = np.array(detcor).transpose()
-                sum_raw[thisrow, :npts, :] = np.array(sumraw).transpose()
-                sum_cor[thisrow, :npts, :] = np.array(sumcor).transpose()
+                self._add_roi_rowdata(row, thisrow, npts)
 
         if self.has_xrd1d and row.xrdq is not None:
             if thisrow < 2:
                 if len(row.xrdq.shape) == 1:
-                    self.xrmmap['xrd1d/q'][:] = row.xrdq
+                    schema.xrd1d_q[:] = row.xrdq
                 else:
-                    self.xrmmap['xrd1d/q'][:] = row.xrdq[0]
+                    schema.xrd1d_q[:] = row.xrdq[0]
 
             if self.bkgd_xrd1d is not None:
-                self.xrmmap['xrd1d/counts'][thisrow,] = row.xrd1d - self.bkgd_xrd1d
+                schema.xrd1d_counts[thisrow,] = row.xrd1d - self.bkgd_xrd1d
             else:
-                _ni, _nc, _nq  = self.xrmmap['xrd1d/counts'].shape
+                _ni, _nc, _nq  = schema.xrd1d_counts.shape
                 _rc, _rq = row.xrd1d.shape
                 _nc = min(_nc, _rc)
                 _nq = min(_nq, _rq)
-                self.xrmmap['xrd1d/counts'][thisrow, :_nc, :_nq] = row.xrd1d[:_nc,:_nq]
+                schema.xrd1d_counts[thisrow, :_nc, :_nq] = row.xrd1d[:_nc,:_nq]
 
             if self.azwdgs > 1 and row.xrd1d_wdg is not None:
-                for iwdg,wdggrp in enumerate(self.xrmmap['work/xrdwedge'].values()):
+                for iwdg, wdggrp in enumerate(schema.xrd_wedges):
                     try:
                         wdggrp['q'] = row.xrdq_wdg[0,:,iwdg]
                     except:
@@ -1164,20 +1403,60 @@ class GSEXRM_MapFile(object):
 
 
         if self.has_xrd2d and row.xrd2d is not None:
-            self.xrmmap['xrd2d/counts'][thisrow,] = row.xrd2d
+            schema.xrd2d_counts[thisrow,] = row.xrd2d
         dt.add("xrd done")
         self.last_row = thisrow
         self.xrmmap.attrs['Last_Row'] = thisrow
+        self.roimap_cache.discard(lambda key: key[-1] != thisrow)
         #self.h5root.flush()
         # dt.add("flushed h5 file")
         # dt.show()
 
+    def _add_roi_rowdata(self, row, thisrow, npts):
+        '''add ROI sums for one row of XRF data to the roimap/det_raw,
+        det_cor, sum_raw, and sum_cor arrays'''
+        schema = self.get_row_schema()
+        nmca = row.counts.shape[0]
+        detraw = list(row.sisdata[:npts].transpose())
+        detcor = detraw[:]
+        sumraw = detraw[:]
+        sumcor = detraw[:]
+
+        if self.roi_slices is None:
+            lims = self.xrmmap['config/rois/limits'][()]
+            nrois, nmca, nx = lims.shape
+
+            self.roi_slices = []
+            for iroi in range(nrois):
+                x = [slice(lims[iroi, i, 0],
+                           lims[iroi, i, 1]) for i in range(nmca)]
+                self.roi_slices.append(x)
+
+        # all ROIs for each detector from one cumulative sum over channels
+        if len(self.roi_slices) > 0:
+            iraw = np.array([roi_sums(row.counts[i, :npts],
+                                      [slices[i] for slices in self.roi_slices])
+                             for i in range(nmca)])
+            icor = iraw*row.dtfactor[:nmca, :npts, np.newaxis]
+            for iroi in range(len(self.roi_slices)):
+                detraw.extend(iraw[:, :, iroi])
+                detcor.extend(icor[:, :, iroi])
+                sumraw.append(iraw[:, :, iroi].sum(axis=0))
+                sumcor.append(icor[:, :, iroi].sum(axis=0))
+
+        schema.det_raw[thisrow, :npts, :] = np.array(detraw).transpose()
+        schema.det_cor[thisrow, :npts, :] = np.array(detcor).transpose()
+        schema.sum_raw[thisrow, :npts, :] = np.array(sumraw).transpose()
+        schema.sum_cor[thisrow, :npts, :] = np.array(sumcor).transpose()
 
     def build_schema(self, npts, nmca=1, nchan=2048, scaler_names=None,
                      scaler_addrs=None, xrd2d_shape=None, nrows_expected=None,
                      verbose=False):
         '''build schema for detector and scan data'''
         self.t0 = time.time()
+        self.row_schema = None
+        self.detector_list = None
+        self.clear_roimap_cache(reset_stats=False)
         if not self.check_hostid():
             raise GSEXRM_Exception(NOT_OWNER % self.filename)
 
@@ -1246,6 +1525,9 @@ class GSEXRM_MapFile(object):
                                       chunks=self.chunksize[:-1],
                                       maxshape=(None, npts), **self.compress_args)
 
+            # version 2.0 writes each row to the ROI datasets; version 2.1
+            # fills them from det_raw / det_cor when read by get_roimap()
+            roirows = 1 if version_ge(self.version, '2.1.0') else NSTART
             roishape = conf['rois/name'].shape
             if roishape[0] > 0:
                 roi_names = [h5str(s) for s in conf['rois/name']]
@@ -1290,7 +1572,7 @@ class GSEXRM_MapFile(object):
                         rgrp = dgrp.create_group(rname)
                         for aname,dtype in (('raw', np.uint32),
                                             ('cor', np.float32)):
-                            rgrp.create_dataset(aname, (1, npts), dtype,
+                            rgrp.create_dataset(aname, (roirows, npts), dtype,
                                                 chunks=self.chunksize[:-1],
                                                 maxshape=(None, npts), **self.compress_args)
 
@@ -1327,12 +1609,18 @@ class GSEXRM_MapFile(object):
                                     maxshape=(None, npts), **self.compress_args)
 
 
+            if self.integral_cube:
+                for gname, grp in xrmmap.items():
+                    gtype = bytes2str(grp.attrs.get('type', ''))
+                    if gtype.startswith(('mca detect', 'virtual mca')) and 'counts' in grp:
+                        self._create_integral(grp)
+
             dgrp = xrmmap['roimap']['mcasum']
             for rname, rlimit in zip(roi_names, roi_limits[0]):
                 rgrp = dgrp.create_group(rname)
                 for aname,dtype in (('raw', np.uint32),
                                     ('cor', np.float32)):
-                    rgrp.create_dataset(aname, (1, npts), dtype,
+                    rgrp.create_dataset(aname, (roirows, npts), dtype,
                                         chunks=self.chunksize[:-1],
                                         maxshape=(None, npts), **self.compress_args)
                 rlimit = [max(0, rlimit[0]), min(len(enarr[0])-1, rlimit[1])]
@@ -1565,6 +1853,7 @@ class GSEXRM_MapFile(object):
             try:
                 xrd1dgrp.attrs['type'] = 'xrd1d detector'
                 xrd1dgrp.attrs['desc'] = 'pyFAI calculation from xrd2d data'
+                self.row_schema = None
                 xrd1dgrp.create_dataset('q',          (self.qstps,), np.float32)
                 xrd1dgrp.create_dataset('background', (self.qstps,), np.float32)
 
@@ -1731,6 +2020,7 @@ class GSEXRM_MapFile(object):
         "resize all arrays for new nrow size"
         if not self.check_hostid():
             raise GSEXRM_Exception(NOT_OWNER % self.filename)
+        self.clear_roimap_cache(reset_stats=False)
         if version_ge(self.version, '2.0.0'):
 
             g = self.xrmmap['positions/pos']
@@ -1752,6 +2042,9 @@ class GSEXRM_MapFile(object):
                         for aname in ('livetime', 'realtime',
                                       'inpcounts', 'outcounts', 'dtfactor'):
                             g[aname].resize((nrow, npts))
+                        if INTEGRAL_NAME in g:
+                            oldnrow, npts, nbins = g[INTEGRAL_NAME].shape
+                            g[INTEGRAL_NAME].resize((nrow, npts, nbins))
                     elif type_attr.startswith('virtual mca'):
                         oldnrow, npts, nchan = g['counts'].shape
                         g['counts'].resize((nrow, npts, nchan))
@@ -1759,7 +2052,9 @@ class GSEXRM_MapFile(object):
                                       'inpcounts', 'outcounts', 'dtfactor'):
                             if aname in g:
                                 g[aname].resize((nrow, npts))
-
+                        if INTEGRAL_NAME in g:
+                            oldnrow, npts, nbins = g[INTEGRAL_NAME].shape
+                            g[INTEGRAL_NAME].resize((nrow, npts, nbins))
                     elif type_attr.startswith('xrd2d'):
                         oldnrow, npts, xpixx, xpixy = g['counts'].shape
                         g['counts'].resize((nrow, npts, xpixx, xpixy))
@@ -2910,9 +3205,12 @@ class GSEXRM_MapFile(object):
         if roiname in roigrp_xrd1d:
             del roigrp_xrd1d[roiname]
             self.h5root.flush()
+        self.discard_roimaps(roiname)
 
 
     def save_roi(self,roiname,det, raw, cor, drange, dtype, units):
+        self.row_schema = None
+        self.discard_roimaps(roiname)
         ds = ensure_subgroup(roiname, self.xrmmap['roimap'][det])
         ds.create_dataset('raw',    data=raw   )
         ds.create_dataset('cor',    data=cor   )
@@ -2968,10 +3266,10 @@ class GSEXRM_MapFile(object):
 
             roi_limits += [[int(imin), int(imax)]]
             dtfctrs += [xrmdet['dtfactor']]
-            icounts += [np.array(xrmdet['counts'][:])]
+            icounts += [self._channel_sums(xrmdet, int(imin), int(imax))]
 
-        detraw = [icnt[:,:,slice(*islc)].sum(axis=2)        for icnt,islc        in zip(icounts,roi_limits)]
-        detcor = [icnt[:,:,slice(*islc)].sum(axis=2)*dtfctr for icnt,islc,dtfctr in zip(icounts,roi_limits,dtfctrs)]
+        detraw = icounts
+        detcor = [icnt*dtfctr for icnt, dtfctr in zip(icounts, dtfctrs)]
         detraw = np.einsum('kij->ijk', detraw)
         detcor = np.einsum('kij->ijk', detcor)
 
@@ -3059,7 +3357,7 @@ class GSEXRM_MapFile(object):
 
 
     def get_roimap(self, roiname, det=None, hotcols=None, zigzag=None,
-                   dtcorrect=None, minval=None, maxval=None):
+                   dtcorrect=None, minval=None, maxval=None, use_cache=True):
         '''extract roi map for a pre-defined roi by name
         Parameters
         ---------
@@ -3069,10 +3367,17 @@ class GSEXRM_MapFile(object):
         hotcols    :  optional, bool [None]   suppress hot columns
         minval:     float, trim to minimum value
         maxval:     float, trim to maximum value
+        use_cache  :  optional, bool [True]   use cached map if available
 
         Returns
         -------
         ndarray for ROI data
+
+        Notes
+        -----
+        Maps are cached in memory by ROI name, detector, dtcorrect, hotcols,
+        and zigzag (see roimap_cache_stats()).  Cached maps are discarded
+        when rows are added or the ROI is saved or deleted.
         '''
         if hotcols is None:
             hotcols = self.hotcols
@@ -3093,6 +3398,23 @@ class GSEXRM_MapFile(object):
                 out = out[1:-1]
             return out
 
+        key = (h5str(roiname), det, bool(dtcorrect), bool(hotcols), zigzag,
+               self.last_row)
+        out = self.roimap_cache.get(key) if use_cache else None
+        if out is None:
+            out = self._read_roimap(roiname, det, hotcols, zigzag, dtcorrect)
+            out.setflags(write=False)
+            self.roimap_cache.put(key, out)
+        out = out.copy()
+        if minval is not None:
+            out[np.where(out<minval)] = minval
+        if maxval is not None:
+            out[np.where(out>maxval)] = maxval
+        return out
+
+    def _read_roimap(self, roiname, det, hotcols, zigzag, dtcorrect):
+        '''read roi map from file, for get_roimap()'''
+        nrow, ncol, npos = self.xrmmap['positions']['pos'].shape
         roi, detaddr = self.check_roi(roiname, det)
         ext = ''
         if detaddr.startswith('roimap'):
@@ -3113,6 +3435,7 @@ class GSEXRM_MapFile(object):
                 out = self.xrmmap[detaddr][roiaddr][:]
             except (KeyError, OSError):
                 _roiname, _roic = roiaddr.split('/')
+                self.row_schema = None
                 try:
                     del self.xrmmap[detaddr][_roiname]
                 except:
@@ -3129,12 +3452,18 @@ class GSEXRM_MapFile(object):
 
                 out = np.zeros([1, ncol])
             # print("found roi data ", out.shape, nrow, ncol)
-            if version_ge(self.version, '2.1.0') and out.shape != (nrow, ncol):
-                _roi, _detaddr = self.check_roi(roiname, det, version='1.0.0')
-                detname = '%s%s' % (_detaddr, ext)
-                out = self.xrmmap[detname][:, :, _roi]
-                self.xrmmap[detaddr][roiaddr].resize((nrow, ncol))
-                self.xrmmap[detaddr][roiaddr][:, :] = out
+            # version 2.1: copy from det_raw / det_cor, and copy again
+            # when rows have been added since the last copy
+            if version_ge(self.version, '2.1.0'):
+                dset = self.xrmmap[detaddr][roiaddr]
+                copied_row = dset.attrs.get('last_row', self.last_row)
+                if out.shape != (nrow, ncol) or copied_row != self.last_row:
+                    _roi, _detaddr = self.check_roi(roiname, det, version='1.0.0')
+                    detname = '%s%s' % (_detaddr, ext)
+                    out = self.xrmmap[detname][:, :, _roi]
+                    dset.resize((nrow, ncol))
+                    dset[:, :] = out
+                    dset.attrs['last_row'] = self.last_row
 
         else:  # version1
             if det in EXTRA_DETGROUPS:
@@ -3148,20 +3477,68 @@ class GSEXRM_MapFile(object):
             out = remove_zigzag(out, zigzag)
         elif hotcols:
             out = out[:, 1:-1]
-        if minval is not None:
-            out[np.where(out<minval)] = minval
-        if maxval is not None:
-            out[np.where(out>maxval)] = maxval
-        return out
+        return np.ascontiguousarray(out)
+
+    def roimap_cache_stats(self):
+        '''return dict of statistics for the cache of ROI maps:
+        hits, misses, hit_rate, size, maxsize, nbytes, maxbytes'''
+        return self.roimap_cache.stats()
+
+    def clear_roimap_cache(self, reset_stats=True):
+        '''remove all cached ROI maps'''
+        self.roimap_cache.clear(reset_stats=reset_stats)
+
+    def discard_roimaps(self, roiname):
+        '''remove cached ROI maps for an ROI name, for all detectors'''
+        roiname = h5str(roiname).lower()
+        self.roimap_cache.discard(lambda key: key[0].lower() == roiname)
 
 
     def get_mca_erange(self, det=None, dtcorrect=None,
                        emin=None, emax=None, by_energy=True):
-        '''extract map for an ROI set here, by energy range:
+        '''extract map of counts summed over an energy range
+
+        Parameters
+        ---------
+        det        :  str or int [None]         detector name or number,
+                                                None for sum of detectors
+        dtcorrect  :  optional, bool [None]     dead-time correct data
+                                                for a single detector
+        emin, emax :  float [None]              energy range (in keV), or
+                                                channels if by_energy is False
+        by_energy  :  bool [True]               whether emin, emax are
+                                                energies or channels
+
+        Returns
+        -------
+        ndarray for map data
 
-        not implemented
+        Notes
+        -----
+        With an integral cube (see build_integral_cube()), the map is
+        the difference of two channel slices of the cube, with channels
+        rounded to the step of the cube.  Otherwise, the MCA counts are
+        summed over the channel range.
         '''
-        pass
+        if dtcorrect is None:
+            dtcorrect = self.dtcorrect
+        det = self.get_detname(det)
+        dgroup = self.xrmmap[det]
+        nchan = dgroup['counts'].shape[2]
+        if by_energy:
+            en = dgroup['energy'][()]
+            imin = 0 if emin is None else int(np.abs(en-emin).argmin())
+            imax = nchan if emax is None else int(np.abs(en-emax).argmin())+1
+        else:
+            imin = 0 if emin is None else int(emin)
+            imax = nchan if emax is None else int(emax)
+        imin = max(0, min(nchan, imin))
+        imax = max(imin, min(nchan, imax))
+
+        out = self._channel_sums(dgroup, imin, imax, exact=False)
+        if dtcorrect and 'sum' not in det and 'dtfactor' in dgroup:
+            out = out*dgroup['dtfactor'][()]
+        return out
 
     def get_rgbmap(self, rroi, groi, broi, det=None, rdet=None, gdet=None, bdet=None,
                    hotcols=None, dtcorrect=None, scale_each=True, scales=None):
@@ -3250,12 +3627,13 @@ class GSEXRM_MapFile(object):
 
     def del_roi(self, name):
         ''' delete an ROI'''
-        roi_names = [i.lower().strip() for i in self.xrmmap['config/rois/name']]
+        roi_names = [h5str(i).lower().strip() for i in self.xrmmap['config/rois/name']]
         if name.lower().strip() not in roi_names:
             print("No ROI named '%s' found to delete" % name)
             return
         iroi = roi_names.index(name.lower().strip())
-        roi_names = [i in self.xrmmap['config/rois/name']]
+        self.discard_roimaps(name)
+        roi_names = [h5str(i) for i in self.xrmmap['config/rois/name']]
         roi_names.pop(iroi)
 
 
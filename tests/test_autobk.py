@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+tests of autobk background removal
+"""
+import unittest
+from pathlib import Path
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch import Group
+from larch.io import read_ascii
+from larch.xafs import (autobk, autobk_batch, pre_edge, pre_edge_batch,
+                        find_e0, find_e0_batch, estimate_noise,
+                        estimate_noise_batch, mback_norm, mback_norm_batch,
+                        xraydb_cache_stats)
+
+DATADIR = Path(__file__).parent.parent / 'examples' / 'xafsdata'
+
+class Autobk_Test(unittest.TestCase):
+    def setUp(self):
+        self.data = read_ascii((DATADIR / 'cu_metal_rt.xdi').as_posix())
+
+    def run_autobk(self, **kws):
+        dat = self.data
+        grp = Group()
+        autobk(dat.energy, dat.mutrans, group=grp, **kws)
+        return grp
+
+    def test_linear_noclamp(self):
+        kws = dict(rbkg=1.1, kweight=1, nclamp=0)
+        lin = self.run_autobk(linear=True, **kws)
+        nonlin = self.run_autobk(linear=False, **kws)
+        self.assertEqual(lin.autobk_details.nfev, 1)
+        assert_allclose(lin.chi, nonlin.chi, atol=1.e-9)
+        assert_allclose(lin.bkg, nonlin.bkg, rtol=1.e-9)
+        assert_allclose(lin.delta_chi, nonlin.delta_chi, rtol=1.e-6)
+        assert_allclose(lin.autobk_details.chisqr,
+                        nonlin.autobk_details.chisqr, rtol=1.e-8)
+
+    def test_linear_clamps(self):
+        for kws in (dict(rbkg=1.0, kweight=2),
+                    dict(rbkg=0.9, kweight=2, clamp_lo=5, clamp_hi=20)):
+            lin = self.run_autobk(linear=True, **kws)
+            nonlin = self.run_autobk(linear=False, **kws)
+            self.assertTrue(lin.autobk_details.chisqr <=
+                            nonlin.autobk_details.chisqr*(1+1.e-6))
+            assert_allclose(lin.chi, nonlin.chi, atol=5.e-3)
+            assert_allclose(lin.delta_chi, nonlin.delta_chi,
+                            rtol=0.1, atol=1.e-4)
+
+class Batch_Test(unittest.TestCase):
+    def setUp(self):
+        dat = read_ascii((DATADIR / 'cu_metal_rt.xdi').as_posix())
+        rng = np.random.RandomState(3)
+        self.energy = dat.energy
+        self.mu = np.array([dat.mutrans*(1+0.02*np.sin(i/3.)) + 0.002*i +
+                            rng.normal(scale=2.e-4, size=len(dat.energy))
+                            for i in range(8)])
+
+    def test_pre_edge_batch(self):
+        grp = Group()
+        pre_edge_batch(self.energy, self.mu, group=grp)
+        self.assertEqual(grp.norm.shape, self.mu.shape)
+        self.assertEqual(grp.pre_edge_details.nspectra, len(self.mu))
+        self.assertTrue(grp.pre_edge_details.spectra_per_sec > 0)
+        for i in (0, 5):
+            one = Group()
+            pre_edge(self.energy, self.mu[i], group=one)
+            self.assertEqual(grp.e0[i], one.e0)
+            assert_allclose(grp.edge_step[i], one.edge_step, rtol=1.e-10)
+            assert_allclose(grp.norm[i], one.norm, rtol=1.e-8, atol=1.e-10)
+            assert_allclose(grp.flat[i], one.flat, atol=1.e-5)
+
+    def test_autobk_batch(self):
+        grp = Group()
+        autobk_batch(self.energy, self.mu, group=grp, rbkg=1.0, kweight=2,
+                     calc_uncertainties=True)
+        self.assertEqual(grp.chi.shape[0], len(self.mu))
+        self.assertEqual(grp.delta_chi.shape, grp.chi.shape)
+        self.assertTrue(grp.autobk_details.spectra_per_sec > 0)
+        for i in (0, 7):
+            one = Group()
+            autobk(self.energy, self.mu[i], group=one, rbkg=1.0, kweight=2)
+            assert_allclose(grp.chi[i][:len(one.chi)], one.chi, atol=1.e-6)
+            assert_allclose(grp.bkg[i], one.bkg, rtol=1.e-6)
+
+    def test_autobk_batch_pool(self):
+        grp1, grp2 = Group(), Group()
+        autobk_batch(self.energy, self.mu, group=grp1, rbkg=1.0, e0=8980.0)
+        autobk_batch(self.energy, self.mu, group=grp2, rbkg=1.0, e0=8980.0,
+                     nworkers=2, warm_start=False)
+        self.assertEqual(grp2.autobk_details.nworkers, 2)
+        assert_allclose(grp1.chi, grp2.chi, atol=1.e-6)
+
+    def test_find_e0_batch(self):
+        rng = np.random.RandomState(7)
+        mu = np.concatenate((self.mu, self.mu[:4] +
+                             rng.normal(scale=0.05, size=(4, len(self.energy)))))
+        e0 = find_e0_batch(self.energy, mu)
+        self.assertEqual(e0.shape, (len(mu),))
+        for i in range(len(mu)):
+            self.assertEqual(e0[i], find_e0(self.energy, mu[i]))
+        energy = np.array([self.energy + 2.0*i for i in range(len(mu))])
+        assert_allclose(find_e0_batch(energy, mu), e0 + 2.0*np.arange(len(mu)))
+
+    def test_estimate_noise_batch(self):
+        grp = Group()
+        autobk_batch(self.energy, self.mu, group=grp, rbkg=1.0, kweight=2,
+                     e0=8980.0, calc_noise=True)
+        self.assertEqual(grp.epsilon_k.shape, (len(self.mu),))
+        batch = Group()
+        estimate_noise_batch(grp.k, grp.chi, group=batch, kweight=2, kmax=15)
+        for i in (0, 3, 7):
+            one = Group()
+            estimate_noise(grp.k, grp.chi[i], group=one, kweight=2, kmax=15)
+            assert_allclose(batch.epsilon_k[i], one.epsilon_k, rtol=1.e-10)
+            assert_allclose(batch.epsilon_r[i], one.epsilon_r, rtol=1.e-10)
+            self.assertEqual(batch.kmax_suggest[i], one.kmax_suggest)
+
+    def test_mback_norm_batch(self):
+        pre_kws = dict(pre1=-150, pre2=-30, norm1=150, nnorm=2)
+        grp = Group()
+        pre_edge_batch(self.energy, self.mu, group=grp, **pre_kws)
+        mback_norm_batch(self.energy, self.mu, group=grp, z=29, edge='K',
+                         **pre_kws)
+        self.assertEqual(grp.norm_mback.shape, self.mu.shape)
+        self.assertFalse(grp.mback_params.failed.any())
+        nhits = xraydb_cache_stats()['hits']
+        for i in (0, 6):
+            one = Group(energy=self.energy, mu=self.mu[i])
+            pre_edge(one, **pre_kws)
+            mback_norm(one, z=29, edge='K', **pre_kws)
+            assert_allclose(grp.edge_step[i], one.edge_step, rtol=1.e-8)
+            assert_allclose(grp.norm[i], one.norm, rtol=1.e-8, atol=1.e-10)
+        self.assertEqual(xraydb_cache_stats()['hits'], nhits + 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+tests of energy-dependent convolution
+"""
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch.math.lineshapes import gaussian, lorentzian
+from larch.math.convolution1D import (conv, conv_matrix, conv_uniform,
+                                      get_ene_index, lin_gamma, atan_gamma)
+
+def conv_loop(e, mu, kernel='gaussian', fwhm_e=None, efermi=None):
+    """python 3 version of the original per-point loop"""
+    f = np.copy(mu)
+    z = np.zeros_like(f)
+    if efermi is not None:
+        ief = np.argmin(np.abs(e-efermi))
+        f[0:ief] *= 0
+    lpf = len(e)//2
+    cpf = np.polyfit(e[-lpf:], f[-lpf:], 1)
+    fpf = np.poly1d(cpf)
+    estep = (e[-1] - e[-2])
+    eup = np.append(e, np.arange(e[-1]+estep, e[-1]+3*fwhm_e[-1], estep))
+    for n in range(len(f)):
+        eimin, eimax = get_ene_index(eup, eup[n], 1.5*fwhm_e[n])
+        if len(range(eimin, eimax)) % 2 == 0:
+            kx = eup[eimin:eimax+1]
+        else:
+            kx = eup[eimin:eimax]
+        hwhm = fwhm_e[n]/2.0
+        if ('gauss' in kernel.lower()):
+            ky = gaussian(kx, center=eup[n], sigma=hwhm)
+        else:
+            ky = lorentzian(kx, center=eup[n], sigma=hwhm)
+        ky = ky/ky.sum()
+        zn = 0
+        lk = len(kx)
+        for mf, mg in zip(range(-(lk//2), (lk//2)+1), range(lk)):
+            if ((n+mf) >= 0) and ((n+mf) < len(f)):
+                zn += f[n+mf] * ky[mg]
+            elif ((n+mf) >= 0):
+                zn += fpf(eup[n+mf]) * ky[mg]
+        z[n] = zn
+    return z
+
+class Convolution_Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(2)
+        self.energy = np.linspace(-20, 80, 401)
+        self.mu = (np.tanh(self.energy/3) + 0.3*np.exp(-(self.energy-10)**2/4) +
+                   0.01*rng.normal(size=len(self.energy)))
+
+    def test_conv(self):
+        en = self.energy
+        for kernel in ('gaussian', 'lorentzian'):
+            for fwhm in (lin_gamma(en, 1.0, [4.0, 10, 50]),
+                         atan_gamma(en, 1.5, 8, 20, 5)):
+                for efermi in (None, 0.0):
+                    ref = conv_loop(en, self.mu, kernel, fwhm, efermi)
+                    out = conv(en, self.mu, kernel, fwhm, efermi)
+                    assert_allclose(out, ref, rtol=1.e-12, atol=1.e-12)
+
+    def test_conv_stack(self):
+        fwhm = atan_gamma(self.energy, 1.5, 8, 20, 5)
+        stack = np.array([self.mu, 2*self.mu, self.mu[::-1]])
+        out = conv(self.energy, stack, 'lorentzian', fwhm)
+        self.assertEqual(out.shape, stack.shape)
+        for row, mu in zip(out, stack):
+            assert_allclose(row, conv(self.energy, mu, 'lorentzian', fwhm))
+        cmat = conv_matrix(self.energy, fwhm, 'lorentzian')
+        self.assertTrue(cmat is conv_matrix(self.energy, fwhm.copy(), 'lorentzian'))
+
+    def test_conv_uniform(self):
+        kern = lorentzian(np.arange(300)*0.1, center=0, sigma=1.0)
+        ref = np.convolve(self.mu, kern, mode='full')[:len(self.mu)]
+        assert_allclose(conv_uniform(self.mu, kern), ref, atol=1.e-12)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+tests of Kramers-Kronig transforms for diffkk
+"""
+import unittest
+from pathlib import Path
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch.io import read_ascii
+from larch.xafs import diffkk
+from larch.xafs.diffkk import (kkmclf, kkmclr, kkmclf_sca, kkmclr_sca,
+                               kkmclf_fft, kkmclr_fft)
+
+DATADIR = Path(__file__).parent.parent / 'examples' / 'xafsdata'
+
+class KKTransform_Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(11)
+        self.energy = np.linspace(8800, 9400, 300)
+        self.fpp = (np.exp(-((self.energy - 9000)/40)**2) +
+                    0.1*rng.normal(size=len(self.energy)))
+
+    def test_reverse(self):
+        ref = np.array(kkmclr_sca(self.energy, self.fpp))
+        scale = abs(ref).max()
+        assert_allclose(kkmclr(self.energy, self.fpp), ref, atol=1.e-12*scale)
+        assert_allclose(kkmclr_fft(self.energy, self.fpp), ref, atol=1.e-11*scale)
+
+    def test_forward(self):
+        ref = np.array(kkmclf_sca(self.energy, self.fpp))
+        scale = abs(ref).max()
+        assert_allclose(kkmclf(self.energy, self.fpp), ref, atol=1.e-12*scale)
+        assert_allclose(kkmclf_fft(self.energy, self.fpp), ref, atol=1.e-11*scale)
+
+    def test_odd_length(self):
+        self.assertRaises(ValueError, kkmclr_fft, self.energy[:-1], self.fpp[:-1])
+
+    def test_diffkk_fft(self):
+        dat = read_ascii((DATADIR / 'cu_metal_rt.xdi').as_posix())
+        dkk = diffkk(dat.energy, dat.mutrans, z=29, edge='K')
+        dkk.kk(how='vector')
+        fp_vector = dkk.fp.copy()
+        dkk.kk(how='fft')
+        assert_allclose(dkk.fp, fp_vector, atol=1.e-9)
+
+if __name__ == '__main__':
+    unittest.main()
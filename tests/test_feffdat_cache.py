@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+tests of the on-disk cache of parsed feffNNNN.dat files
+"""
+import unittest
+import shutil
+import tempfile
+from glob import glob
+from pathlib import Path
+from numpy.testing import assert_allclose
+
+from larch.xafs import feffpath, ff2chi
+from larch.xafs.feffdat import FeffDatFile
+from larch.xafs.feffcache import (FeffDatCache, get_feffdat_cache,
+                                  set_feffdat_cache)
+
+FEFFDIR = Path(__file__).parent.parent / 'examples' / 'feffit' / 'Feff_Cu'
+
+class FeffDatCache_Test(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = FeffDatCache(folder=self.folder)
+        self.fname = (FEFFDIR / 'feff0002.dat').as_posix()
+
+    def tearDown(self):
+        set_feffdat_cache(None)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_process_cache(self):
+        # off by default: reading paths writes no cache files
+        self.assertIsNone(get_feffdat_cache())
+        feffpath(self.fname)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+        set_feffdat_cache(self.folder)
+        self.assertEqual(get_feffdat_cache().folder, self.cache.folder)
+        path1 = feffpath(self.fname, sigma2=0.003)
+        path2 = feffpath(self.fname, sigma2=0.003)
+        self.assertEqual(self.cache.stats()['size'], 1)
+        self.assertEqual(get_feffdat_cache().hits, 1)
+        self.assertIsNone(FeffDatFile(self.fname, cache=None).spline_tck)
+        self.assertIsNotNone(path2._feffdat.spline_tck)
+        ff2chi([path1])
+        ff2chi([path2])
+        assert_allclose(path1.chi, path2.chi, rtol=1.e-12)
+
+    def test_cached_read(self):
+        plain = FeffDatFile(self.fname, cache=None)
+        first = FeffDatFile(self.fname, cache=self.cache)
+        cached = FeffDatFile(self.fname, cache=self.cache)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+        for attr in ('title', 'potentials', 'geom', 'degen', 'reff', 'nleg',
+                     'edge', 'gam_ch', 'exch', 'mu', 'kf', 'rmass'):
+            self.assertEqual(getattr(plain, attr), getattr(cached, attr))
+        for attr in ('k', 'pha', 'amp', 'rep', 'lam', 'real_phc'):
+            assert_allclose(getattr(plain, attr), getattr(cached, attr), rtol=0)
+        path1 = feffpath(self.fname, sigma2=0.003)
+        path1._feffdat = plain
+        path1.create_spline_coefs()
+        path2 = feffpath(self.fname, sigma2=0.003)
+        path2._feffdat = cached
+        path2.create_spline_coefs()
+        ff2chi([path1])
+        ff2chi([path2])
+        assert_allclose(path1.chi, path2.chi, rtol=1.e-12)
+
+    def test_evict_and_prewarm(self):
+        nnew = self.cache.prewarm(FEFFDIR.as_posix(), nworkers=2)
+        nfiles = len(glob((FEFFDIR / 'feff*.dat').as_posix()))
+        self.assertEqual(nnew, nfiles)
+        self.assertEqual(self.cache.stats()['size'], nfiles)
+        self.assertEqual(self.cache.prewarm(FEFFDIR.as_posix(), nworkers=1), 0)
+        nbytes = self.cache.nbytes
+        self.cache.evict(maxbytes=nbytes//2)
+        self.assertTrue(self.cache.nbytes <= nbytes//2)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+tests of feffit worker pools, bootstrap uncertainties and chi-square maps
+"""
+import pickle
+import unittest
+import shutil
+import tempfile
+from multiprocessing import get_context
+from glob import glob
+from pathlib import Path
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch import Interpreter
+from larch.io import read_ascii
+from larch.fitting import param_group, guess, chi2_map_waves
+from larch.xafs import (feffpath, autobk, feffit_transform, feffit_dataset,
+                        feffit, feffit_bootstrap, feffit_chi2_map)
+from larch.xafs.feffit import FeffitResidualPool
+
+EXAMPLES = Path(__file__).parent.parent / 'examples'
+FEFFDIR = EXAMPLES / 'feffit' / 'Feff_Cu'
+
+def read_cu_data():
+    data = read_ascii((EXAMPLES / 'xafsdata' / 'cu_metal_rt.xdi').as_posix())
+    autobk(data.energy, data.mutrans, group=data, rbkg=1.0, kw=2)
+    return data
+
+class FeffitResidualPool_Test(unittest.TestCase):
+    def setUp(self):
+        self.pars = param_group(amp=guess(0.9), del_e0=guess(2.0),
+                                del_e1=guess(-1.0), sig2=guess(0.004),
+                                alpha=guess(0.002), c3=guess(1.e-4))
+        self.data = read_cu_data()
+
+    def make_paths(self):
+        paths = []
+        for i, fname in enumerate(sorted(glob((FEFFDIR / 'feff00*.dat').as_posix()))):
+            e0 = 'del_e0' if i % 3 else 'del_e1'
+            paths.append(feffpath(fname, s02='amp', e0=e0, sigma2='sig2',
+                                  deltar='alpha*reff', third='c3'))
+        return paths
+
+    def test_residual_pool(self):
+        params = self.pars.__params__
+        datasets = []
+        for kmax in (12, 14, 16):
+            trans = feffit_transform(kmin=3, kmax=kmax, kw=2, rmin=1.4, rmax=4.5)
+            dset = feffit_dataset(data=self.data, paths=self.make_paths(),
+                                  transform=trans)
+            dset.prepare_fit(params)
+            datasets.append(dset)
+        serial = np.concatenate([d._residual(self.pars) for d in datasets])
+        for executor in ('thread', 'process'):
+            pool = FeffitResidualPool(datasets, nworkers=2, executor=executor)
+            assert_allclose(serial, pool.residual(self.pars))
+            pool.close()
+
+    def test_residual_pool_spawn(self):
+        # transforms made in a larch session hold the session
+        session = Interpreter()
+        params = self.pars.__params__
+        datasets = []
+        for kmax in (12, 14):
+            trans = feffit_transform(kmin=3, kmax=kmax, kw=2, rmin=1.4, rmax=4.5,
+                                     _larch=session)
+            dset = feffit_dataset(data=self.data, paths=self.make_paths(),
+                                  transform=trans, _larch=session)
+            dset.prepare_fit(params)
+            datasets.append(dset)
+        trans = pickle.loads(pickle.dumps(datasets[0].transform))
+        self.assertIsNone(trans._larch)
+        self.assertIs(datasets[0].transform._larch, session)
+        serial = np.concatenate([d._residual(self.pars) for d in datasets])
+        pool = FeffitResidualPool(datasets, nworkers=2, executor='process',
+                                  mp_context=get_context('spawn'))
+        assert_allclose(serial, pool.residual(self.pars))
+        pool.close()
+
+class FeffitRefit_Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        data = read_cu_data()
+        pars = param_group(amp=guess(0.9), del_e0=guess(2.0),
+                           sig2=guess(0.005), alpha=guess(0.0))
+        paths = [feffpath(fname, s02='amp', e0='del_e0', sigma2='sig2',
+                          deltar='alpha*reff')
+                 for fname in sorted(glob((FEFFDIR / 'feff000*.dat').as_posix()))]
+        # transforms made in a larch session hold the session
+        session = Interpreter()
+        trans = feffit_transform(kmin=3, kmax=14, kw=2, dk=4, rmin=1.4, rmax=4.0,
+                                 _larch=session)
+        dset = feffit_dataset(data=data, paths=paths, transform=trans,
+                              _larch=session)
+        cls.result = feffit(pars, dset, _larch=session)
+        cls.folder = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder, ignore_errors=True)
+
+    def test_bootstrap(self):
+        boot = feffit_bootstrap(self.result, nsamples=8, seed=1)
+        self.assertEqual(boot.names[:4], self.result.var_names)
+        self.assertEqual(boot.samples.shape, (8, len(boot.names)))
+        self.assertTrue(boot.success.all())
+        self.assertEqual(boot.correl.shape, (4, 4))
+        assert_allclose(np.diag(boot.correl), 1.0)
+        for i, name in enumerate(boot.var_names):
+            par = self.result.params[name]
+            self.assertTrue(abs(boot.mean[i] - par.value) < 5*par.stderr)
+            self.assertTrue(0 < boot.std[i] < 5*par.stderr)
+
+        again = feffit_bootstrap(self.result, nsamples=8, seed=1, nworkers=2)
+        assert_allclose(again.samples, boot.samples, rtol=0)
+        other = feffit_bootstrap(self.result, nsamples=8, seed=2)
+        self.assertTrue(abs(other.samples - boot.samples).max() > 0)
+
+    def test_bootstrap_spawn(self):
+        boot = feffit_bootstrap(self.result, nsamples=4, seed=3)
+        spawned = feffit_bootstrap(self.result, nsamples=4, seed=3, nworkers=2,
+                                   mp_context=get_context('spawn'))
+        assert_allclose(spawned.samples, boot.samples, rtol=0)
+
+    def test_noise_checkpoint(self):
+        fname = Path(self.folder, 'boot.npz').as_posix()
+        boot = feffit_bootstrap(self.result, nsamples=6, method='noise',
+                                seed=5, checkpoint=fname)
+        # simulate an interrupted run, then resume
+        with np.load(fname) as npz:
+            saved = {key: npz[key] for key in npz.files}
+        saved['done'][3:] = False
+        saved['samples'][3:] = 0
+        np.savez(fname, **saved)
+        resumed = feffit_bootstrap(self.result, nsamples=6, method='noise',
+                                   seed=5, checkpoint=fname)
+        assert_allclose(resumed.samples, boot.samples, rtol=0)
+        with self.assertRaises(ValueError):
+            feffit_bootstrap(self.result, nsamples=6, method='noise',
+                             seed=6, checkpoint=fname)
+
+    def test_chi2_map_waves(self):
+        waves = chi2_map_waves(np.arange(5), np.arange(4), 1.1, 2.0)
+        self.assertEqual(waves[0], [(1, 2, None, None)])
+        self.assertEqual(sum(len(w) for w in waves), 20)
+        done = {(1, 2)}
+        for wave in waves[1:]:
+            for ix, iy, sx, sy in wave:
+                self.assertTrue((sx, sy) in done)
+                self.assertEqual(max(abs(ix-sx), abs(iy-sy)), 1)
+            done.update((ix, iy) for ix, iy, sx, sy in wave)
+
+    def test_chi2_map(self):
+        calls = []
+        xpts, ypts, cmap = feffit_chi2_map(self.result, 'del_e0', 'sig2', nx=5,
+                                           ny=3, callback=lambda *a: calls.append(a[:2]))
+        self.assertEqual(cmap.shape, (3, 5))
+        self.assertEqual(len(calls), 15)
+        self.assertEqual(calls[0], (2, 1))
+        assert_allclose(cmap[1, 2], self.result.chi_square, rtol=1.e-6)
+        self.assertTrue((cmap >= self.result.chi_square*(1-1.e-6)).all())
+        par = self.result.params['del_e0']
+        assert_allclose(xpts, par.value + 3*par.stderr*np.linspace(-1, 1, 5))
+
+        pool = feffit_chi2_map(self.result, 'del_e0', 'sig2', nx=5, ny=3,
+                               nworkers=2)[2]
+        assert_allclose(pool, cmap, rtol=1.e-10)
+        scan = feffit_chi2_map(self.result, 'del_e0', 'sig2', nx=5, ny=3,
+                               refit=False)[2]
+        self.assertTrue((scan >= cmap*(1-1.e-8)).all())
+
+    def test_chi2_map_spawn(self):
+        cmap = feffit_chi2_map(self.result, 'del_e0', 'sig2', nx=3, ny=3)[2]
+        spawned = feffit_chi2_map(self.result, 'del_e0', 'sig2', nx=3, ny=3,
+                                  nworkers=2, mp_context=get_context('spawn'))[2]
+        assert_allclose(spawned, cmap, rtol=1.e-10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+tests of running Feff jobs with FeffJobQueue
+"""
+import sys
+import unittest
+from unittest import mock
+import shutil
+import tempfile
+from os.path import isfile, join
+from pathlib import Path
+
+from larch import Interpreter
+from larch.xafs import FeffJobQueue
+from larch.xafs.feffrunner import feffinp_hash
+
+FEFFINP = Path(__file__).parent.parent / 'examples' / 'feff6l' / 'feff_Cu.inp'
+
+class FeffJobQueue_Test(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        with open(FEFFINP, 'r') as fh:
+            self.text = fh.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_feffinp_hash(self):
+        lines = ['* extra comment', ''] + ['  %s  ' % l for l in self.text.split('\n')]
+        self.assertEqual(feffinp_hash(self.text), feffinp_hash('\n'.join(lines)))
+        self.assertNotEqual(feffinp_hash(self.text),
+                            feffinp_hash(self.text, exe='feff8l'))
+        self.assertNotEqual(feffinp_hash(self.text),
+                            feffinp_hash(self.text.replace('RMAX', 'RMAX 4.0\n*')))
+
+    def test_run_and_cache(self):
+        queue = FeffJobQueue(exe='feff6l', nworkers=2,
+                             cache_folder=join(self.folder, 'results'),
+                             workdir=self.folder)
+        job1 = queue.add(FEFFINP.as_posix())
+        job2 = queue.add('* same input\n' + self.text, name='copy')
+        self.assertEqual(job1.hashkey, job2.hashkey)
+        queue.run()
+        if job1.status == 'failed':
+            self.skipTest('feff6l cannot run here: %s' % job1.error)
+        self.assertEqual(job1.folder, job2.folder)
+        self.assertTrue(isfile(join(job1.folder, 'feff0001.dat')))
+        self.assertTrue(isfile(job1.log))
+
+        queue2 = FeffJobQueue(exe='feff6l', cache_folder=join(self.folder, 'results'))
+        job3 = queue2.add(self.text)
+        queue2.run()
+        self.assertEqual(job3.status, 'cached')
+        self.assertEqual(job3.folder, job1.folder)
+
+    def test_feff_executable_symbol(self):
+        _larch = Interpreter()
+        queue = FeffJobQueue(exe='feff6l', _larch=_larch)
+        with mock.patch('larch.xafs.feffrunner.find_exe', return_value=None):
+            _larch.symtable.set_symbol('_xafs._feff_executable', FEFFINP.as_posix())
+            self.assertRaises(Exception, queue.programs)
+            _larch.symtable.set_symbol('_xafs._feff_executable', sys.executable)
+            self.assertEqual(queue.programs(), [sys.executable])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+tests of calculating chi(k) for lists of Feff paths
+"""
+import pickle
+import unittest
+from glob import glob
+from pathlib import Path
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch.io import read_ascii
+from larch.fitting import param_group, guess
+from larch.xafs import (feffpath, ff2chi, autobk, feffit_transform,
+                        feffit_dataset, feffit)
+from larch.xafs.feffdat import FeffPathStack
+
+EXAMPLES = Path(__file__).parent.parent / 'examples'
+FEFFDIR = EXAMPLES / 'feffit' / 'Feff_Cu'
+
+def make_paths():
+    paths = []
+    for i, fname in enumerate(sorted(glob((FEFFDIR / 'feff00*.dat').as_posix()))):
+        e0 = 'del_e0' if i % 3 else 'del_e1'
+        paths.append(feffpath(fname, s02='amp', e0=e0, sigma2='sig2',
+                              deltar='alpha*reff', third='c3'))
+    return paths
+
+class FeffPathStack_Test(unittest.TestCase):
+    def setUp(self):
+        self.pars = param_group(amp=guess(0.9), del_e0=guess(2.0),
+                                del_e1=guess(-1.0), sig2=guess(0.004),
+                                alpha=guess(0.002), c3=guess(1.e-4))
+        self.paths = make_paths()
+
+    def test_ff2chi_pathstack(self):
+        out1 = ff2chi(self.paths, paramgroup=self.pars)
+        chi1 = [p.chi.copy() for p in self.paths]
+        out2 = ff2chi(self.paths, paramgroup=self.pars, pathstack=True)
+        assert_allclose(out1.k, out2.k)
+        assert_allclose(out1.chi, out2.chi, rtol=1.e-10, atol=1.e-12)
+        for c1, path in zip(chi1, self.paths):
+            assert_allclose(c1, path.chi, rtol=1.e-10, atol=1.e-12)
+
+    def test_stack_reuse(self):
+        k = 0.05*np.arange(341)
+        stack = FeffPathStack(self.paths, k)
+        params = self.pars.__params__
+        chi1 = stack.calc_chi(params)
+        params['sig2'].value = 0.008
+        chi2 = stack.calc_chi(params)
+        self.assertTrue(abs(chi2).max() < abs(chi1).max())
+        out = ff2chi(self.paths, paramgroup=self.pars, k=k)
+        assert_allclose(out.chi, chi2, rtol=1.e-10, atol=1.e-12)
+
+    def test_stack_cache(self):
+        k = 0.05*np.arange(341)
+        stack = FeffPathStack(self.paths, k)
+        params = self.pars.__params__
+        chi1 = stack.calc_chi(params)
+        self.assertEqual(stack.cache_misses, len(self.paths))
+        # only paths using del_e1 should be recalculated
+        params['del_e1'].value = -0.5
+        chi2 = stack.calc_chi(params)
+        self.assertEqual(stack.cache_misses, len(self.paths) + 5)
+        self.assertEqual(stack.cache_hits, len(self.paths) - 5)
+        params['del_e1'].value = -1.0
+        chi3 = stack.calc_chi(params)
+        self.assertEqual(stack.cache_hits, 2*len(self.paths) - 5)
+        assert_allclose(chi1, chi3)
+        nocache = FeffPathStack(self.paths, k, cache_size=0)
+        params['del_e1'].value = -0.5
+        assert_allclose(chi2, nocache.calc_chi(params), rtol=1.e-10, atol=1.e-12)
+
+    def test_table_cache(self):
+        k = 0.05*np.arange(341)
+        stack = FeffPathStack(self.paths, k, cache_size=0)
+        params = self.pars.__params__
+        stack.calc_chi(params)
+        # tables for the 2 e0 values are calculated once, then reused
+        params['sig2'].value = 0.005
+        chi1 = stack.calc_chi(params)
+        self.assertEqual(stack.table_cache.misses, 2)
+        self.assertEqual(stack.table_cache.hits, 2)
+
+        gridstack = FeffPathStack(self.paths, k, cache_size=0)
+        gridstack.precompute_e0_grid(e0min=-5, e0max=5, e0step=0.25)
+        assert_allclose(chi1, gridstack.calc_chi(params), rtol=1.e-10, atol=1.e-12)
+        params['del_e0'].value = 2.1
+        chi2 = stack.calc_chi(params)
+        self.assertTrue(abs(chi2 - gridstack.calc_chi(params)).max() < 1.e-3*abs(chi2).max())
+
+    def test_pickle_path(self):
+        path = feffpath((FEFFDIR / 'feff0001.dat').as_posix(), s02='amp',
+                        e0='del_e0', sigma2='sig2')
+        path2 = pickle.loads(pickle.dumps(path))
+        self.assertEqual(path2._tablecache.maxsize, path._tablecache.maxsize)
+        out1 = ff2chi([path], paramgroup=self.pars)
+        out2 = ff2chi([path2], paramgroup=self.pars)
+        assert_allclose(out1.chi, out2.chi, rtol=1.e-10, atol=1.e-12)
+
+        cache = pickle.loads(pickle.dumps(path._tablecache))
+        self.assertTrue(len(path._tablecache) > 0)
+        self.assertEqual(len(cache), 0)
+        cache.put('x', np.ones(4))
+        self.assertEqual(cache.nbytes, 32)
+
+    def test_chi_jacobian(self):
+        k = 0.05*np.arange(341)
+        stack = FeffPathStack(self.paths, k, cache_size=0)
+        params = self.pars.__params__
+        var_names = ['amp', 'del_e0', 'del_e1', 'sig2', 'alpha', 'c3']
+        stack.set_params(params)
+        jac = stack.calc_chi_jacobian(var_names)
+        for ivar, name in enumerate(var_names):
+            val = params[name].value
+            step = 1.e-6*max(1, abs(val))
+            params[name].value = val + step
+            chi_hi = stack.calc_chi(params)
+            params[name].value = val - step
+            chi_lo = stack.calc_chi(params)
+            params[name].value = val
+            deriv = (chi_hi - chi_lo)/(2*step)
+            assert_allclose(jac[ivar][20:], deriv[20:], rtol=0,
+                            atol=1.e-5*abs(deriv).max())
+
+    def test_feffit_analytic_jacobian(self):
+        data = read_ascii((EXAMPLES / 'xafsdata' / 'cu_metal_rt.xdi').as_posix())
+        autobk(data.energy, data.mutrans, group=data, rbkg=1.0, kw=2)
+        results = []
+        for analytic in (False, True):
+            pars = param_group(amp=guess(1.0), del_e0=guess(0.0),
+                               del_e1=guess(0.0), sig2=guess(0.005),
+                               alpha=guess(0.0), c3=guess(0.0))
+            trans = feffit_transform(kmin=3, kmax=16, kw=2, dk=4,
+                                     rmin=1.4, rmax=4.5)
+            dset = feffit_dataset(data=data, paths=make_paths(), transform=trans)
+            results.append(feffit(pars, dset, analytic_jacobian=analytic))
+        num, ana = results
+        self.assertTrue(ana.nfev < num.nfev)
+        assert_allclose(ana.chi_square, num.chi_square, rtol=1.e-4)
+        for name in ('amp', 'del_e0', 'sig2', 'alpha'):
+            assert_allclose(ana.params[name].value, num.params[name].value,
+                            rtol=1.e-3, atol=1.e-5)
+            assert_allclose(ana.params[name].stderr, num.params[name].stderr,
+                            rtol=2.e-2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+tests of fitting with minimize() and chi-square maps
+"""
+import unittest
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch.fitting import param_group, guess, minimize, chi2_map
+
+def gaussian(x, off, amp, cen, wid):
+    return off + amp*np.exp(-(x-cen)**2/(2*wid**2))
+
+def resid(pars, x, y):
+    return gaussian(x, pars.off, pars.amp, pars.cen, pars.wid) - y
+
+class Chi2Map_Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.RandomState(3)
+        x = np.linspace(0, 20, 201)
+        y = gaussian(x, -1.0, 12.0, 9.0, 1.5) + rng.normal(scale=0.2, size=len(x))
+        cls.pars = param_group(off=guess(0.0), amp=guess(10.0),
+                               cen=guess(10.0), wid=guess(2.0))
+        cls.result = minimize(resid, cls.pars, args=(x, y))
+
+    def test_chi2_map_refit(self):
+        calls = []
+        xpts, ypts, c2map = chi2_map(self.result, 'cen', 'wid', nx=5, ny=5,
+                                     callback=lambda ix, iy, c2, m: calls.append((ix, iy)))
+        self.assertEqual(c2map.shape, (5, 5))
+        self.assertEqual(len(calls), 25)
+        self.assertEqual(calls[0], (2, 2))
+        self.assertEqual(len(set(calls)), 25)
+        assert_allclose(xpts[2], self.pars.cen.value)
+        assert_allclose(c2map[2, 2], self.result.chi_square, rtol=1.e-5)
+        self.assertTrue(np.all(c2map >= c2map[2, 2]*(1 - 1.e-6)))
+
+        fast = chi2_map(self.result, 'cen', 'wid', nx=5, ny=5, refit=False)[2]
+        assert_allclose(fast[2, 2], self.result.chi_square, rtol=1.e-5)
+        self.assertTrue(np.all(c2map <= fast*(1 + 1.e-6)))
+        for name in ('off', 'amp', 'cen', 'wid'):
+            assert_allclose(getattr(self.pars, name).value,
+                            self.result.params[name].value)
+
+    def test_chi2_map_args(self):
+        self.assertRaises(TypeError, chi2_map, self.result, 'cen', 'wid',
+                          nx=3, ny=3, unknown=True)
+        xpts, ypts, c2map = chi2_map(self.result, 'cen', 'wid', nx=3, ny=4,
+                                     xrange=(8, 10), yrange=(1, 2), refit=False)
+        assert_allclose(xpts, [8, 9, 10])
+        assert_allclose(ypts, np.linspace(1, 2, 4))
+        self.assertEqual(c2map.shape, (4, 3))
+
+if __name__ == '__main__':
+    unittest.main()
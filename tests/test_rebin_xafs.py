@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+tests of rebin_xafs
+"""
+import unittest
+from pathlib import Path
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch import Group
+from larch.io import read_ascii
+from larch.math import index_of, interp1d
+from larch.xafs import rebin_xafs
+
+DATADIR = Path(__file__).parent.parent / 'examples' / 'xafsdata'
+
+def rebin_loop(energy, mu, en, method='centroid'):
+    """rebin one bin at a time, as done by earlier versions of rebin_xafs"""
+    bounds = [index_of(energy, e) for e in en]
+    mu_out, err_out = [], []
+    j0 = 0
+    for i in range(len(en)):
+        if i == len(en) - 1:
+            j1 = len(energy) - 1
+        else:
+            j1 = int((bounds[i] + bounds[i+1] + 1)/2.0)
+        if (j1 - j0) < 3:
+            jx = j1 + 1
+            if (jx - j0) < 2:
+                jx += 1
+            val = interp1d(energy[j0:jx], mu[j0:jx], en[i])
+        elif method.startswith('box'):
+            val = mu[j0:j1].mean()
+        else:
+            val = (mu[j0:j1]*energy[j0:j1]).mean()/energy[j0:j1].mean()
+        mu_out.append(val)
+        err_out.append(mu[j0:j1].std() if j1 > j0 else np.nan)
+        j0 = j1
+    return np.array(mu_out), np.array(err_out)
+
+class RebinXAFS_Test(unittest.TestCase):
+    def setUp(self):
+        dat = read_ascii((DATADIR / 'cu_metal_rt.xdi').as_posix())
+        rng = np.random.RandomState(5)
+        self.energy = np.sort(rng.uniform(8850, 9800, 20000))
+        self.mu = (np.interp(self.energy, dat.energy, dat.mutrans) +
+                   rng.normal(scale=1.e-3, size=len(self.energy)))
+        self.dat = dat
+
+    def check_loop(self, energy, mu, method):
+        grp = Group(energy=energy, mu=mu, e0=8979.0)
+        rebin_xafs(grp, method=method)
+        out = grp.rebinned
+        mu_ref, err_ref = rebin_loop(energy, mu, out.energy, method=method)
+        assert_allclose(out.mu, mu_ref, rtol=1.e-12)
+        assert_allclose(out.delta_mu, err_ref, rtol=1.e-8, atol=1.e-14)
+        self.assertEqual(out.counts.sum(), len(energy) - 1)
+        return out
+
+    def test_rebin(self):
+        for method in ('centroid', 'boxcar'):
+            self.check_loop(self.energy, self.mu, method)
+            self.check_loop(self.dat.energy, self.dat.mutrans, method)
+
+    def test_rebin_stack(self):
+        stack = np.array([self.mu, 2*self.mu, self.mu + 0.5])
+        grp = Group(energy=self.energy, mu=stack, e0=8979.0)
+        rebin_xafs(grp)
+        one = Group(energy=self.energy, mu=self.mu, e0=8979.0)
+        rebin_xafs(one)
+        self.assertEqual(grp.rebinned.mu.shape, (3, len(one.rebinned.energy)))
+        assert_allclose(grp.rebinned.mu[0], one.rebinned.mu)
+        assert_allclose(grp.rebinned.mu[1], 2*one.rebinned.mu)
+        assert_allclose(grp.rebinned.delta_mu[2], one.rebinned.delta_mu)
+
+    def test_rebin_short_preedge(self):
+        # data starting 20 eV below e0, so that pre1 > pre2 = -30
+        energy = np.linspace(8800, 8964, 821)
+        mu = np.interp(energy, self.dat.energy, self.dat.mutrans)
+        grp = Group(energy=energy, mu=mu, e0=8820.0)
+        rebin_xafs(grp)
+        out = grp.rebinned
+        self.assertTrue(np.all(np.diff(out.energy) > 0))
+        self.assertTrue(out.energy[0] > energy[0])
+        self.assertEqual(out.counts.sum(), len(energy) - 1)
+        mu_ref, err_ref = rebin_loop(energy, mu, out.energy)
+        assert_allclose(out.mu, mu_ref, rtol=1.e-12)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""
+tests of sigma2 models for Feff paths
+"""
+import unittest
+from glob import glob
+from pathlib import Path
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch.fitting import param_group, guess
+from larch.xafs import feffpath, ff2chi
+from larch.xafs.sigma2_models import (sigma2_debye, sigma2_debye_paths,
+                                      sigma2_correldebye_py)
+
+FEFFDIR = Path(__file__).parent.parent / 'examples' / 'feffit' / 'Feff_Cu'
+
+class Sigma2Debye_Test(unittest.TestCase):
+    def setUp(self):
+        self.paths = [feffpath(fname) for fname in
+                      sorted(glob((FEFFDIR / 'feff00*.dat').as_posix()))]
+
+    def test_sigma2_debye(self):
+        for path in self.paths[:6]:
+            fdat = path._feffdat
+            atoms = np.array([g[3:] for g in fdat.geom])
+            for tk, theta in ((10, 315), (300, 315), (1000, 200)):
+                expected = sigma2_correldebye_py(len(atoms), tk, theta, fdat.rnorman,
+                                                 atoms[:, 1], atoms[:, 2],
+                                                 atoms[:, 3], atoms[:, 0])
+                assert_allclose(sigma2_debye(tk, theta, path), expected, rtol=1.e-8)
+        sig2 = sigma2_debye_paths(300, 315, self.paths)
+        assert_allclose(sig2, [sigma2_debye(300, 315, p) for p in self.paths])
+
+    def test_sigma2_debye_param(self):
+        pars = param_group(theta=guess(315.0), temp=300.0)
+        path = feffpath((FEFFDIR / 'feff0001.dat').as_posix(),
+                        sigma2='sigma2_debye(temp, theta)')
+        ff2chi([path], paramgroup=pars)
+        assert_allclose(path.path_paramvals()['sigma2'], sigma2_debye(300, 315, path))
+
+if __name__ == '__main__':
+    unittest.main()
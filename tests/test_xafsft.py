@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+tests of XAFS Fourier transforms of single spectra and stacks of spectra
+"""
+import unittest
+from copy import copy
+import numpy as np
+from numpy.testing import assert_allclose
+from scipy.fftpack import fft, ifft
+
+from larch import Group
+from larch.xafs import (xftf, xftr, xftf_fast, xftr_fast, feffit_transform,
+                        cauchy_wavelet, ftwindow, ftwindow_uniform,
+                        ftwindow_kweight, ftwindow_cache_stats)
+
+def make_chis(nspec=5, kstep=0.05):
+    k = kstep*np.arange(321)
+    chis = [np.sin(2*(2.0+0.05*i)*k)*np.exp(-0.01*k*k) for i in range(nspec)]
+    return k, np.array(chis)
+
+class XAFSFT_Test(unittest.TestCase):
+    def test_xftf_fast(self):
+        k, chis = make_chis()
+        for chi in (chis[0], chis[0]*(1+0.5j)):
+            cchi = np.zeros(2048, dtype='complex128')
+            cchi[:len(chi)] = chi
+            expect = (0.05/np.sqrt(np.pi))*fft(cchi)[:1024]
+            assert_allclose(xftf_fast(chi), expect, rtol=1.e-10, atol=1.e-12)
+        out = xftf_fast(chis)
+        self.assertEqual(out.shape, (len(chis), 1024))
+        assert_allclose(out[2], xftf_fast(chis[2]), rtol=1.e-12)
+
+    def test_xftr_fast(self):
+        k, chis = make_chis()
+        chir = xftf_fast(chis)
+        cchir = np.zeros(2048, dtype='complex128')
+        cchir[:1024] = chir[1]
+        expect = (4*np.sqrt(np.pi)/0.05)*ifft(cchir)[:1024]
+        assert_allclose(xftr_fast(chir)[1], expect, rtol=1.e-10, atol=1.e-12)
+
+    def test_xftf_stack(self):
+        k, chis = make_chis()
+        grp = Group()
+        xftf(k, chis, group=grp, kmin=2, kmax=14, dk=3, kweight=2,
+             with_phase=True)
+        self.assertEqual(grp.chir.shape[0], len(chis))
+        for i, chi in enumerate(chis):
+            one = Group()
+            xftf(k, chi, group=one, kmin=2, kmax=14, dk=3, kweight=2,
+                 with_phase=True)
+            assert_allclose(grp.chir[i], one.chir, rtol=1.e-10, atol=1.e-12)
+            assert_allclose(grp.chir_pha[i], one.chir_pha, rtol=1.e-10, atol=1.e-12)
+
+        xftr(grp.r, grp.chir, group=grp, rmin=1, rmax=3)
+        xftr(one.r, one.chir, group=one, rmin=1, rmax=3)
+        assert_allclose(grp.chiq[-1], one.chiq, rtol=1.e-10, atol=1.e-12)
+
+    def test_transform_kweights(self):
+        k, chis = make_chis()
+        trans = feffit_transform(kmin=2, kmax=14, dk=3, kweight=[1, 2, 3])
+        out = trans.fftf(chis, kweight=trans.kweight)
+        self.assertEqual(out.shape, (len(chis), 3, 1024))
+        for i, kw in enumerate(trans.kweight):
+            assert_allclose(out[:, i, :], trans.fftf(chis, kweight=kw),
+                            rtol=1.e-12)
+        # the windowed k-weights are cached until kwin is reset, and are
+        # shared by transforms with the same window
+        win = trans.kwin_kweight(2, len(k))
+        self.assertIs(win, trans.kwin_kweight(2, len(k)))
+        self.assertIs(win, copy(trans).kwin_kweight(2, len(k)))
+        self.assertFalse(win.flags.writeable)
+        trans.kmin = 3
+        trans.kwin = None
+        self.assertIsNot(win, trans.kwin_kweight(2, len(k)))
+
+    def test_ftwindow_cache(self):
+        kstep, nfft = 0.05, 2048
+        k = kstep*np.arange(nfft)
+        for window in ('hanning', 'kaiser', 'parzen', 'welch', 'sine',
+                       'gaussian', 'bessel', 'fhanning'):
+            expect = ftwindow(k, xmin=2, xmax=14, dx=3, window=window)
+            win = ftwindow_uniform(kstep, nfft, xmin=2, xmax=14, dx=3,
+                                   window=window)
+            assert_allclose(win, expect, rtol=0)
+            self.assertIs(win, ftwindow_uniform(kstep, nfft, xmin=2, xmax=14,
+                                                dx=3, window=window))
+            kwin = ftwindow_kweight((1, 2), 321, kstep=kstep, kmin=2, kmax=14,
+                                    dk=3, window=window, nwin=nfft)
+            self.assertEqual(kwin.shape, (2, 321))
+            assert_allclose(kwin[1], expect[:321]*k[:321]**2, rtol=1.e-14)
+        stats = ftwindow_cache_stats()
+        self.assertTrue(stats['hits'] >= 8)
+        self.assertTrue(stats['size'] >= 16)
+
+        # a window set by hand is used as given
+        trans = feffit_transform(kmin=2, kmax=14, dk=3)
+        trans.kwin = np.ones(nfft)
+        assert_allclose(trans.kwin_kweight(1, 321), k[:321], rtol=0)
+
+    def test_cauchy_wavelet(self):
+        k, chis = make_chis()
+        chi = chis[0]
+        grp = Group()
+        cauchy_wavelet(k, chi, group=grp, kweight=2, rmax_out=6)
+        # compare to a single R value calculated directly
+        nfft, nrpts = 2048, len(grp.r)
+        omega = np.pi*np.arange(nfft)/(0.05*nfft)
+        tff = np.fft.fft(chi*k**2, n=2*nfft)[:nfft]
+        aom = (nrpts/(2*grp.r[40]))*omega
+        aom[0] = 1.e-19
+        cauchy_sum = np.log(2*np.pi) - np.log(1.0+np.arange(nrpts)).sum()
+        filt = np.exp(cauchy_sum + nrpts*np.log(aom) - aom)
+        expect = np.fft.ifft(filt*tff, 2*nfft)[:len(k)]
+        assert_allclose(grp.wcauchy[40], expect, rtol=1.e-10, atol=1.e-12)
+
+        grp32 = Group()
+        cauchy_wavelet(k, chi, group=grp32, kweight=2, rmax_out=6, float32=True)
+        self.assertEqual(grp32.wcauchy.dtype, np.complex64)
+        assert_allclose(grp32.wcauchy, grp.wcauchy, atol=1.e-5*abs(grp.wcauchy).max())
+
+    def test_transform_cwt(self):
+        k, chis = make_chis()
+        trans = feffit_transform(fitspace='w', kmin=2, kmax=14, kweight=2,
+                                 dk=3, rmin=1, rmax=4)
+        trans32 = feffit_transform(fitspace='w', kmin=2, kmax=14, kweight=2,
+                                   dk=3, rmin=1, rmax=4, wavelet_float32=True)
+        out = trans.cwt(chis[0])
+        filters = trans._cauchyfilters[1]
+        out2 = trans.cwt(chis[1])
+        self.assertIs(filters, trans._cauchyfilters[1])
+        self.assertEqual(out.shape, out2.shape)
+        out32 = trans32.cwt(chis[0])
+        self.assertEqual(trans32._cauchyfilters[1].dtype, np.float32)
+        assert_allclose(out32, out, atol=1.e-5*abs(out).max())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+"""
+tests of writing and reading XRF map files, using synthetic map files
+"""
+import os
+import time
+import unittest
+from unittest import mock
+import shutil
+import tempfile
+import numpy as np
+from numpy.testing import assert_allclose
+
+from larch.xrmmap.xrm_mapfile import (GSEXRM_MapFile, roi_sums, channel_integral,
+                                      INTEGRAL_NAME)
+from xrmmap_utils import make_mapfile, make_row, add_rows, roi_limits
+
+NPTS, NMCA, NROIS, NROWS = 11, 2, 3, 6
+
+def read_maprow_standin(args):
+    "stand-in for read_maprow(), run in worker processes"
+    irow = args[0]
+    time.sleep(0.01*((7*irow) % 5))
+    return irow, os.getpid()
+
+class MapFile_TestCase(unittest.TestCase):
+    "synthetic map file with NROWS rows, created for each test"
+    version = None
+    integral_cube = False
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.xrm = make_mapfile(self.folder, npts=NPTS, nmca=NMCA,
+                                nrois=NROIS, version=self.version,
+                                integral_cube=self.integral_cube)
+        add_rows(self.xrm, NROWS, npts=NPTS, nmca=NMCA)
+
+    def tearDown(self):
+        self.xrm.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def counts(self, imca):
+        return self.xrm.xrmmap['mca%d/counts' % (imca+1)][()]
+
+    def expected_roimap(self, iroi, imca, dtcorrect=False):
+        lo, hi = roi_limits(iroi)
+        out = self.counts(imca)[:, :, lo:hi].sum(axis=2)
+        if dtcorrect:
+            out = out*self.xrm.xrmmap['mca%d/dtfactor' % (imca+1)][()]
+        return out
+
+class ROISums_Test(unittest.TestCase):
+    def test_roi_sums(self):
+        counts = np.random.RandomState(1).poisson(5, size=(3, 4, 64))
+        slices = [slice(0, 64), slice(10, 20), slice(5, 5), slice(30, 12),
+                  slice(60, 100), slice(-10, None), slice(None, 3)]
+        out = roi_sums(counts, slices)
+        self.assertEqual(out.shape, (3, 4, len(slices)))
+        for i, sl in enumerate(slices):
+            assert_allclose(out[..., i], counts[..., sl].sum(axis=-1))
+        self.assertTrue(np.all(out[..., 2:4] == 0))
+
+class SetROIData_Test(MapFile_TestCase):
+    "set_roidata() for the version 2.1 layout, with roimap/det_raw"
+    def roimaps(self):
+        "raw and corrected maps for each ROI and detector, then the sum"
+        dets = ['mca%d' % (imca+1) for imca in range(NMCA)] + ['mcasum']
+        raw, cor = [], []
+        for iroi in range(NROIS):
+            name = 'roi%d' % iroi
+            for det in dets:
+                raw.append(self.xrm.get_roimap(name, det=det, dtcorrect=False,
+                                               use_cache=False))
+                cor.append(self.xrm.get_roimap(name, det=det, dtcorrect=True,
+                                               use_cache=False))
+        return np.array(raw), np.array(cor)
+
+    def clear_roidata(self):
+        roimap = self.xrm.xrmmap['roimap']
+        nscal = roimap['det_raw'].shape[2] - NROIS*NMCA
+        for name in ('det_raw', 'det_cor', 'sum_raw', 'sum_cor'):
+            roimap[name][:, :, nscal:] = 0
+
+    def test_add_rowdata(self):
+        raw, cor = self.roimaps()
+        for iroi in range(NROIS):
+            for imca in range(NMCA):
+                i = iroi*(NMCA+1) + imca
+                assert_allclose(raw[i], self.expected_roimap(iroi, imca))
+                assert_allclose(cor[i], self.expected_roimap(iroi, imca, True),
+                                rtol=1.e-6)
+            assert_allclose(raw[i+1], raw[i+1-NMCA:i+1].sum(axis=0))
+
+    def test_set_roidata(self):
+        raw, cor = self.roimaps()
+        self.clear_roidata()
+        self.xrm.set_roidata()
+        raw2, cor2 = self.roimaps()
+        assert_allclose(raw2, raw)
+        assert_allclose(cor2, cor, rtol=1.e-6)
+
+    def test_set_roidata_rows(self):
+        raw, cor = self.roimaps()
+        self.clear_roidata()
+        calls = []
+        self.xrm.set_roidata(row_start=2, row_end=4, blocksize=1,
+                             callback=lambda **kw: calls.append(kw))
+        raw2, cor2 = self.roimaps()
+        assert_allclose(raw2[:, 2:5], raw[:, 2:5])
+        assert_allclose(cor2[:, 2:5], cor[:, 2:5], rtol=1.e-6)
+        self.assertTrue(np.all(raw2[:, :2] == 0))
+        self.assertTrue(np.all(raw2[:, 5:] == 0))
+        rows = [kw['row'] for kw in calls]
+        self.assertTrue(len(rows) > 1)
+        self.assertEqual(rows, sorted(rows))
+        self.assertEqual(rows[-1], 5)
+        self.assertTrue(all(kw['maxrow'] == 5 for kw in calls))
+
+class SetROIData20_Test(SetROIData_Test):
+    "set_roidata() for the version 2.0 layout, with roimap/DET/ROI/raw"
+    version = '2.0.0'
+
+    def clear_roidata(self):
+        for det in self.xrm.xrmmap['roimap'].values():
+            for roi in det.values():
+                roi['raw'][...] = 0
+                roi['cor'][...] = 0
+
+    def test_layout(self):
+        self.assertTrue('det_raw' not in self.xrm.xrmmap['roimap'])
+        self.assertEqual(self.xrm.xrmmap['roimap/mca1/roi0/raw'].shape, (NROWS, NPTS))
+
+class IntegralCube_Test(MapFile_TestCase):
+    "integral cube of MCA counts, built after the rows are written"
+    ranges = [(0, 2048), (0, 1), (100, 260), (37, 1001), (2000, 2048), (12, 12)]
+
+    def erange(self, imca, lo, hi):
+        return self.xrm.get_mca_erange(det='mca%d' % (imca+1), emin=lo, emax=hi,
+                                       by_energy=False, dtcorrect=False)
+
+    def test_channel_integral(self):
+        counts = self.counts(0)
+        for step in (1, 4, 5):
+            cube = channel_integral(counts, step)
+            self.assertEqual(cube.dtype, np.uint64)
+            self.assertEqual(cube.shape[-1], counts.shape[-1]//step + 1)
+            for j in (0, 1, cube.shape[-1]-1):
+                assert_allclose(cube[..., j], counts[..., :j*step].sum(axis=-1))
+
+    def test_erange_step1(self):
+        direct = [[self.erange(i, lo, hi) for lo, hi in self.ranges] for i in range(NMCA)]
+        self.xrm.build_integral_cube()
+        self.assertEqual(self.xrm.xrmmap['mca1'][INTEGRAL_NAME].shape,
+                         (NROWS, NPTS, 2049))
+        for i in range(NMCA):
+            for (lo, hi), val in zip(self.ranges, direct[i]):
+                expected = self.counts(i)[:, :, lo:hi].sum(axis=2)
+                assert_allclose(val, expected)
+                assert_allclose(self.erange(i, lo, hi), expected)
+
+    def test_erange_step4(self):
+        calls = []
+        self.xrm.build_integral_cube(step=4, callback=lambda **kw: calls.append(kw))
+        self.assertEqual(self.xrm.xrmmap['mcasum'][INTEGRAL_NAME].shape,
+                         (NROWS, NPTS, 513))
+        self.assertEqual(calls[-1]['row'], NROWS)
+        counts = self.counts(1)
+        for lo, hi in ((0, 2048), (100, 260), (36, 1000), (12, 12)):
+            assert_allclose(self.erange(1, lo, hi), counts[:, :, lo:hi].sum(axis=2))
+        # limits are rounded to the step of the cube
+        assert_allclose(self.erange(1, 101, 259), counts[:, :, 100:260].sum(axis=2))
+
+    def test_xrfroi_exact(self):
+        self.xrm.build_integral_cube(step=4)
+        counts = self.counts(0)
+        # unaligned limits: the cube gives the sum over rounded limits,
+        # and add_xrfroi falls back to summing the counts
+        self.assertFalse(np.allclose(self.erange(0, 101, 259),
+                                     counts[:, :, 101:259].sum(axis=2)))
+        for name, lims in (('aligned', [100, 260]), ('unaligned', [101, 259])):
+            self.xrm.add_xrfroi(list(lims), name, unit='channels')
+            raw = self.xrm.xrmmap['roimap/mca1/%s/raw' % name][()]
+            assert_allclose(raw, counts[:, :, lims[0]:lims[1]].sum(axis=2))
+
+class IntegralCubeRows_Test(MapFile_TestCase):
+    "integral cube of MCA counts, written with each row"
+    integral_cube = True
+
+    def test_rows(self):
+        for dname in ('mca1', 'mca2', 'mcasum'):
+            dgroup = self.xrm.xrmmap[dname]
+            cube = dgroup[INTEGRAL_NAME]
+            self.assertEqual(cube.shape, (NROWS, NPTS, 2049))
+            assert_allclose(cube[()], channel_integral(dgroup['counts'][()]))
+        add_rows(self.xrm, 3, npts=NPTS, nmca=NMCA, seed=11)
+        cube = self.xrm.xrmmap['mca2'][INTEGRAL_NAME]
+        self.assertEqual(cube.shape, (NROWS+3, NPTS, 2049))
+        assert_allclose(cube[()], channel_integral(self.counts(1)))
+        self.assertTrue(np.any(cube[NROWS:] > 0))
+
+class ROIMapCache_Test(MapFile_TestCase):
+    "cache of ROI maps from get_roimap()"
+    def setUp(self):
+        MapFile_TestCase.setUp(self)
+        self.det_raw = self.xrm.xrmmap['roimap/det_raw']
+        self.nscal = self.det_raw.shape[2] - NROIS*NMCA
+
+    def roimap(self, name='roi1', det='mca1'):
+        return self.xrm.get_roimap(name, det=det, dtcorrect=False)
+
+    def change_file(self, value=7):
+        "change ROI maps in the file, behind the cache"
+        self.det_raw[:, :, self.nscal:] = value
+        for dname in ('mca1', 'mca2', 'mcasum'):
+            for rname in self.xrm.xrmmap['roimap'][dname]:
+                self.xrm.xrmmap['roimap'][dname][rname]['raw'].resize((0, NPTS))
+
+    def assert_stale(self, name='roi1', det='mca1'):
+        "check that the cached map no longer matches the file"
+        self.assertFalse(np.allclose(self.roimap(name, det), 7))
+
+    def test_hits(self):
+        self.xrm.clear_roimap_cache()
+        map1 = self.roimap()
+        map2 = self.roimap()
+        assert_allclose(map1, map2)
+        stats = self.xrm.roimap_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+        self.assertEqual(stats['nbytes'], map1.nbytes)
+        self.roimap(det='mca2')
+        self.xrm.get_roimap('roi1', det='mca1', dtcorrect=True)
+        self.assertEqual(self.xrm.roimap_cache_stats()['size'], 3)
+
+    def test_mutate(self):
+        map1 = self.roimap()
+        expected = map1.copy()
+        map1[:] = 0
+        assert_allclose(self.roimap(), expected)
+        trimmed = self.xrm.get_roimap('roi1', det='mca1', dtcorrect=False,
+                                      maxval=expected.mean())
+        self.assertTrue(trimmed.max() < expected.max())
+        assert_allclose(self.roimap(), expected)
+        cor = self.xrm.get_roimap('roi1', det='mca1', dtcorrect=True)
+        self.xrm.get_rgbmap('roi0', 'roi1', 'roi2', det='mca1', dtcorrect=True)
+        assert_allclose(self.xrm.get_roimap('roi1', det='mca1', dtcorrect=True), cor)
+
+    def test_add_rows(self):
+        # with room for new rows, so that add_rowdata does not resize arrays
+        self.xrm.resize_arrays(NROWS+2)
+        map1 = self.roimap()
+        row = make_row(NROWS, np.random.default_rng(11), npts=NPTS, nmca=NMCA)
+        self.xrm.add_rowdata(row)
+        self.assertEqual(len(self.xrm.roimap_cache), 0)
+        map2 = self.roimap()
+        self.assertEqual([key[-1] for key in self.xrm.roimap_cache.keys()],
+                         [self.xrm.last_row])
+        self.assertEqual(map2.shape, (NROWS+2, NPTS))
+        assert_allclose(map2[:NROWS], map1[:NROWS])
+        self.assertTrue(np.all(map1[NROWS] == 0))
+        assert_allclose(map2[NROWS], self.expected_roimap(1, 0)[NROWS])
+
+    def test_set_roidata(self):
+        map1 = self.roimap()
+        counts = self.xrm.xrmmap['mca1/counts']
+        counts[0] = 0
+        self.xrm.set_roidata()
+        map2 = self.roimap()
+        self.assertTrue(np.all(map2[0] == 0))
+        assert_allclose(map2[1:], map1[1:])
+
+    def test_resize_arrays(self):
+        self.roimap()
+        self.change_file()
+        self.assert_stale()
+        self.xrm.resize_arrays(NROWS)
+        assert_allclose(self.roimap(), 7)
+
+    def test_save_roi(self):
+        self.roimap('roi1', 'mca1')
+        self.roimap('roi2', 'mca1')
+        self.change_file()
+        self.assert_stale('roi1')
+        self.xrm.xrmmap['roimap'].create_group('mca9')
+        self.xrm.save_roi('roi1', 'mca9', np.ones((NROWS, NPTS)),
+                          np.ones((NROWS, NPTS)), [1.0, 2.0], 'energy', 'keV')
+        assert_allclose(self.roimap('roi1', 'mca1'), 7)
+        self.assert_stale('roi2')
+
+    def test_del_roi(self):
+        self.roimap('roi1', 'mca1')
+        self.roimap('roi1', 'mcasum')
+        self.roimap('roi2', 'mca1')
+        self.change_file()
+        self.xrm.del_roi('ROI1')
+        keys = self.xrm.roimap_cache.keys()
+        self.assertEqual([key[0] for key in keys], ['roi2'])
+        self.xrm.discard_roimaps('roi2')
+        self.assertEqual(len(self.xrm.roimap_cache), 0)
+
+    def test_del_xrd1droi(self):
+        self.roimap('roi1', 'mca1')
+        self.roimap('roi2', 'mca1')
+        self.xrm.xrmmap['roimap'].create_group('xrd1d/roi1')
+        self.xrm.del_xrd1droi('roi1')
+        self.assertEqual([key[0] for key in self.xrm.roimap_cache.keys()], ['roi2'])
+        self.assertTrue('roi1' not in self.xrm.xrmmap['roimap/xrd1d'])
+
+class IterRowData_Test(MapFile_TestCase):
+    "reading rows ahead with iter_rowdata(), with stand-ins for raw rows"
+    def iter_rows(self, irows, nworkers, prefetch=None):
+        used, calls = [], []
+        def rowdata_args(xrm, irow, offset=None):
+            calls.append((irow, len(used)))
+            return None if irow == 5 else (irow,)
+        with mock.patch.object(GSEXRM_MapFile, 'rowdata_args', rowdata_args), \
+             mock.patch('larch.xrmmap.xrm_mapfile.read_maprow', read_maprow_standin):
+            for row in self.xrm.iter_rowdata(irows, nworkers=nworkers,
+                                             prefetch=prefetch):
+                used.append(row)
+        return used, calls
+
+    def test_serial(self):
+        used, calls = self.iter_rows(range(8), nworkers=1)
+        self.assertEqual([r and r[0] for r in used], [0, 1, 2, 3, 4, None, 6, 7])
+        self.assertEqual(calls, [(i, i) for i in range(8)])
+
+    def test_workers(self):
+        used, calls = self.iter_rows(range(12), nworkers=2, prefetch=3)
+        self.assertEqual([r and r[0] for r in used],
+                         [0, 1, 2, 3, 4, None] + list(range(6, 12)))
+        self.assertTrue(any(r[1] != os.getpid() for r in used[1:] if r is not None))
+        # row 0 is read before the others are read ahead
+        self.assertEqual(calls[0], (0, 0))
+        self.assertEqual(calls[1], (1, 1))
+        # at most prefetch rows are read ahead of the row being used
+        for irow, nused in calls:
+            self.assertTrue(irow - nused < 3)
+        self.assertEqual(max(irow - nused for irow, nused in calls), 2)
+
+    def test_workers_later_rows(self):
+        used, calls = self.iter_rows(range(3, 9), nworkers=3)
+        self.assertEqual([r and r[0] for r in used], [3, 4, None, 6, 7, 8])
+        self.assertEqual(calls[0], (3, 0))
+        self.assertTrue(all(irow - 3 - nused < 6 for irow, nused in calls))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+synthetic XRF map files for tests and benchmarks of GSEXRM_MapFile:
+a map file with nmca detectors and nrois ROIs, and rows of random MCA
+spectra, scalers and positions, as read from a map folder.
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+import numpy as np
+import h5py
+
+from larch.xrmmap.xrm_mapfile import GSEXRM_MapFile, create_xrmmap
+from larch.xrmmap.configfile import FastMapConfig
+
+NCHAN = 2048
+SCALER_NAMES = ['I0', 'I1', 'I2', 'Time']
+
+def roi_limits(iroi):
+    "channel limits of ROI iroi"
+    return 50 + 30*iroi, 70 + 30*iroi
+
+def make_mapfile(folder, npts=201, nmca=4, nrois=48, integral_cube=False,
+                 version=None):
+    """create an empty map file in folder, with nmca detectors and nrois
+    ROIs, and the file version [None, the current version]"""
+    with open(os.path.join(folder, 'ROI.dat'), 'w') as fh:
+        fh.write('[rois]\n')
+        for i in range(nrois):
+            lims = '%d %d' % roi_limits(i)
+            fh.write('ROI%2.2i = roi%i | %s\n' % (i, i, ' '.join([lims]*nmca)))
+        fh.write('[calibration]\n')
+        fh.write('offset = %s\n' % ' '.join(['0.0']*nmca))
+        fh.write('slope = %s\n' % ' '.join(['0.01']*nmca))
+        fh.write('quad = %s\n' % ' '.join(['0.0']*nmca))
+
+    fname = os.path.join(folder, 'bench.h5')
+    h5root = h5py.File(fname, 'w')
+    create_xrmmap(h5root, folder=folder)
+    if version is not None:
+        h5root['xrmmap'].attrs['Version'] = version
+    h5root.close()
+
+    xrm = GSEXRM_MapFile(filename=fname, all_mcas=True,
+                         integral_cube=integral_cube)
+    xrm.folder = folder
+    xrm.add_map_config(FastMapConfig().config)
+    xrm.build_schema(npts, nmca=nmca, nchan=NCHAN, scaler_names=SCALER_NAMES)
+    xrm.has_xrf = True
+    return xrm
+
+def make_row(irow, rng, npts=201, nmca=4):
+    "synthetic GSEXRM_MapRow-like row"
+    counts = rng.poisson(5, size=(nmca, npts, NCHAN)).astype(np.uint32)
+    ones = np.ones((nmca, npts))
+    return SimpleNamespace(yvalue=0.01*irow, xrffile='xsp3.%4.4d' % irow,
+                           xrdfile=None, scaler_names=SCALER_NAMES,
+                           sisdata=rng.uniform(size=(npts, len(SCALER_NAMES))),
+                           posvals=[np.linspace(0, 1, npts), 0.01*irow*np.ones(npts)],
+                           counts=counts, total=counts.sum(axis=0),
+                           dtfactor=1.1*ones, realtime=100*ones, livetime=90*ones,
+                           inpcounts=counts.sum(axis=2)*1.1,
+                           outcounts=counts.sum(axis=2)*1.0,
+                           total_dtfactor=1.1*np.ones(npts), xrdq=None, xrd2d=None)
+
+def add_rows(xrm, nrows, npts=201, nmca=4, seed=7):
+    "add nrows synthetic rows, returning the time for each, in seconds"
+    rng = np.random.default_rng(seed)
+    rows = [make_row(i, rng, npts=npts, nmca=nmca) for i in range(4)]
+    stdout = sys.stdout
+    times = []
+    for irow in range(nrows):
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            t0 = time.time()
+            xrm.add_rowdata(rows[irow % len(rows)])
+            times.append(time.time() - t0)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+    xrm.resize_arrays(xrm.last_row+1)
+    return np.array(times)